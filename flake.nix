@@ -30,6 +30,7 @@
           pydeps = with pkgs.python3Packages; [
             setuptools
             click
+            numpy
             toml
             xdg
             pytest
@@ -0,0 +1,232 @@
+#! /usr/bin/env python3
+"""
+Throughput and latency benchmarks on loop devices.
+
+Back the loop devices with tmpfs (TMPDIR=/dev/shm) so the numbers measure
+jgsysutil rather than the disk under the temporary directory.
+"""
+
+import atexit
+import json
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import typing as t
+from pathlib import Path
+
+import click
+from loop_device import POOL, loop_device
+from test_prepare_drive import handle_resources
+
+from jgsysutil.randomize_drive import (
+    WipeEngine,
+    WipeMethod,
+    WipeOptions,
+    randomize_drive_lib,
+)
+
+Results = t.Dict[str, t.Dict[str, float]]
+
+DEFAULT_BASELINE = Path(__file__).parent / "benchmark-baseline.json"
+
+# Every result has a seconds field, and a regression is one taking longer
+METRIC = "seconds"
+
+WIPES = [
+    (WipeMethod.RANDOM, WipeEngine.SHRED),
+    (WipeMethod.RANDOM, WipeEngine.NATIVE),
+    (WipeMethod.DMCRYPT, WipeEngine.SHRED),
+    (WipeMethod.DMCRYPT, WipeEngine.NATIVE),
+    (WipeMethod.DISCARD, WipeEngine.NATIVE),
+    (WipeMethod.ZEROOUT, WipeEngine.NATIVE),
+]
+
+
+def bench_wipe(method: WipeMethod, engine: WipeEngine, size_mb: int) -> Results:
+    with loop_device(size_mb) as dev:
+        stats = randomize_drive_lib(dev, WipeOptions(method=method, engine=engine))
+    return {
+        f"wipe/{method.value}/{engine.value}/{size_mb}M": {
+            "seconds": stats.seconds,
+            "mb_per_second": stats.mb_per_second,
+        }
+    }
+
+
+def bench_prepare(size_mb: int) -> Results:
+    """
+    prepare-drive end to end, and each of its steps from a --trace of the run.
+    """
+    with tempfile.TemporaryDirectory() as tmp, loop_device(size_mb) as dev:
+        mountdir = Path(tmp) / "mnt"
+        mountdir.mkdir()
+        trace = Path(tmp) / "trace.json"
+        with handle_resources(mountdir, Path(f"{dev}p2")):
+            start = time.perf_counter()
+            subprocess.run(
+                [
+                    "jgsysutil",
+                    "prepare-drive",
+                    "--drive",
+                    dev,
+                    "--mount",
+                    mountdir,
+                    "--trace",
+                    trace,
+                    "--yes",
+                    "--password",
+                    "test",
+                ],
+                check=True,
+                capture_output=True,
+            )
+            seconds = time.perf_counter() - start
+        events = json.loads(trace.read_text())["traceEvents"]
+    results = {f"prepare/{size_mb}M": {"seconds": seconds}}
+    for event in events:
+        if event["ph"] == "X" and event["cat"] in ("task", "step"):
+            results[f"prepare/{size_mb}M/{event['name']}"] = {
+                "seconds": event["dur"] / 1e6
+            }
+    return results
+
+
+def bench_startup(repeat: int = 10) -> Results:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(["jgsysutil", "--help"], check=True, capture_output=True)
+        times.append(time.perf_counter() - start)
+    return {"startup": {"seconds": statistics.median(times)}}
+
+
+def compare(
+    results: Results, baseline: Results, tolerance: float
+) -> t.List[t.Tuple[str, float, float]]:
+    """
+    (name, baseline seconds, seconds) of each result more than tolerance
+    (a fraction) slower than its baseline.
+    """
+    regressions = []
+    for name, result in sorted(results.items()):
+        if name not in baseline:
+            continue
+        before = baseline[name][METRIC]
+        after = result[METRIC]
+        if after > before * (1 + tolerance):
+            regressions.append((name, before, after))
+    return regressions
+
+
+@click.command()
+@click.option(
+    "--size",
+    "sizes",
+    type=click.IntRange(min=64),
+    multiple=True,
+    default=[256, 1024],
+    show_default=True,
+    help="device size in MiB; repeat to benchmark several",
+)
+@click.option(
+    "--method",
+    "methods",
+    type=click.Choice([method.value for method, _ in WIPES]),
+    multiple=True,
+    help="only benchmark these wipe methods, defaults to all of them",
+)
+@click.option(
+    "--prepare/--no-prepare",
+    default=True,
+    help="benchmark prepare-drive, which needs cryptsetup, LVM and root",
+)
+@click.option(
+    "--output",
+    type=click.Path(dir_okay=False, writable=True, path_type=Path),
+    default="benchmark-results.json",
+    show_default=True,
+)
+@click.option(
+    "--baseline",
+    type=click.Path(dir_okay=False, path_type=Path),
+    default=DEFAULT_BASELINE,
+    show_default=True,
+)
+@click.option(
+    "--tolerance",
+    type=click.FloatRange(min=0),
+    default=0.25,
+    show_default=True,
+    help="fraction by which a result may be slower than the baseline",
+)
+@click.option(
+    "--update-baseline",
+    is_flag=True,
+    help="store these results as the new baseline instead of comparing",
+)
+@click.option(
+    "--no-baseline",
+    is_flag=True,
+    help="only record the results, without comparing them to any baseline",
+)
+def main(
+    sizes: t.Tuple[int, ...],
+    methods: t.Tuple[str, ...],
+    prepare: bool,
+    output: Path,
+    baseline: Path,
+    tolerance: float,
+    update_baseline: bool,
+    no_baseline: bool,
+) -> None:
+    """
+    Benchmark wiping, prepare-drive and startup on loop devices.
+
+    Results are written to --output. Any result that is more than --tolerance
+    slower than --baseline fails the run, and so does a missing baseline
+    unless --no-baseline is set. Baselines are specific to the machine, so
+    record one with --update-baseline on the machine that runs the benchmarks.
+    """
+    results: Results = {}
+    results.update(bench_startup())
+    for size in sizes:
+        for method, engine in WIPES:
+            if not methods or method.value in methods:
+                results.update(bench_wipe(method, engine, size))
+    if prepare:
+        # The EFI partition alone takes 512M, so smaller sizes are rounded up
+        for size in sorted({max(size, 2048) for size in sizes}):
+            results.update(bench_prepare(size))
+    for name, result in sorted(results.items()):
+        values = "  ".join(f"{key} {value:.3f}" for key, value in result.items())
+        click.echo(f"{name:<40} {values}")
+    output.write_text(json.dumps(results, indent=2, sort_keys=True))
+
+    if update_baseline:
+        baseline.write_text(json.dumps(results, indent=2, sort_keys=True))
+        click.echo(f"Updated {baseline}")
+        return
+    if no_baseline:
+        return
+    if not baseline.exists():
+        raise click.ClickException(
+            f"No baseline at {baseline}; record one with --update-baseline, "
+            f"or pass --no-baseline to skip the comparison"
+        )
+    regressions = compare(results, json.loads(baseline.read_text()), tolerance)
+    for name, before, after in regressions:
+        click.secho(
+            f"REGRESSION {name}: {before:.3f}s -> {after:.3f}s "
+            f"({(after / before - 1) * 100:+.0f}%)",
+            fg="red",
+            err=True,
+        )
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    atexit.register(POOL.close)
+    main()
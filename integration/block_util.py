@@ -1,19 +1,22 @@
+import os
 import typing as t
 from pathlib import Path
 
 
-def sample_block_device(path: Path, width: int) -> t.Tuple[int, int]:
-    with open(path, "rb") as x:
-        start = sum(x.read(width))
-        x.seek(-width, 2)
-        end = sum(x.read(width))
-        return start, end
+def sample_block_device(path: Path, width: int) -> t.Tuple[bytes, bytes]:
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        size = os.lseek(fd, 0, os.SEEK_END)
+        return os.pread(fd, width, 0), os.pread(fd, width, size - width)
+    finally:
+        os.close(fd)
 
 
 def is_zero(path: Path) -> bool:
-    return sample_block_device(path, 1024) == (0, 0)
+    start, end = sample_block_device(path, 1024)
+    return start == end == bytes(1024)
 
 
 def is_random(path: Path) -> bool:
-    # The probability that 1024 random bytes are 0 is 2**(-13)
-    return 0 not in sample_block_device(path, 1024)
+    # The probability that 1024 random bytes are all 0 is 2**(-8192)
+    return bytes(1024) not in sample_block_device(path, 1024)
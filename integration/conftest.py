@@ -0,0 +1,10 @@
+import typing as t
+
+import pytest
+from loop_device import POOL
+
+
+@pytest.fixture(scope="session", autouse=True)
+def loop_pool() -> t.Iterator[None]:
+    yield
+    POOL.close()
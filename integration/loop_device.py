@@ -1,50 +1,114 @@
+import contextlib
+import fcntl
+import os
 import subprocess
 import tempfile
 import typing as t
-from contextlib import contextmanager
 from pathlib import Path
 
-from jgsysutil.commands import dd, losetup
+from jgsysutil.commands import losetup
 
+# From linux/fs.h
+BLKRRPART = 0x125F
+BLKFLSBUF = 0x1261
 
-@contextmanager
-def loop_device(size_mb: int) -> t.Iterator[Path]:
-    disk_file_path: t.Optional[Path] = None
-    loop: t.Optional[Path] = None
+# Held while attaching, so parallel test workers (pytest-xdist) cannot both be
+# handed the same free loop device by losetup --find
+ATTACH_LOCK = Path(tempfile.gettempdir()) / "jgsysutil-loop-device.lock"
 
-    try:
+
+class LoopDevice:
+    def __init__(self, size_mb: int) -> None:
         disk_file = tempfile.NamedTemporaryFile(delete=False)
-        disk_file_path = Path(disk_file.name)
+        self.backing_file = Path(disk_file.name)
         disk_file.close()
-        subprocess.run(
-            [dd, "if=/dev/zero", f"of={disk_file_path}", "bs=1M", f"count={size_mb}"],
-            check=True,
-            capture_output=True,
-        )
-        loop = Path(
-            subprocess.run(
-                [losetup, "--find", "--show", "--partscan", disk_file_path],
-                check=True,
-                capture_output=True,
-                text=True,
-            ).stdout.strip()
-        )
-        yield loop
+        try:
+            # Sparse: reads back as zeros without writing them
+            os.truncate(self.backing_file, size_mb * 1024 * 1024)
+            with open(ATTACH_LOCK, "w") as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                self.path = Path(
+                    subprocess.run(
+                        [
+                            losetup,
+                            "--find",
+                            "--show",
+                            "--partscan",
+                            self.backing_file,
+                        ],
+                        check=True,
+                        capture_output=True,
+                        text=True,
+                    ).stdout.strip()
+                )
+        except BaseException:
+            self.backing_file.unlink()
+            raise
+
+    def reset(self, size_mb: int) -> None:
+        """
+        Resize the device to size_mb and make it read back as zeros with no
+        partitions, as if it had just been attached.
+        """
+        fd = os.open(self.path, os.O_RDWR)
+        try:
+            # Write back anything still cached before the file is emptied
+            fcntl.ioctl(fd, BLKFLSBUF)
+            os.truncate(self.backing_file, 0)
+            os.truncate(self.backing_file, size_mb * 1024 * 1024)
+            subprocess.run([losetup, "--set-capacity", self.path], check=True)
+            # Drop the now stale cached pages, and the partitions
+            fcntl.ioctl(fd, BLKFLSBUF)
+            fcntl.ioctl(fd, BLKRRPART)
+        finally:
+            os.close(fd)
+
+    def close(self) -> None:
+        try:
+            subprocess.run([losetup, "--detach", self.path], check=True)
+            if (Path("/sys/block") / self.path.name / "loop").exists():
+                raise RuntimeError(f"Unable to detach loop device: {self.path}")
+        finally:
+            self.backing_file.unlink()
+
+
+class LoopPool:
+    """
+    Loop devices kept attached between tests, since attaching and detaching
+    them is most of the cost of a small test.
+    """
+
+    def __init__(self) -> None:
+        self._free: t.List[LoopDevice] = []
+
+    def acquire(self, size_mb: int) -> LoopDevice:
+        while self._free:
+            device = self._free.pop()
+            try:
+                device.reset(size_mb)
+                return device
+            except (OSError, subprocess.CalledProcessError):
+                # Most likely still in use, after a test that failed without
+                # cleaning up; losetup detaches it once it is no longer used
+                with contextlib.suppress(Exception):
+                    device.close()
+        return LoopDevice(size_mb)
+
+    def release(self, device: LoopDevice) -> None:
+        self._free.append(device)
+
+    def close(self) -> None:
+        while self._free:
+            self._free.pop().close()
+
+
+POOL = LoopPool()
+
+
+@contextlib.contextmanager
+def loop_device(size_mb: int) -> t.Iterator[Path]:
+    device = POOL.acquire(size_mb)
+    try:
+        yield device.path
     finally:
-        if loop is not None:
-            subprocess.run(
-                [losetup, "--detach", loop],
-                check=True,
-            )
-            active = subprocess.run(
-                [losetup, "-a"],
-                check=True,
-                capture_output=True,
-                text=True,
-            ).stdout.splitlines()
-            for a in active:
-                path = a.split(":")[0]
-                if path == str(loop):
-                    raise RuntimeError(f"Unable to detach loop device: {loop}")
-        if disk_file_path is not None:
-            disk_file_path.unlink()
+        POOL.release(device)
@@ -0,0 +1,20 @@
+from benchmark import bench_wipe, compare
+
+from jgsysutil.randomize_drive import WipeEngine, WipeMethod
+
+
+def test_bench_wipe() -> None:
+    results = bench_wipe(WipeMethod.RANDOM, WipeEngine.NATIVE, 64)
+    result = results["wipe/random/native/64M"]
+    assert result["seconds"] > 0
+    assert result["mb_per_second"] > 0
+
+
+def test_compare() -> None:
+    baseline = {"a": {"seconds": 1.0}, "b": {"seconds": 1.0}}
+    results = {
+        "a": {"seconds": 1.2},
+        "b": {"seconds": 1.3},
+        "c": {"seconds": 5.0},
+    }
+    assert compare(results, baseline, 0.25) == [("b", 1.0, 1.3)]
@@ -1,4 +1,3 @@
-import json
 import os
 import subprocess
 import tempfile
@@ -9,62 +8,18 @@ from pathlib import Path
 import pytest
 from loop_device import loop_device
 
-from jgsysutil.commands import (
-    cryptsetup,
-    gdisk,
-    lsblk,
-    lvdisplay,
-    swapoff,
-    umount,
-    vgchange,
-)
+from jgsysutil.block_stack import SWAP, BlockDevice, Snapshot, snapshot
+from jgsysutil.commands import cryptsetup, swapoff, umount
+from jgsysutil.gpt import EFI_SYSTEM, LINUX_LUKS, Partition, write_partition_table
+from jgsysutil.lvm import read_layout, set_active
 
-LsblkOut = t.List[t.Dict[str, t.Any]]
+MIB = 1024 * 1024
+GIB = 1024 * MIB
 
 
-def lsblk_output_find(
-    blockdevices_json: LsblkOut, fname: str, target: str
-) -> t.Optional[str]:
-    for dev in blockdevices_json:
-        got = dev.get(fname, None)
-        if (isinstance(got, list) and target in got) or got == target:
-            return dev["name"]
-        x = lsblk_output_find(dev.get("children", []), fname, target)
-        if x is not None:
-            return x
-    return None
-
-
-def find_swap(blockdevices_json: LsblkOut) -> t.Optional[str]:
-    return lsblk_output_find(blockdevices_json, "mountpoints", "[SWAP]")
-
-
-def find_crypt(blockdevices_json: LsblkOut) -> t.Optional[str]:
-    return lsblk_output_find(blockdevices_json, "type", "crypt")
-
-
-def find_vg(swap_dev_name: str) -> str:
-    return subprocess.run(
-        [
-            lvdisplay,
-            f"/dev/mapper/{swap_dev_name}",
-            "--columns",
-            "--options",
-            "vg_name",
-            "--noheadings",
-        ],
-        check=True,
-        capture_output=True,
-        text=True,
-    ).stdout.strip()
-
-
-def run_lsblk(dev: Path) -> LsblkOut:
-    return json.loads(
-        subprocess.run(
-            [lsblk, "--json", dev], check=True, capture_output=True, text=True
-        ).stdout
-    )["blockdevices"]
+def about(size: int, expected: int) -> bool:
+    # The LUKS header and LVM metadata take a little off each layer
+    return abs(size - expected) <= expected // 50
 
 
 def unmount_if_mounted(path: Path) -> None:
@@ -73,23 +28,30 @@ def unmount_if_mounted(path: Path) -> None:
 
 
 @contextmanager
-def handle_resources(mountdir: Path, root_dev: Path) -> t.Iterator[None]:
+def handle_resources(mountdir: Path, *root_devs: Path) -> t.Iterator[None]:
     try:
         yield None
     finally:
-        blockdevices = run_lsblk(root_dev)
+        snap = snapshot()
+        stack = {
+            dev.name: dev
+            for root_dev in root_devs
+            for dev in snap.descendants(str(root_dev))
+        }.values()
         unmount_if_mounted(mountdir / "boot")
         unmount_if_mounted(mountdir)
 
-        swap_dev = find_swap(blockdevices)
-        if swap_dev is not None:
-            subprocess.run([swapoff, f"/dev/mapper/{swap_dev}"], check=True)
-            vg = find_vg(swap_dev)
-            subprocess.run([vgchange, "-a", "n", vg], check=True)
+        for dev in stack:
+            if SWAP in dev.mountpoints:
+                subprocess.run([swapoff, dev.path], check=True)
 
-        crypt_dev = find_crypt(blockdevices)
-        if crypt_dev is not None:
-            subprocess.run([cryptsetup, "luksClose", crypt_dev], check=True)
+        crypts = [dev.path for dev in stack if dev.type == "crypt"]
+        if crypts:
+            vgs = list(read_layout(crypts))
+            if vgs:
+                assert set_active(vgs, crypts, False)
+        for crypt in crypts:
+            subprocess.run([cryptsetup, "luksClose", crypt], check=True)
 
 
 def make_flag(name: str, choice: bool) -> str:
@@ -100,34 +62,36 @@ def make_flag(name: str, choice: bool) -> str:
 
 
 def check_partitions(
-    boot_info: t.Dict[str, t.Any],
-    root_info: t.Dict[str, t.Any],
+    stack: Snapshot,
+    boot_info: BlockDevice,
+    root_info: BlockDevice,
     mountdir: Path,
-    crypt_size: str,
-    root_size: str,
-    swap_size: str,
+    crypt_size: int,
+    root_size: int,
+    swap_size: int,
 ) -> None:
-    assert boot_info["size"] == "512M"
-    assert boot_info["mountpoints"][0] == str(mountdir / "boot")
-    assert root_info["size"] == crypt_size
-    assert len(root_info["children"]) == 1
-    crypt = root_info["children"][0]
-    assert crypt["size"] == crypt_size
-    assert crypt["type"] == "crypt"
-    cc = crypt["children"]
-    assert len(cc) == 2
-    if cc[0]["name"].endswith("_swap"):
-        swap, root = cc
-    else:
-        root, swap = cc
-    assert swap["name"].endswith("_swap")
-    assert root["name"].endswith("_root")
-    assert swap["size"] == swap_size
-    assert swap["type"] == "lvm"
-    assert swap["mountpoints"][0] == "[SWAP]"
-    assert root["size"] == root_size
-    assert root["type"] == "lvm"
-    assert root["mountpoints"][0] == str(mountdir)
+    assert boot_info.size == 512 * MIB
+    assert boot_info.mountpoints == [str(mountdir / "boot")]
+    assert stack.mounted_at(mountdir / "boot") == boot_info
+    assert about(root_info.size, crypt_size)
+    (crypt_name,) = root_info.children
+    crypt = stack.devices[crypt_name]
+    assert about(crypt.size, crypt_size)
+    assert crypt.type == "crypt"
+    # The volumes are named <uuid>_root and <uuid>_swap
+    volumes = {}
+    for name in crypt.children:
+        volume = stack.devices[name]
+        assert volume.lv is not None
+        volumes[volume.lv.rpartition("_")[2]] = volume
+    assert volumes.keys() == {"root", "swap"}
+    swap, root = volumes["swap"], volumes["root"]
+    assert about(swap.size, swap_size)
+    assert swap.type == "lvm"
+    assert swap in stack.swaps()
+    assert about(root.size, root_size)
+    assert root.type == "lvm"
+    assert stack.mounted_at(mountdir) == root
 
 
 @pytest.mark.parametrize("randomize", [True, False])
@@ -153,49 +117,31 @@ def test_basic(randomize: bool) -> None:
                     ],
                     check=True,
                 )
-                blockdevices = run_lsblk(dev)
-
-                assert len(blockdevices) == 1
-                blockroot = blockdevices[0]
-                assert blockroot["name"] == dev.name
-                assert blockroot["size"] == "4G"
-                partitions = {
-                    partition["name"]: partition for partition in blockroot["children"]
-                }
-                p1 = partitions[boot_partition.name]
-                p2 = partitions[root_partition.name]
-                assert len(partitions) == 2
-                check_partitions(p1, p2, Path(mountdir), "3.5G", "1.5G", "2G")
+                stack = snapshot()
+                blockroot = stack.get(dev)
+                assert blockroot is not None
+                assert blockroot.size == 4 * GIB
+                p1 = stack.get(boot_partition)
+                p2 = stack.get(root_partition)
+                assert p1 is not None and p2 is not None
+                assert sorted(blockroot.children) == sorted([p1.name, p2.name])
+                check_partitions(
+                    stack, p1, p2, Path(mountdir), 3584 * MIB, 1536 * MIB, 2 * GIB
+                )
 
 
 @pytest.mark.parametrize("randomize", [True, False])
 def test_explicit_partitions(randomize: bool) -> None:
     with tempfile.TemporaryDirectory() as mountdir:
         with loop_device(4096) as dev:
-            gdisk_commands = [
-                "o",  # delete all partitions and create a new protective MBR
-                "Y",  # confirm
-                "n",  # new partition
-                "",  # enter, default partition number 1
-                "",  # enter, default start position
-                "+512M",  # offset to end position
-                "ef00",  # EFI System code
-                "n",  # new partition
-                "",  # enter, default partition number 2
-                "",  # enter, default start position
-                "+512M",  # offset to end position
-                "8309",  # Linux LUKS
-                "n",  # new partition
-                "",  # enter, default partition number 3
-                "",  # enter, default start position
-                "",  # enter, default end position (rest of the drive)
-                "8309",  # Linux LUKS
-                "w",  # write partition table and exit
-                "Y",  # confirm
-                "",  # final trailing enter
-            ]
-            subprocess.run(
-                [gdisk, dev], input="\n".join(gdisk_commands), text=True, check=True
+            write_partition_table(
+                dev,
+                [
+                    Partition(EFI_SYSTEM, "EFI system partition", 512 * MIB),
+                    Partition(LINUX_LUKS, "Linux LUKS", 512 * MIB),
+                    # The rest of the drive
+                    Partition(LINUX_LUKS, "Linux LUKS"),
+                ],
             )
 
             boot_partition = Path(f"{dev}p1")
@@ -219,18 +165,60 @@ def test_explicit_partitions(randomize: bool) -> None:
                     ],
                     check=True,
                 )
-                boot_info = run_lsblk(boot_partition)
-                root_info = run_lsblk(root_partition)
-                assert len(boot_info) == 1
-                assert len(root_info) == 1
+                stack = snapshot()
+                boot_info = stack.get(boot_partition)
+                root_info = stack.get(root_partition)
+                assert boot_info is not None and root_info is not None
                 check_partitions(
-                    boot_info[0],
-                    root_info[0],
+                    stack,
+                    boot_info,
+                    root_info,
                     Path(mountdir),
-                    "3G",
-                    "1004M",
-                    "2G",
+                    3 * GIB,
+                    1004 * MIB,
+                    2 * GIB,
+                )
+
+
+def test_striped() -> None:
+    with tempfile.TemporaryDirectory() as mountdir:
+        with loop_device(4096) as first, loop_device(4096) as second:
+            roots = [Path(f"{first}p2"), Path(f"{second}p1")]
+            with handle_resources(Path(mountdir), *roots):
+                subprocess.run(
+                    [
+                        "jgsysutil",
+                        "prepare-drive",
+                        "--drive",
+                        first,
+                        "--drive",
+                        second,
+                        "--stripe-size",
+                        "64k",
+                        "--mount",
+                        mountdir,
+                        "--yes",
+                        "--password",
+                        "test",
+                    ],
+                    check=True,
                 )
+                stack = snapshot()
+                crypts = []
+                for root_partition in roots:
+                    partition = stack.get(root_partition)
+                    assert partition is not None
+                    (crypt_name,) = partition.children
+                    crypts.append(stack.devices[crypt_name])
+                assert [c.type for c in crypts] == ["crypt", "crypt"]
+                (vg,) = read_layout([c.path for c in crypts]).values()
+                assert sorted(vg.pvs) == sorted(c.path for c in crypts)
+                root = stack.mounted_at(mountdir)
+                assert root is not None and root.vg == vg.name
+                # Both volumes span both containers
+                for crypt in crypts:
+                    assert len(crypt.children) == 2
+                    assert root.name in crypt.children
 
 
 def test_required_arguments() -> None:
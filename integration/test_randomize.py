@@ -5,10 +5,24 @@ from block_util import is_random, is_zero
 from loop_device import loop_device
 
 
-def test_basic() -> None:
+@pytest.mark.parametrize("engine", ["shred", "native"])
+@pytest.mark.parametrize("method", ["random", "dmcrypt"])
+def test_basic(method: str, engine: str) -> None:
     with loop_device(1024) as dev:
         assert is_zero(dev)
-        subprocess.run(["jgsysutil", "randomize-drive", "--yes", dev], check=True)
+        subprocess.run(
+            [
+                "jgsysutil",
+                "randomize-drive",
+                "--yes",
+                "--method",
+                method,
+                "--engine",
+                engine,
+                dev,
+            ],
+            check=True,
+        )
         assert is_random(dev)
 
 
@@ -24,3 +38,25 @@ def test_confirm_works() -> None:
             ["jgsysutil", "randomize-drive", dev], check=True, input="yes", text=True
         )
         assert is_random(dev)
+
+
+@pytest.mark.parametrize("method", ["discard", "zeroout"])
+def test_discard(method: str) -> None:
+    with loop_device(1024) as dev:
+        subprocess.run(["jgsysutil", "randomize-drive", "--yes", dev], check=True)
+        assert is_random(dev)
+        subprocess.run(
+            ["jgsysutil", "randomize-drive", "--yes", "--method", method, dev],
+            check=True,
+        )
+        assert is_zero(dev)
+
+
+def test_multiple() -> None:
+    with loop_device(512) as a, loop_device(512) as b:
+        subprocess.run(
+            ["jgsysutil", "randomize-drive", "--yes", "--engine", "native", a, b],
+            check=True,
+        )
+        assert is_random(a)
+        assert is_random(b)
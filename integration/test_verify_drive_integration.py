@@ -0,0 +1,18 @@
+import subprocess
+
+import pytest
+from loop_device import loop_device
+
+
+def test_basic() -> None:
+    with loop_device(1024) as dev:
+        with pytest.raises(subprocess.CalledProcessError):
+            subprocess.run(["jgsysutil", "verify-drive", dev], check=True)
+        subprocess.run(
+            ["jgsysutil", "randomize-drive", "--yes", "--engine", "native", dev],
+            check=True,
+        )
+        subprocess.run(["jgsysutil", "verify-drive", dev], check=True)
+        subprocess.run(
+            ["jgsysutil", "verify-drive", "--fraction", "0.1", dev], check=True
+        )
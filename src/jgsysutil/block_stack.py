@@ -0,0 +1,254 @@
+import dataclasses
+import json
+import os
+import re
+import stat
+import typing as t
+from pathlib import Path
+
+import click
+
+from jgsysutil.sysfs import read_attr, read_int_attr
+
+SECTOR_SIZE = 512
+SWAP = "[SWAP]"
+# dm-crypt's DM UUID: CRYPT-<LUKS version>-<LUKS UUID without dashes>-<name>
+LUKS_DM_UUID = re.compile(r"^CRYPT-LUKS\d-(?P<uuid>[0-9a-f]{32})-", re.IGNORECASE)
+MOUNTINFO_ESCAPE = re.compile(r"\\([0-7]{3})")
+
+
+@dataclasses.dataclass
+class BlockDevice:
+    # Kernel name (sda1, dm-0), which is what sysfs and the indexes use
+    name: str
+    path: Path
+    devno: str
+    # disk, part, loop, crypt, lvm, dm or md, as lsblk names them
+    type: str
+    size: int
+    parents: t.List[str] = dataclasses.field(default_factory=list)
+    children: t.List[str] = dataclasses.field(default_factory=list)
+    mountpoints: t.List[str] = dataclasses.field(default_factory=list)
+    fstype: t.Optional[str] = None
+    dm_name: t.Optional[str] = None
+    vg: t.Optional[str] = None
+    lv: t.Optional[str] = None
+    luks_uuid: t.Optional[str] = None
+
+    def to_json(self) -> t.Dict[str, t.Any]:
+        data = dataclasses.asdict(self)
+        data["path"] = str(self.path)
+        return data
+
+
+def split_lvm_name(dm_name: str) -> t.Optional[t.Tuple[str, str]]:
+    """
+    The VG and LV names in the device-mapper name of a logical volume, which
+    joins them with a dash and doubles the dashes inside them.
+    """
+    parts = re.split(r"(?<!-)-(?!-)", dm_name.replace("--", "\0"))
+    if len(parts) != 2:
+        return None
+    vg, lv = (part.replace("\0", "-") for part in parts)
+    return vg, lv
+
+
+def format_uuid(hex_uuid: str) -> str:
+    h = hex_uuid.lower()
+    return f"{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:]}"
+
+
+def unescape_mountinfo(field: str) -> str:
+    return MOUNTINFO_ESCAPE.sub(lambda m: chr(int(m[1], 8)), field)
+
+
+def read_device(sysfs: Path) -> BlockDevice:
+    name = sysfs.name
+    device = BlockDevice(
+        name=name,
+        path=Path(f"/dev/{name}"),
+        devno=read_attr(sysfs / "dev"),
+        type="disk",
+        size=read_int_attr(sysfs / "size") * SECTOR_SIZE,
+    )
+    for relation, names in (("slaves", device.parents), ("holders", device.children)):
+        if (sysfs / relation).is_dir():
+            names.extend(sorted(os.listdir(sysfs / relation)))
+    if (sysfs / "partition").exists():
+        device.type = "part"
+    elif name.startswith("loop"):
+        device.type = "loop"
+    elif (sysfs / "md").is_dir():
+        device.type = "md"
+    elif (sysfs / "dm").is_dir():
+        device.dm_name = read_attr(sysfs / "dm" / "name")
+        device.path = Path(f"/dev/mapper/{device.dm_name}")
+        dm_uuid = read_attr(sysfs / "dm" / "uuid")
+        luks = LUKS_DM_UUID.match(dm_uuid)
+        lvm = split_lvm_name(device.dm_name) if dm_uuid.startswith("LVM-") else None
+        if luks is not None:
+            device.type = "crypt"
+            device.luks_uuid = format_uuid(luks["uuid"])
+        elif dm_uuid.startswith("CRYPT-"):
+            device.type = "crypt"
+        elif lvm is not None:
+            device.type = "lvm"
+            device.vg, device.lv = lvm
+        else:
+            device.type = "dm"
+    return device
+
+
+class Snapshot:
+    """
+    The block devices on the system and how they stack, read once from
+    sysfs, the mount table and /proc/swaps, with indexes for looking them up.
+    """
+
+    def __init__(self, devices: t.Iterable[BlockDevice]) -> None:
+        self.devices: t.Dict[str, BlockDevice] = {}
+        self._by_path: t.Dict[str, BlockDevice] = {}
+        self._by_type: t.Dict[str, t.List[BlockDevice]] = {}
+        self._by_mountpoint: t.Dict[str, BlockDevice] = {}
+        self._by_vg: t.Dict[str, t.List[BlockDevice]] = {}
+        self._by_luks_uuid: t.Dict[str, BlockDevice] = {}
+        for device in devices:
+            self.devices[device.name] = device
+            self._by_path[str(device.path)] = device
+            self._by_type.setdefault(device.type, []).append(device)
+            for mountpoint in device.mountpoints:
+                self._by_mountpoint[mountpoint] = device
+            if device.vg is not None:
+                self._by_vg.setdefault(device.vg, []).append(device)
+            if device.luks_uuid is not None:
+                self._by_luks_uuid[device.luks_uuid] = device
+
+    def get(self, name: t.Union[str, Path]) -> t.Optional[BlockDevice]:
+        """
+        A device by kernel name (dm-0), device-mapper name or /dev path.
+        """
+        name = str(name)
+        device = self.devices.get(name) or self._by_path.get(name)
+        if device is None:
+            device = self._by_path.get(f"/dev/mapper/{name}")
+        if device is None and name.startswith("/dev/"):
+            # /dev/vg/lv and /dev/disk/by-* are symlinks
+            device = self._by_path.get(os.path.realpath(name))
+            device = device or self.devices.get(Path(os.path.realpath(name)).name)
+        return device
+
+    def of_type(self, type: str) -> t.List[BlockDevice]:
+        return self._by_type.get(type, [])
+
+    def mounted_at(self, mountpoint: t.Union[str, Path]) -> t.Optional[BlockDevice]:
+        """
+        The device mounted at mountpoint. Any number of devices can be swap,
+        so look those up with swaps() rather than [SWAP].
+        """
+        return self._by_mountpoint.get(str(mountpoint))
+
+    def swaps(self) -> t.List[BlockDevice]:
+        return [d for d in self.devices.values() if SWAP in d.mountpoints]
+
+    def in_vg(self, vg: str) -> t.List[BlockDevice]:
+        return self._by_vg.get(vg, [])
+
+    def luks(self, luks_uuid: str) -> t.Optional[BlockDevice]:
+        return self._by_luks_uuid.get(luks_uuid.lower())
+
+    def descendants(self, name: str) -> t.List[BlockDevice]:
+        """
+        Everything stacked on top of a device, e.g. the partitions, LUKS
+        containers and logical volumes of a disk.
+        """
+        device = self.get(name)
+        if device is None:
+            return []
+        found: t.Dict[str, BlockDevice] = {}
+        pending = [device]
+        while pending:
+            for name in pending.pop().children:
+                if name not in found and name in self.devices:
+                    found[name] = self.devices[name]
+                    pending.append(found[name])
+        return list(found.values())
+
+    def to_json(self) -> t.Dict[str, t.Any]:
+        return {
+            "devices": [device.to_json() for device in self.devices.values()],
+        }
+
+
+def read_mountinfo(path: Path) -> t.Iterator[t.Tuple[str, str, str]]:
+    """
+    (device number, mount point, filesystem type) of each mount.
+    """
+    for line in path.read_text().splitlines():
+        mount, _, filesystem = line.partition(" - ")
+        fields = mount.split()
+        yield fields[2], unescape_mountinfo(fields[4]), filesystem.split()[0]
+
+
+def swap_devnos(path: Path) -> t.Iterator[str]:
+    for line in path.read_text().splitlines()[1:]:
+        filename = unescape_mountinfo(line.split()[0])
+        try:
+            st = os.stat(filename)
+        except OSError:
+            continue
+        if stat.S_ISBLK(st.st_mode):
+            yield f"{os.major(st.st_rdev)}:{os.minor(st.st_rdev)}"
+
+
+def snapshot(sysfs: Path = Path("/sys"), proc: Path = Path("/proc")) -> Snapshot:
+    block = sysfs / "class" / "block"
+    devices = [read_device((block / name).resolve()) for name in os.listdir(block)]
+    by_name = {device.name: device for device in devices}
+    # Partitions are subdirectories of their disk rather than holders of it
+    for device in devices:
+        disk = by_name.get((block / device.name).resolve().parent.name)
+        if device.type == "part" and disk is not None:
+            device.parents.append(disk.name)
+            disk.children.append(device.name)
+    by_devno = {device.devno: device for device in devices}
+    for devno, mountpoint, fstype in read_mountinfo(proc / "self" / "mountinfo"):
+        mounted = by_devno.get(devno)
+        if mounted is not None:
+            mounted.mountpoints.append(mountpoint)
+            mounted.fstype = fstype
+    for devno in swap_devnos(proc / "swaps"):
+        if devno in by_devno:
+            by_devno[devno].mountpoints.append(SWAP)
+            by_devno[devno].fstype = "swap"
+    return Snapshot(sorted(devices, key=lambda d: d.name))
+
+
+@click.command()
+@click.argument("devices", nargs=-1)
+@click.option(
+    "--type",
+    "types",
+    multiple=True,
+    help="only list devices of this type (disk, part, loop, crypt, lvm, dm, md)",
+)
+def inspect(devices: t.Tuple[str, ...], types: t.Tuple[str, ...]) -> None:
+    """
+    Prints the block devices and how they stack, as JSON.
+
+    With DEVICES, only those devices and everything stacked on them (their
+    partitions, LUKS containers, logical volumes, ...) are listed.
+    """
+    snap = snapshot()
+    listed = list(snap.devices.values())
+    if devices:
+        selected: t.Dict[str, BlockDevice] = {}
+        for name in devices:
+            device = snap.get(name)
+            if device is None:
+                raise click.UsageError(f"No block device {name}")
+            selected[device.name] = device
+            selected.update((d.name, d) for d in snap.descendants(device.name))
+        listed = sorted(selected.values(), key=lambda d: d.name)
+    if types:
+        listed = [device for device in listed if device.type in types]
+    click.echo(json.dumps(Snapshot(listed).to_json(), indent=2))
@@ -0,0 +1,164 @@
+import dataclasses
+import json
+import os
+import threading
+import time
+import typing as t
+from contextlib import contextmanager
+from pathlib import Path
+
+from xdg import XDG_DATA_HOME
+
+from jgsysutil.identity import DeviceIdentity, device_identity
+
+Range = t.Tuple[int, int]
+
+CHECKPOINT_DIR = XDG_DATA_HOME / "jgsysutil" / "checkpoints"
+
+
+class CheckpointError(Exception):
+    pass
+
+
+def merge_ranges(ranges: t.Iterable[Range]) -> t.List[Range]:
+    """
+    Merge overlapping or adjacent (offset, length) ranges.
+    """
+    merged: t.List[Range] = []
+    for offset, length in sorted(ranges):
+        if merged and offset <= merged[-1][0] + merged[-1][1]:
+            last_offset, last_length = merged[-1]
+            end = max(last_offset + last_length, offset + length)
+            merged[-1] = (last_offset, end - last_offset)
+        else:
+            merged.append((offset, length))
+    return merged
+
+
+def missing_ranges(completed: t.Iterable[Range], size: int) -> t.List[Range]:
+    """
+    The parts of [0, size) not covered by completed.
+    """
+    missing: t.List[Range] = []
+    position = 0
+    for offset, length in merge_ranges(completed):
+        if offset > position:
+            missing.append((position, offset - position))
+        position = max(position, offset + length)
+    if position < size:
+        missing.append((position, size - position))
+    return missing
+
+
+class Checkpoint:
+    """
+    Records which byte ranges of a device have been durably wiped.
+
+    Ranges are recorded as writes complete, and saved at most every interval
+    seconds; each save first flushes the device, so anything in the checkpoint
+    file is known to be on the disk.
+    """
+
+    def __init__(
+        self,
+        drive: Path,
+        identity: DeviceIdentity,
+        method: str,
+        completed: t.List[Range],
+        interval: float = 10.0,
+    ) -> None:
+        self.drive = drive
+        # Flushed before each save
+        self.devices = [drive]
+        self.identity = identity
+        self.method = method
+        self.path = CHECKPOINT_DIR / f"{identity.key()}.json"
+        self.interval = interval
+        self._completed = merge_ranges(completed)
+        self._pending: t.List[Range] = []
+        self._lock = threading.Lock()
+        self._last_save = time.monotonic()
+
+    @classmethod
+    def open(cls, drive: Path, method: str, resume: bool) -> "Checkpoint":
+        """
+        Start a checkpoint for wiping drive with method.
+
+        If resume is set, continue from the saved checkpoint for this device, if
+        there is one; otherwise any saved checkpoint is discarded.
+        """
+        identity = device_identity(drive)
+        if not identity.is_stable:
+            raise CheckpointError(
+                f"{drive} has no serial, WWN or partition UUID to key a checkpoint by"
+            )
+        checkpoint = cls(drive, identity, method, [])
+        if resume and checkpoint.path.exists():
+            data = json.loads(checkpoint.path.read_text())
+            if DeviceIdentity.from_json(data["identity"]) != identity:
+                raise CheckpointError(f"{checkpoint.path} is for a different device")
+            if data["method"] != method:
+                raise CheckpointError(
+                    f"{checkpoint.path} is for method {data['method']}, not {method}"
+                )
+            checkpoint._completed = merge_ranges(
+                (offset, length) for offset, length in data["completed"]
+            )
+        return checkpoint
+
+    def remaining(self) -> t.List[Range]:
+        return missing_ranges(self._completed, self.identity.size)
+
+    @property
+    def completed_bytes(self) -> int:
+        return sum(length for _, length in self._completed)
+
+    def record(self, offset: int, length: int) -> None:
+        with self._lock:
+            self._pending.append((offset, length))
+            due = time.monotonic() - self._last_save >= self.interval
+        if due:
+            self.save()
+
+    @contextmanager
+    def writing_through(self, device: Path) -> t.Iterator[None]:
+        """
+        Also flush device, which the wipe writes to in place of the drive (like
+        a dm-crypt mapping of it), before each save while it exists.
+        """
+        self.devices.insert(0, device)
+        try:
+            yield
+        except BaseException:
+            self.save()
+            raise
+        finally:
+            self.devices.remove(device)
+
+    def save(self) -> None:
+        with self._lock:
+            pending, self._pending = self._pending, []
+            self._last_save = time.monotonic()
+            devices = list(self.devices)
+        # Everything in pending has been written, make sure it is also durable:
+        # whatever the wipe wrote through first, then the drive under it
+        for device in devices:
+            fd = os.open(device, os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+        with self._lock:
+            self._completed = merge_ranges(self._completed + pending)
+            data = {
+                "identity": dataclasses.asdict(self.identity),
+                "method": self.method,
+                "completed": self._completed,
+            }
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(".tmp")
+            tmp.write_text(json.dumps(data))
+            os.replace(tmp, self.path)
+
+    def remove(self) -> None:
+        self.path.unlink(missing_ok=True)
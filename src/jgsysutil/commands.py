@@ -0,0 +1,38 @@
+from pathlib import Path
+
+# fmt: off
+cryptsetup = Path("/nonexistent/cryptsetup")
+dd = Path("/usr/bin/dd")
+free = Path("/usr/bin/free")
+gdisk = Path("/nonexistent/gdisk")
+lvcreate = Path("/nonexistent/lvcreate")
+mkdir = Path("/usr/bin/mkdir")
+mkfs_ext4 = Path("/usr/sbin/mkfs.ext4")
+mkfs_fat = Path("/nonexistent/mkfs.fat")
+mkswap = Path("/usr/sbin/mkswap")
+mount = Path("/usr/bin/mount")
+umount = Path("/usr/bin/umount")
+openssl = Path("/root/miniconda/bin/openssl")
+shred = Path("/usr/bin/shred")
+pvcreate = Path("/nonexistent/pvcreate")
+rsync = Path("/nonexistent/rsync")
+swapon = Path("/usr/sbin/swapon")
+swapoff = Path("/usr/sbin/swapoff")
+vgcreate = Path("/nonexistent/vgcreate")
+vgchange = Path("/nonexistent/vgchange")
+lvdisplay = Path("/nonexistent/lvdisplay")
+losetup = Path("/usr/sbin/losetup")
+lsblk = Path("/usr/bin/lsblk")
+ionice = Path("/usr/bin/ionice")
+zramctl = Path("/usr/sbin/zramctl")
+blkid = Path("/usr/sbin/blkid")
+lvm = Path("/usr/sbin/lvm")
+# fmt: on
+
+
+# These are special -- we want to use the "system"
+# version of these commands.
+nix_env = "nix-env"
+nix_channel = "nix-channel"
+nix_shell = "nix-shell"
+nixos_rebuild = "nixos-rebuild"
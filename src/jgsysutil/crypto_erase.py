@@ -0,0 +1,285 @@
+import dataclasses
+import datetime
+import json
+import os
+import struct
+import time
+import typing as t
+from pathlib import Path
+
+import click
+
+from jgsysutil.block_stack import snapshot
+from jgsysutil.commands import cryptsetup
+from jgsysutil.discard import DiscardKind, DiscardUnsupported, discard_device
+from jgsysutil.identity import device_identity
+from jgsysutil.luks_tuning import LUKS_LABEL
+from jgsysutil.native_wipe import device_size
+from jgsysutil.process import run
+from jgsysutil.run_state import blkid_tags
+
+LUKS_MAGIC = b"LUKS\xba\xbe"
+LUKS2_SECONDARY_MAGIC = b"SKUL\xba\xbe"
+# Where LUKS2 may put its secondary header, which is where blkid looks for it
+LUKS2_SECONDARY_OFFSETS = [0x4000 << i for i in range(9)]
+LUKS1_KEYSLOTS = 8
+LUKS1_KEYSLOT_ACTIVE = 0x00AC71F3
+SECTOR = 512
+WRITE_SIZE = 1024 * 1024
+
+
+class CryptoEraseError(Exception):
+    pass
+
+
+@dataclasses.dataclass(frozen=True)
+class LuksHeader:
+    version: int
+    uuid: str
+    label: t.Optional[str]
+    # Bytes from the start of the header covering every header copy and the
+    # keyslot areas, i.e. everything that has to go for the key to be lost
+    size: int
+    # Where the encrypted data starts on the data device
+    data_offset: int
+    keyslots: int
+
+
+def c_string(field: bytes) -> str:
+    return field.split(b"\0", 1)[0].decode(errors="replace")
+
+
+def parse_luks1(header: bytes) -> LuksHeader:
+    payload_offset, key_bytes = struct.unpack(">II", header[104:112])
+    size = 592  # the binary header itself
+    keyslots = 0
+    for i in range(LUKS1_KEYSLOTS):
+        active, _, material_offset, stripes = struct.unpack_from(
+            ">II32xII", header, 208 + 48 * i
+        )
+        if active == LUKS1_KEYSLOT_ACTIVE:
+            keyslots += 1
+        material = -(-key_bytes * stripes // SECTOR) * SECTOR
+        size = max(size, material_offset * SECTOR + material)
+    return LuksHeader(
+        version=1,
+        uuid=c_string(header[168:208]),
+        label=None,
+        size=size,
+        data_offset=payload_offset * SECTOR,
+        keyslots=keyslots,
+    )
+
+
+def parse_luks2(header: bytes, json_area: bytes) -> LuksHeader:
+    (hdr_size,) = struct.unpack(">Q", header[8:16])
+    metadata = json.loads(c_string(json_area))
+    segments = sorted(metadata["segments"].values(), key=lambda s: int(s["offset"]))
+    return LuksHeader(
+        version=2,
+        uuid=c_string(header[168:208]),
+        label=c_string(header[24:72]) or None,
+        # The primary and secondary headers, then the keyslots area
+        size=2 * hdr_size + int(metadata["config"]["keyslots_size"]),
+        data_offset=int(segments[0]["offset"]) if segments else 0,
+        keyslots=len(metadata["keyslots"]),
+    )
+
+
+def read_luks_header(path: Path) -> LuksHeader:
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        header = os.pread(fd, 4096, 0)
+        if header[:6] != LUKS_MAGIC:
+            raise CryptoEraseError(f"{path} has no LUKS header")
+        (version,) = struct.unpack(">H", header[6:8])
+        if version == 1:
+            return parse_luks1(header)
+        elif version == 2:
+            (hdr_size,) = struct.unpack(">Q", header[8:16])
+            return parse_luks2(header, os.pread(fd, hdr_size - 4096, 4096))
+        raise CryptoEraseError(f"{path} has unknown LUKS version {version}")
+    finally:
+        os.close(fd)
+
+
+def overwrite(path: Path, length: int) -> int:
+    """
+    Overwrite the first length bytes of path with random data, returning how
+    many bytes that was (no more than the size of path).
+    """
+    length = min(length, device_size(path))
+    fd = os.open(path, os.O_WRONLY)
+    try:
+        for offset in range(0, length, WRITE_SIZE):
+            os.pwrite(fd, os.urandom(min(WRITE_SIZE, length - offset)), offset)
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+    return length
+
+
+def header_remains(path: Path) -> bool:
+    """
+    Whether any LUKS header signature can still be found on path.
+    """
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        if os.pread(fd, 6, 0) == LUKS_MAGIC:
+            return True
+        for offset in LUKS2_SECONDARY_OFFSETS:
+            if os.pread(fd, 6, offset) == LUKS2_SECONDARY_MAGIC:
+                return True
+    finally:
+        os.close(fd)
+    return blkid_tags(path).get("TYPE") == "crypto_LUKS"
+
+
+@dataclasses.dataclass
+class CryptoEraseReport:
+    device: str
+    identity: t.Dict[str, t.Any]
+    header_device: str
+    luks_version: int
+    luks_uuid: str
+    label: t.Optional[str]
+    keyslots_erased: int
+    header_bytes_overwritten: int
+    discarded_bytes: int
+    started_at: str
+    seconds: float
+
+    def to_json(self) -> str:
+        return json.dumps(dataclasses.asdict(self), indent=2)
+
+
+def crypto_erase_lib(
+    drive: Path,
+    header_file: t.Optional[Path] = None,
+    discard: bool = False,
+    force: bool = False,
+) -> CryptoEraseReport:
+    """
+    Make the data in the LUKS container on drive unrecoverable by destroying
+    its keys: erase the keyslots, then overwrite every copy of the header and
+    the keyslot areas. header_file is the header of a container with a
+    detached header.
+    """
+    started_at = datetime.datetime.now(datetime.timezone.utc).isoformat()
+    start = time.monotonic()
+    header_device = header_file or drive
+    header = read_luks_header(header_device)
+    if header.label != LUKS_LABEL and not force:
+        raise CryptoEraseError(
+            f"{header_device} is not a LUKS container created by prepare-drive "
+            f"(its label is {header.label!r}, not {LUKS_LABEL!r})"
+        )
+    device = snapshot().get(str(drive))
+    if device is not None and device.children:
+        raise CryptoEraseError(
+            f"{drive} is in use by {', '.join(device.children)}; close it first"
+        )
+    identity = dataclasses.asdict(device_identity(drive))
+
+    header_args: t.List[t.Union[str, Path]] = []
+    if header_file is not None:
+        header_args = ["--header", header_file]
+    run(
+        [cryptsetup, "luksErase", "--batch-mode", *header_args, drive],
+        check=True,
+    )
+    # luksErase leaves the rest of the header, including the UUID and the
+    # backup copy, behind; none of it is any use without the keyslots
+    if header_file is None:
+        overwritten = overwrite(drive, max(header.size, header.data_offset))
+    else:
+        overwritten = overwrite(header_file, header.size)
+    if header_remains(header_device):
+        raise CryptoEraseError(f"A LUKS header is still present on {header_device}")
+
+    discarded = 0
+    if discard:
+        try:
+            discarded = discard_device(
+                drive,
+                DiscardKind.DISCARD,
+                start=overwritten if header_file is None else 0,
+            ).bytes_written
+        except DiscardUnsupported as e:
+            click.secho(f"Not discarding: {e}", fg="yellow", err=True)
+
+    return CryptoEraseReport(
+        device=str(drive),
+        identity=identity,
+        header_device=str(header_device),
+        luks_version=header.version,
+        luks_uuid=header.uuid,
+        label=header.label,
+        keyslots_erased=header.keyslots,
+        header_bytes_overwritten=overwritten,
+        discarded_bytes=discarded,
+        started_at=started_at,
+        seconds=time.monotonic() - start,
+    )
+
+
+@click.command()
+@click.argument(
+    "drive",
+    type=click.Path(exists=True, file_okay=True, dir_okay=False, resolve_path=True),
+)
+@click.option(
+    "--header",
+    "header_file",
+    type=click.Path(exists=True, file_okay=True, dir_okay=False, resolve_path=True),
+    help="detached LUKS header of DRIVE, which is erased instead of DRIVE's",
+)
+@click.option(
+    "--discard/--no-discard",
+    default=False,
+    help="discard the rest of DRIVE after erasing the header",
+)
+@click.option(
+    "--force",
+    is_flag=True,
+    help="erase LUKS containers that prepare-drive did not create",
+)
+@click.option(
+    "--report",
+    type=click.Path(dir_okay=False, writable=True),
+    help="write a JSON record of what was erased to this file",
+)
+@click.confirmation_option(prompt="This destroys all data on the drive. Continue?")
+def crypto_erase(
+    drive: str,
+    header_file: t.Optional[str],
+    discard: bool,
+    force: bool,
+    report: t.Optional[str],
+) -> None:
+    """
+    Destroys the LUKS container on DRIVE by erasing its keys.
+
+    Every keyslot is erased, and then every copy of the header and the keyslot
+    areas is overwritten, so the data can no longer be decrypted with any
+    passphrase. Unlike randomize-drive this takes seconds. Only containers
+    created by prepare-drive are erased unless --force is set.
+    """
+    try:
+        result = crypto_erase_lib(
+            Path(drive),
+            None if header_file is None else Path(header_file),
+            discard,
+            force,
+        )
+    except CryptoEraseError as e:
+        raise click.ClickException(str(e)) from e
+    if report is not None:
+        Path(report).write_text(result.to_json() + "\n")
+    click.echo(
+        f"Erased {result.keyslots_erased} keyslots and "
+        f"{result.header_bytes_overwritten} header bytes of LUKS{result.luks_version} "
+        f"container {result.luks_uuid} in {result.seconds:.1f}s"
+    )
+    if result.discarded_bytes:
+        click.echo(f"Discarded {result.discarded_bytes} bytes")
@@ -0,0 +1,104 @@
+import enum
+import errno
+import fcntl
+import os
+import struct
+import threading
+import time
+import typing as t
+from pathlib import Path
+
+from jgsysutil.native_wipe import WipeCancelled, WipeStats, device_size
+from jgsysutil.sysfs import queue_dir, read_int_attr
+from jgsysutil.typing import assert_never
+
+# From linux/fs.h; all take a {start, length} pair of u64s
+BLKDISCARD = 0x1277
+BLKSECDISCARD = 0x127D
+BLKZEROOUT = 0x127F
+
+DEFAULT_CHUNK_SIZE = 1024 * 1024 * 1024
+
+
+class DiscardKind(enum.Enum):
+    DISCARD = "discard"
+    SECURE_DISCARD = "secure-discard"
+    ZEROOUT = "zeroout"
+
+
+class DiscardUnsupported(Exception):
+    pass
+
+
+def ioctl_number(kind: DiscardKind) -> int:
+    if kind is DiscardKind.DISCARD:
+        return BLKDISCARD
+    elif kind is DiscardKind.SECURE_DISCARD:
+        return BLKSECDISCARD
+    elif kind is DiscardKind.ZEROOUT:
+        return BLKZEROOUT
+    else:
+        assert_never(kind)
+
+
+def supports(drive: Path, kind: DiscardKind) -> bool:
+    """
+    Whether the device advertises kind in sysfs. Files never do.
+
+    The kernel does not export secure discard support, so it is assumed to be
+    available wherever plain discard is; discard_device raises
+    DiscardUnsupported if the device then rejects it.
+    """
+    queue = queue_dir(drive)
+    if queue is None:
+        return False
+    if kind is DiscardKind.DISCARD or kind is DiscardKind.SECURE_DISCARD:
+        return read_int_attr(queue / "discard_max_bytes") > 0
+    elif kind is DiscardKind.ZEROOUT:
+        # Without hardware offload the kernel would write the zeros itself,
+        # which is no faster than a normal overwrite.
+        return read_int_attr(queue / "write_zeroes_max_bytes") > 0
+    else:
+        assert_never(kind)
+
+
+def discard_device(
+    drive: Path,
+    kind: DiscardKind,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    on_written: t.Optional[t.Callable[[int, int], None]] = None,
+    start: int = 0,
+    cancel: t.Optional[threading.Event] = None,
+) -> WipeStats:
+    """
+    Issue kind over drive from start to the end, chunk_size bytes at a time.
+
+    on_written is called with each (offset, length) chunk once it is done.
+    Once cancel is set, WipeCancelled is raised before the next chunk.
+    """
+    if not supports(drive, kind):
+        raise DiscardUnsupported(f"{drive} does not support {kind.value}")
+    size = device_size(drive)
+    request = ioctl_number(kind)
+    start_time = time.monotonic()
+    fd = os.open(drive, os.O_WRONLY)
+    try:
+        for offset in range(start, size, chunk_size):
+            if cancel is not None and cancel.is_set():
+                raise WipeCancelled(f"Wiping {drive} was cancelled")
+            length = min(chunk_size, size - offset)
+            try:
+                fcntl.ioctl(fd, request, struct.pack("QQ", offset, length))
+            except OSError as e:
+                if offset == start and e.errno in (errno.EOPNOTSUPP, errno.ENOTTY):
+                    raise DiscardUnsupported(
+                        f"{drive} does not support {kind.value}"
+                    ) from e
+                raise
+            if on_written is not None:
+                on_written(offset, length)
+    finally:
+        os.close(fd)
+    return WipeStats(
+        bytes_written=max(size - start, 0), seconds=time.monotonic() - start_time
+    )
@@ -0,0 +1,83 @@
+import enum
+import typing as t
+
+import click
+
+from jgsysutil.topology import Topology
+from jgsysutil.typing import assert_never
+
+F = t.TypeVar("F", bound=t.Callable[..., t.Any])
+
+
+class FormatProfile(enum.Enum):
+    """
+    How mkfs.ext4 trades its own run time against the filesystem's first use.
+    """
+
+    # mkfs.ext4's defaults: inode tables are zeroed lazily by the kernel
+    # after the first mount, the journal up front
+    DEFAULT = "default"
+    # Leave inode tables and the journal to the kernel: mkfs returns at once,
+    # but the first minutes after mounting compete with background writes
+    FAST_MKFS = "fast-mkfs"
+    # Zero everything during mkfs, so the first boot has the disk to itself
+    FAST_FIRST_USE = "fast-first-use"
+    # Data volumes of large files need far fewer inodes, which also makes
+    # initializing them eagerly cheap
+    LARGEFILE = "largefile"
+    LARGEFILE4 = "largefile4"
+
+
+def lazy_init(profile: FormatProfile) -> t.Optional[bool]:
+    if profile is FormatProfile.DEFAULT:
+        return None
+    elif profile is FormatProfile.FAST_MKFS:
+        return True
+    elif profile is FormatProfile.FAST_FIRST_USE:
+        return False
+    elif profile is FormatProfile.LARGEFILE or profile is FormatProfile.LARGEFILE4:
+        return False
+    else:
+        assert_never(profile)
+
+
+def usage_type(profile: FormatProfile) -> t.Optional[str]:
+    if profile is FormatProfile.LARGEFILE or profile is FormatProfile.LARGEFILE4:
+        return profile.value
+    return None
+
+
+def ext4_args(profile: FormatProfile, topology: Topology, wiped: bool) -> t.List[str]:
+    """
+    mkfs.ext4 options for a filesystem on a device with topology.
+
+    wiped means the device was randomized or discarded earlier in the run, so
+    discarding it again would at best repeat that work, and at worst undo a
+    random fill.
+    """
+    args = []
+    usage = usage_type(profile)
+    if usage is not None:
+        args += ["-T", usage]
+    extended = topology.ext4_extended_options()
+    if wiped:
+        extended.append("nodiscard")
+    lazy = lazy_init(profile)
+    if lazy is not None:
+        extended += [f"lazy_itable_init={int(lazy)}", f"lazy_journal_init={int(lazy)}"]
+    if extended:
+        args += ["-E", ",".join(extended)]
+    return args
+
+
+def format_profile_option(f: F) -> F:
+    """
+    Click option for choosing a FormatProfile.
+    """
+    return click.option(
+        "--format-profile",
+        type=click.Choice([profile.value for profile in FormatProfile]),
+        default=FormatProfile.DEFAULT.value,
+        show_default=True,
+        help="fast-mkfs leaves zeroing inode tables and the journal to the kernel after mounting, fast-first-use does it during mkfs, largefile and largefile4 also allocate far fewer inodes for volumes of large files",
+    )(f)
@@ -0,0 +1,252 @@
+import dataclasses
+import fcntl
+import os
+import stat
+import struct
+import typing as t
+import uuid
+import zlib
+from pathlib import Path
+
+from jgsysutil.native_wipe import device_size
+from jgsysutil.topology import MIB, Topology, probe
+
+# From linux/fs.h
+BLKRRPART = 0x125F
+
+EFI_SYSTEM = uuid.UUID("C12A7328-F81F-11D2-BA4B-00A0C93EC93B")
+LINUX_FILESYSTEM = uuid.UUID("0FC63DAF-8483-4772-8E79-3D69D8477DE4")
+LINUX_LUKS = uuid.UUID("CA7D7CCB-63ED-4C53-861C-1742536059CC")
+
+HEADER_SIZE = 92
+ENTRY_SIZE = 128
+ENTRY_COUNT = 128
+HEADER = struct.Struct("<8sIIIIQQQQ16sQIII")
+ENTRY = struct.Struct("<16s16sQQQ72s")
+
+
+class DiskTooSmallError(Exception):
+    pass
+
+
+@dataclasses.dataclass
+class Partition:
+    """
+    A partition to create; a size of None takes the rest of the disk.
+    """
+
+    type_guid: uuid.UUID
+    name: str
+    size: t.Optional[int] = None
+
+
+@dataclasses.dataclass
+class PartitionEntry:
+    type_guid: uuid.UUID
+    guid: uuid.UUID
+    first_lba: int
+    last_lba: int
+    name: str
+
+    def pack(self) -> bytes:
+        return ENTRY.pack(
+            self.type_guid.bytes_le,
+            self.guid.bytes_le,
+            self.first_lba,
+            self.last_lba,
+            0,
+            self.name.encode("utf-16-le"),
+        )
+
+
+def entry_array_lbas(lba_size: int) -> int:
+    return -(-ENTRY_COUNT * ENTRY_SIZE // lba_size)
+
+
+def layout(
+    partitions: t.Sequence[Partition],
+    total_lbas: int,
+    lba_size: int,
+    alignment: int = MIB,
+    alignment_offset: int = 0,
+) -> t.List[PartitionEntry]:
+    """
+    Place partitions one after another, each starting alignment_offset bytes
+    past an alignment byte boundary.
+    """
+    if len(partitions) > ENTRY_COUNT:
+        raise ValueError(f"At most {ENTRY_COUNT} partitions are supported")
+    align_lbas = max(1, alignment // lba_size)
+    offset_lbas = alignment_offset // lba_size
+    last_usable = total_lbas - 2 - entry_array_lbas(lba_size)
+    position = 2 + entry_array_lbas(lba_size)
+    entries = []
+    for i, partition in enumerate(partitions):
+        first = -(-(position - offset_lbas) // align_lbas) * align_lbas + offset_lbas
+        if partition.size is None:
+            if i != len(partitions) - 1:
+                raise ValueError("Only the last partition can fill the disk")
+            last = last_usable
+        else:
+            last = first + -(-partition.size // lba_size) - 1
+        if last > last_usable or last < first:
+            raise ValueError(f"Partition {partition.name} does not fit on the disk")
+        entries.append(
+            PartitionEntry(
+                type_guid=partition.type_guid,
+                guid=uuid.uuid4(),
+                first_lba=first,
+                last_lba=last,
+                name=partition.name,
+            )
+        )
+        position = last + 1
+    return entries
+
+
+def minimum_size(
+    partitions: t.Sequence[Partition],
+    lba_size: int,
+    alignment: int = MIB,
+    alignment_offset: int = 0,
+) -> int:
+    """
+    The smallest disk, in bytes, that partitions fit on, with a partition that
+    fills the disk getting one alignment's worth.
+    """
+    sized = [
+        dataclasses.replace(p, size=alignment) if p.size is None else p
+        for p in partitions
+    ]
+    # Far more than any disk, so that everything fits
+    entries = layout(sized, 2**48, lba_size, alignment, alignment_offset)
+    return (entries[-1].last_lba + 2 + entry_array_lbas(lba_size)) * lba_size
+
+
+def protective_mbr(total_lbas: int) -> bytes:
+    mbr = bytearray(512)
+    mbr[446:462] = struct.pack(
+        "<B3sB3sII",
+        0,  # not bootable
+        b"\x00\x02\x00",  # CHS of LBA 1
+        0xEE,  # GPT protective
+        b"\xff\xff\xff",  # CHS past the end
+        1,
+        min(total_lbas - 1, 0xFFFFFFFF),
+    )
+    mbr[510:512] = b"\x55\xaa"
+    return bytes(mbr)
+
+
+def header(
+    current_lba: int,
+    backup_lba: int,
+    entries_lba: int,
+    total_lbas: int,
+    lba_size: int,
+    disk_guid: uuid.UUID,
+    entries_crc: int,
+) -> bytes:
+    fields = [
+        b"EFI PART",
+        0x00010000,
+        HEADER_SIZE,
+        0,  # header CRC, filled in below
+        0,
+        current_lba,
+        backup_lba,
+        2 + entry_array_lbas(lba_size),
+        total_lbas - 2 - entry_array_lbas(lba_size),
+        disk_guid.bytes_le,
+        entries_lba,
+        ENTRY_COUNT,
+        ENTRY_SIZE,
+        entries_crc,
+    ]
+    fields[3] = zlib.crc32(HEADER.pack(*fields))
+    return HEADER.pack(*fields).ljust(lba_size, b"\0")
+
+
+def build(
+    entries: t.Sequence[PartitionEntry],
+    total_lbas: int,
+    lba_size: int,
+    disk_guid: t.Optional[uuid.UUID] = None,
+) -> t.Tuple[bytes, bytes]:
+    """
+    The primary (from LBA 0: protective MBR, header and entries) and backup
+    (entries and header, ending at the last LBA) halves of a GPT.
+    """
+    if disk_guid is None:
+        disk_guid = uuid.uuid4()
+    array = b"".join(entry.pack() for entry in entries)
+    array = array.ljust(entry_array_lbas(lba_size) * lba_size, b"\0")
+    crc = zlib.crc32(array[: ENTRY_COUNT * ENTRY_SIZE])
+    last_lba = total_lbas - 1
+    backup_entries_lba = last_lba - entry_array_lbas(lba_size)
+    primary = b"".join(
+        [
+            protective_mbr(total_lbas).ljust(lba_size, b"\0"),
+            header(1, last_lba, 2, total_lbas, lba_size, disk_guid, crc),
+            array,
+        ]
+    )
+    backup = array + header(
+        last_lba, 1, backup_entries_lba, total_lbas, lba_size, disk_guid, crc
+    )
+    return primary, backup
+
+
+@dataclasses.dataclass
+class PartitionTable:
+    lba_size: int
+    entries: t.List[PartitionEntry]
+
+    def describe(self) -> str:
+        lines = ["Number  Start (sector)    End (sector)  Size (MiB)  Name"]
+        for number, entry in enumerate(self.entries, start=1):
+            size = (entry.last_lba - entry.first_lba + 1) * self.lba_size / MIB
+            lines.append(
+                f"{number:>6}  {entry.first_lba:>14}  {entry.last_lba:>14}"
+                f"  {size:>10.1f}  {entry.name}"
+            )
+        return "\n".join(lines)
+
+
+def write_partition_table(
+    drive: Path, partitions: t.Sequence[Partition]
+) -> PartitionTable:
+    """
+    Replace the partition table of drive with a GPT holding partitions, and
+    have the kernel reread it.
+    """
+    is_block = stat.S_ISBLK(os.stat(drive).st_mode)
+    topology = probe(drive) if is_block else Topology(512, 512, 512, 0, 0)
+    lba_size = topology.logical_block_size
+    total_lbas = device_size(drive) // lba_size
+    minimum = minimum_size(
+        partitions, lba_size, topology.alignment, topology.alignment_offset
+    )
+    if total_lbas * lba_size < minimum:
+        raise DiskTooSmallError(
+            f"{drive} is too small: the partitions need at least "
+            f"{-(-minimum // MIB)} MiB"
+        )
+    entries = layout(
+        partitions,
+        total_lbas,
+        lba_size,
+        topology.alignment,
+        topology.alignment_offset,
+    )
+    primary, backup = build(entries, total_lbas, lba_size)
+    fd = os.open(drive, os.O_RDWR)
+    try:
+        os.pwrite(fd, primary, 0)
+        os.pwrite(fd, backup, total_lbas * lba_size - len(backup))
+        os.fsync(fd)
+        if is_block:
+            fcntl.ioctl(fd, BLKRRPART)
+    finally:
+        os.close(fd)
+    return PartitionTable(lba_size=lba_size, entries=entries)
@@ -0,0 +1,93 @@
+import dataclasses
+import hashlib
+import json
+import subprocess
+import typing as t
+from pathlib import Path
+
+from jgsysutil.commands import lsblk
+from jgsysutil.sysfs import block_sysfs_dir, read_attr
+
+
+@dataclasses.dataclass(frozen=True)
+class DeviceIdentity:
+    """
+    Facts that identify a physical device independently of its /dev name, which
+    can change between boots.
+
+    A partition is identified by its disk's serial, WWN or loop backing file
+    and its number, which stay the same when the partition table is rewritten;
+    its PARTUUID does not, so is only used when the disk has none of them.
+    """
+
+    serial: t.Optional[str]
+    wwn: t.Optional[str]
+    partition: t.Optional[int]
+    partuuid: t.Optional[str]
+    backing_file: t.Optional[str]
+    size: int
+
+    @property
+    def is_stable(self) -> bool:
+        return any(
+            x is not None
+            for x in (self.serial, self.wwn, self.partuuid, self.backing_file)
+        )
+
+    def key(self) -> str:
+        encoded = json.dumps(dataclasses.asdict(self), sort_keys=True)
+        return hashlib.sha256(encoded.encode()).hexdigest()
+
+    @classmethod
+    def from_json(cls, data: t.Dict[str, t.Any]) -> "DeviceIdentity":
+        return cls(**data)
+
+
+def loop_backing_file(drive: Path) -> t.Optional[str]:
+    # Loop devices have no serial, but their backing file is just as good
+    sysfs = block_sysfs_dir(drive)
+    if sysfs is None:
+        return None
+    suffix = ""
+    if (sysfs / "partition").exists():
+        suffix = f"#{read_attr(sysfs / 'partition')}"
+        sysfs = sysfs.parent
+    backing_file = sysfs / "loop" / "backing_file"
+    if not backing_file.exists():
+        return None
+    return read_attr(backing_file) + suffix
+
+
+def lsblk_info(drive: Path, columns: str) -> t.Dict[str, t.Any]:
+    (info,) = json.loads(
+        subprocess.run(
+            [lsblk, "--json", "--nodeps", "--bytes", "--output", columns, drive],
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+    )["blockdevices"]
+    return info
+
+
+def device_identity(drive: Path) -> DeviceIdentity:
+    info = lsblk_info(drive, "SERIAL,WWN,PARTUUID,SIZE")
+    serial, wwn = info["serial"] or None, info["wwn"] or None
+    partition = None
+    sysfs = block_sysfs_dir(drive)
+    if sysfs is not None and (sysfs / "partition").exists():
+        partition = int(read_attr(sysfs / "partition"))
+        disk = lsblk_info(Path("/dev") / sysfs.parent.name, "SERIAL,WWN")
+        serial, wwn = disk["serial"] or None, disk["wwn"] or None
+    backing_file = loop_backing_file(drive)
+    partuuid = info["partuuid"] or None
+    if serial is not None or wwn is not None or backing_file is not None:
+        partuuid = None
+    return DeviceIdentity(
+        serial=serial,
+        wwn=wwn,
+        partition=partition,
+        partuuid=partuuid,
+        backing_file=backing_file,
+        size=int(info["size"]),
+    )
@@ -0,0 +1,256 @@
+import dataclasses
+import json
+import os
+import platform
+import re
+import subprocess
+import threading
+import typing as t
+from pathlib import Path
+
+import click
+from xdg import XDG_CACHE_HOME
+
+from jgsysutil.commands import cryptsetup
+from jgsysutil.native_wipe import device_size
+from jgsysutil.process import run
+from jgsysutil.sysfs import block_sysfs_dir, is_rotational, queue_dir, read_int_attr
+
+F = t.TypeVar("F", bound=t.Callable[..., t.Any])
+
+BENCHMARK_CACHE = XDG_CACHE_HOME / "jgsysutil" / "cryptsetup-benchmark.json"
+# Set on the LUKS containers prepare-drive creates, so that crypto-erase can
+# tell them apart from containers it should not touch without --force
+LUKS_LABEL = "jgsysutil"
+# cryptsetup's default for XTS, which splits the key in two: AES-256. Tuning
+# must not trade strength for speed
+MIN_XTS_KEY_SIZE = 512
+# Where LUKS2 starts the data by default, after the headers and keyslots
+LUKS2_DATA_OFFSET = 16 * 1024 * 1024
+
+BENCHMARK_LINE = re.compile(
+    r"^\s*(?P<algorithm>\S+)\s+(?P<key>\d+)b\s+"
+    r"(?P<encryption>[\d.]+)\s+MiB/s\s+(?P<decryption>[\d.]+)\s+MiB/s\s*$"
+)
+
+
+@dataclasses.dataclass(frozen=True)
+class CipherBenchmark:
+    algorithm: str
+    key_size: int
+    encryption: float
+    decryption: float
+
+    @property
+    def speed(self) -> float:
+        # A disk is both read and written, so the slower direction matters
+        return min(self.encryption, self.decryption)
+
+
+@dataclasses.dataclass
+class LuksOptions:
+    """
+    How to format and open a LUKS container; None means cryptsetup's default.
+    """
+
+    tune: bool = False
+    cipher: t.Optional[str] = None
+    key_size: t.Optional[int] = None
+    sector_size: t.Optional[int] = None
+    no_workqueue: t.Optional[bool] = None
+    # In bytes
+    data_offset: t.Optional[int] = None
+
+    def format_args(self) -> t.List[str]:
+        args = []
+        if self.cipher is not None:
+            args += ["--cipher", self.cipher]
+        if self.key_size is not None:
+            args += ["--key-size", str(self.key_size)]
+        if self.sector_size is not None:
+            args += ["--sector-size", str(self.sector_size)]
+        if self.data_offset is not None:
+            args += ["--offset", str(self.data_offset // 512)]
+        return args
+
+    def open_args(self) -> t.List[str]:
+        if self.no_workqueue:
+            return ["--perf-no_read_workqueue", "--perf-no_write_workqueue"]
+        return []
+
+
+def aligned_data_offset(alignment: int) -> t.Optional[int]:
+    """
+    The smallest data offset of at least LUKS2's default that is a multiple of
+    alignment, or None if the default already is.
+    """
+    if LUKS2_DATA_OFFSET % alignment == 0:
+        return None
+    return -(-LUKS2_DATA_OFFSET // alignment) * alignment
+
+
+def parse_benchmark(output: str) -> t.List[CipherBenchmark]:
+    results = []
+    for line in output.splitlines():
+        match = BENCHMARK_LINE.match(line)
+        if match:
+            results.append(
+                CipherBenchmark(
+                    algorithm=match["algorithm"],
+                    key_size=int(match["key"]),
+                    encryption=float(match["encryption"]),
+                    decryption=float(match["decryption"]),
+                )
+            )
+    return results
+
+
+def host_fingerprint() -> str:
+    cpu = ""
+    for line in Path("/proc/cpuinfo").read_text().splitlines():
+        if line.startswith("model name"):
+            cpu = line.split(":", 1)[1].strip()
+            break
+    version = run(
+        [cryptsetup, "--version"], check=True, capture_output=True, text=True
+    ).stdout.strip()
+    return f"{platform.node()}|{platform.machine()}|{cpu}|{version}"
+
+
+def benchmark() -> t.List[CipherBenchmark]:
+    """
+    cryptsetup benchmark results for this host, cached across runs since they
+    take several seconds to measure and only change with the hardware.
+    """
+    fingerprint = host_fingerprint()
+    try:
+        cached = json.loads(BENCHMARK_CACHE.read_text())
+        if cached["host"] == fingerprint:
+            return [CipherBenchmark(**result) for result in cached["results"]]
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    results = parse_benchmark(
+        run(
+            [cryptsetup, "benchmark"],
+            stdout=subprocess.PIPE,
+            check=True,
+            text=True,
+        ).stdout
+    )
+    BENCHMARK_CACHE.parent.mkdir(parents=True, exist_ok=True)
+    # Several drives may be tuned at once, so replace the cache atomically,
+    # through a file of this process's own
+    tmp = BENCHMARK_CACHE.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp.write_text(
+        json.dumps(
+            {
+                "host": fingerprint,
+                "results": [dataclasses.asdict(result) for result in results],
+            }
+        )
+    )
+    os.replace(tmp, BENCHMARK_CACHE)
+    return results
+
+
+def fastest_cipher(results: t.Sequence[CipherBenchmark]) -> CipherBenchmark:
+    # Only XTS is a sensible mode for full disk encryption
+    candidates = [
+        r
+        for r in results
+        if r.algorithm.endswith("-xts") and r.key_size >= MIN_XTS_KEY_SIZE
+    ]
+    if not candidates:
+        raise ValueError(
+            f"cryptsetup benchmark found no XTS cipher with a key of at least "
+            f"{MIN_XTS_KEY_SIZE} bits"
+        )
+    # On a tie, prefer the larger key
+    return max(candidates, key=lambda r: (round(r.speed, -1), r.key_size))
+
+
+def supports_4k_sectors(device: Path) -> bool:
+    """
+    Whether device can use 4096 byte encryption sectors: it has to start and
+    end on a 4096 byte boundary, with a logical block size of at most 4096.
+    """
+    sysfs = block_sysfs_dir(device)
+    queue = queue_dir(device)
+    if sysfs is None or queue is None:
+        return False
+    start = read_int_attr(sysfs / "start") * 512
+    return all(
+        [
+            read_int_attr(queue / "logical_block_size", default=512) <= 4096,
+            read_int_attr(sysfs / "alignment_offset") == 0,
+            start % 4096 == 0,
+            device_size(device) % 4096 == 0,
+        ]
+    )
+
+
+def tune_luks_options(device: Path, options: LuksOptions) -> LuksOptions:
+    """
+    Fill in the settings options leaves open with the best choice for device.
+    """
+    if not options.tune:
+        return options
+    tuned = dataclasses.replace(options)
+    if tuned.cipher is None:
+        best = fastest_cipher(benchmark())
+        tuned.cipher = f"{best.algorithm}-plain64"
+        if tuned.key_size is None:
+            tuned.key_size = best.key_size
+    if tuned.sector_size is None and supports_4k_sectors(device):
+        tuned.sector_size = 4096
+    if tuned.no_workqueue is None:
+        # The workqueues help spinning disks merge requests, but only add
+        # latency in front of flash
+        tuned.no_workqueue = not is_rotational(device)
+    return tuned
+
+
+def luks_options(f: F) -> F:
+    """
+    Click options for choosing LUKS settings.
+    """
+    options = [
+        click.option(
+            "--luks-tune/--no-luks-tune",
+            default=False,
+            help="benchmark ciphers (cached per host) and pick the fastest that is no weaker than the default, 4096 byte sectors where the partition allows it, and no dm-crypt workqueues on SSDs",
+        ),
+        click.option("--cipher", help="LUKS cipher, e.g. aes-xts-plain64"),
+        click.option(
+            "--key-size", type=click.IntRange(min=1), help="LUKS key size in bits"
+        ),
+        click.option(
+            "--sector-size",
+            type=click.Choice(["512", "1024", "2048", "4096"]),
+            help="LUKS encryption sector size in bytes",
+        ),
+        click.option(
+            "--perf-no-workqueue/--perf-workqueue",
+            default=None,
+            help="bypass the dm-crypt read and write workqueues",
+        ),
+    ]
+    for option in reversed(options):
+        f = option(f)
+    return f
+
+
+def make_luks_options(
+    luks_tune: bool,
+    cipher: t.Optional[str],
+    key_size: t.Optional[int],
+    sector_size: t.Optional[str],
+    perf_no_workqueue: t.Optional[bool],
+) -> LuksOptions:
+    return LuksOptions(
+        tune=luks_tune,
+        cipher=cipher,
+        key_size=key_size,
+        sector_size=None if sector_size is None else int(sector_size),
+        no_workqueue=perf_no_workqueue,
+    )
@@ -0,0 +1,152 @@
+import dataclasses
+import json
+import os
+import typing as t
+from pathlib import Path
+
+from jgsysutil.commands import lvm
+from jgsysutil.process import run
+
+
+class LvmError(Exception):
+    pass
+
+
+@dataclasses.dataclass(frozen=True)
+class LogicalVolume:
+    name: str
+    uuid: str
+    path: Path
+    size: int
+
+
+@dataclasses.dataclass
+class VolumeGroup:
+    name: str
+    uuid: str
+    size: int
+    free: int
+    pvs: t.List[Path] = dataclasses.field(default_factory=list)
+    lvs: t.Dict[str, LogicalVolume] = dataclasses.field(default_factory=dict)
+
+
+def devices_args(devices: t.Sequence[Path]) -> t.List[str]:
+    """
+    Restrict an LVM command to devices, so it neither scans nor locks the
+    rest of the system's disks.
+    """
+    return ["--devices", ",".join(os.fspath(dev) for dev in devices)]
+
+
+class LvmBatch:
+    """
+    LVM commands run one after the other in a single lvm shell session, which
+    scans devices and reads metadata once rather than once per command.
+
+    The shell carries on past a failed command and its exit status does not
+    say whether any failed, so callers check the result with read_layout.
+    """
+
+    def __init__(self, devices: t.Sequence[Path]) -> None:
+        self.devices = list(devices)
+        self.commands: t.List[str] = []
+
+    def add(self, command: str, *args: t.Union[str, "os.PathLike[str]"]) -> None:
+        line = [command, *devices_args(self.devices)]
+        line += [os.fspath(arg) for arg in args]
+        for arg in line:
+            # The shell splits lines on whitespace, without any quoting
+            if not arg or any(c.isspace() for c in arg):
+                raise ValueError(f"Invalid lvm shell argument: {arg!r}")
+        self.commands.append(" ".join(line))
+
+    def run(self) -> str:
+        """
+        Run the commands, returning what the shell printed.
+        """
+        result = run(
+            [lvm],
+            input="".join(f"{command}\n" for command in self.commands),
+            text=True,
+            capture_output=True,
+        )
+        self.commands = []
+        return result.stdout + result.stderr
+
+
+def parse_fullreport(output: str) -> t.Dict[str, VolumeGroup]:
+    vgs = {}
+    for report in json.loads(output)["report"]:
+        # PVs that are not in any volume group get a report with no vg
+        if not report.get("vg"):
+            continue
+        (vg_info,) = report["vg"]
+        vg = VolumeGroup(
+            name=vg_info["vg_name"],
+            uuid=vg_info["vg_uuid"],
+            size=int(vg_info["vg_size"]),
+            free=int(vg_info["vg_free"]),
+            pvs=[Path(pv["pv_name"]) for pv in report.get("pv", [])],
+        )
+        for lv in report.get("lv", []):
+            vg.lvs[lv["lv_name"]] = LogicalVolume(
+                name=lv["lv_name"],
+                uuid=lv["lv_uuid"],
+                path=Path(lv["lv_path"]),
+                size=int(lv["lv_size"]),
+            )
+        vgs[vg.name] = vg
+    return vgs
+
+
+def read_layout(devices: t.Sequence[Path]) -> t.Dict[str, VolumeGroup]:
+    """
+    The volume groups on devices, with their PVs and LVs, from one fullreport.
+    """
+    output = run(
+        [
+            lvm,
+            "fullreport",
+            *devices_args(devices),
+            "--reportformat",
+            "json",
+            "--units",
+            "b",
+            "--nosuffix",
+            "--configreport",
+            "vg",
+            "-o",
+            "vg_name,vg_uuid,vg_size,vg_free",
+            "--configreport",
+            "pv",
+            "-o",
+            "pv_name",
+            "--configreport",
+            "lv",
+            "-o",
+            "lv_name,lv_uuid,lv_path,lv_size",
+        ],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return parse_fullreport(output)
+
+
+def set_active(
+    vg_names: t.Sequence[str], devices: t.Sequence[Path], active: bool
+) -> bool:
+    """
+    Activate or deactivate vg_names, returning whether it succeeded.
+    """
+    result = run(
+        [
+            lvm,
+            "vgchange",
+            *devices_args(devices),
+            "--activate",
+            "y" if active else "n",
+            *vg_names,
+        ]
+    )
+    return result.returncode == 0
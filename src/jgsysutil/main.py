@@ -1,17 +1,101 @@
+import dataclasses
+import importlib
+import typing as t
+
 import click
 
-from jgsysutil.prepare_drive import prepare_drive
-from jgsysutil.randomize_drive import randomize_drive
+
+@dataclasses.dataclass(frozen=True)
+class LazyCommand:
+    """
+    Where a subcommand lives ("module:attribute"), and its short help so that
+    --help can list it without importing it.
+    """
+
+    target: str
+    short_help: str
+
+    def load(self) -> click.Command:
+        module, attribute = self.target.split(":")
+        command = getattr(importlib.import_module(module), attribute)
+        assert isinstance(command, click.Command)
+        return command
+
+
+class LazyGroup(click.Group):
+    """
+    A group whose subcommands are only imported when one of them is run, since
+    importing all of them (and what they depend on) dominates startup time.
+    """
+
+    def __init__(
+        self, *args: t.Any, lazy_commands: t.Dict[str, LazyCommand], **kwargs: t.Any
+    ) -> None:
+        super().__init__(*args, **kwargs)
+        self.lazy_commands = lazy_commands
+
+    def list_commands(self, ctx: click.Context) -> t.List[str]:
+        return sorted([*super().list_commands(ctx), *self.lazy_commands])
+
+    def get_command(
+        self, ctx: click.Context, cmd_name: str
+    ) -> t.Optional[click.Command]:
+        if cmd_name in self.lazy_commands:
+            return self.lazy_commands[cmd_name].load()
+        return super().get_command(ctx, cmd_name)
+
+    def format_commands(
+        self, ctx: click.Context, formatter: click.HelpFormatter
+    ) -> None:
+        rows = []
+        for name in self.list_commands(ctx):
+            if name in self.lazy_commands:
+                rows.append((name, self.lazy_commands[name].short_help))
+            else:
+                command = super().get_command(ctx, name)
+                if command is not None and not command.hidden:
+                    rows.append((name, command.get_short_help_str()))
+        if rows:
+            with formatter.section("Commands"):
+                formatter.write_dl(rows)
 
 
-@click.group()
+COMMANDS = {
+    "crypto-erase": LazyCommand(
+        "jgsysutil.crypto_erase:crypto_erase",
+        "Destroys the LUKS container on DRIVE by erasing its keys.",
+    ),
+    "inspect": LazyCommand(
+        "jgsysutil.block_stack:inspect",
+        "Prints the block devices and how they stack, as JSON.",
+    ),
+    "prepare-drive": LazyCommand(
+        "jgsysutil.prepare_drive:prepare_drive",
+        "Prepare a drive for a nixos installation.",
+    ),
+    "prepare-drive-batch": LazyCommand(
+        "jgsysutil.prepare_batch:prepare_drive_batch",
+        "Prepare every drive listed in MANIFEST, concurrently.",
+    ),
+    "randomize-drive": LazyCommand(
+        "jgsysutil.randomize_drive:randomize_drive",
+        "Randomizes DRIVES",
+    ),
+    "sync-system": LazyCommand(
+        "jgsysutil.sync_system:sync_system",
+        "Copies SOURCE (a directory or filesystem image) into the new system.",
+    ),
+    "verify-drive": LazyCommand(
+        "jgsysutil.verify_drive:verify_drive",
+        "Checks that DRIVE looks uniformly random.",
+    ),
+}
+
+
+@click.group(cls=LazyGroup, lazy_commands=COMMANDS)
 @click.version_option()
 def main() -> None:
     """
     Assorted system administration utility scripts
     """
     pass
-
-
-main.add_command(prepare_drive)
-main.add_command(randomize_drive)
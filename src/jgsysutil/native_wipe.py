@@ -0,0 +1,172 @@
+import dataclasses
+import mmap
+import os
+import threading
+import time
+import typing as t
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from jgsysutil.throttle import IoPriority, TokenBucket
+
+# Large enough that per-request overhead is negligible, small enough that a few
+# buffers per thread fit comfortably in memory.
+DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024
+# O_DIRECT offsets and lengths must be whole logical blocks, which are at most
+# this big
+DIRECT_ALIGNMENT = 4096
+
+
+class WipeCancelled(Exception):
+    pass
+
+
+@dataclasses.dataclass
+class WipeStats:
+    bytes_written: int
+    seconds: float
+
+    @property
+    def mb_per_second(self) -> float:
+        if self.seconds <= 0:
+            return 0.0
+        return self.bytes_written / self.seconds / 1024 / 1024
+
+
+def device_size(path: Path) -> int:
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        return os.lseek(fd, 0, os.SEEK_END)
+    finally:
+        os.close(fd)
+
+
+def open_direct(path: Path) -> int:
+    """
+    Open path for writing with O_DIRECT, falling back to buffered I/O for
+    files on filesystems (like tmpfs) that do not support it.
+    """
+    try:
+        return os.open(path, os.O_WRONLY | os.O_DIRECT)
+    except OSError:
+        return os.open(path, os.O_WRONLY)
+
+
+def fill_random(urandom: int, buf: memoryview) -> None:
+    # The kernel CSPRNG is a per-cpu ChaCha20 keystream, and reads from it release
+    # the GIL, so several threads can generate in parallel with no extra copies.
+    done = 0
+    while done < len(buf):
+        done += os.readv(urandom, [buf[done:]])
+
+
+class _ChunkCursor:
+    def __init__(self, ranges: t.List[t.Tuple[int, int]], chunk_size: int) -> None:
+        self._lock = threading.Lock()
+        self._chunks = (
+            (offset, min(chunk_size, start + length - offset))
+            for start, length in ranges
+            for offset in range(start, start + length, chunk_size)
+        )
+
+    def take(self) -> t.Optional[t.Tuple[int, int]]:
+        with self._lock:
+            return next(self._chunks, None)
+
+
+def native_wipe(
+    drive: Path,
+    threads: t.Optional[int] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    zero: bool = False,
+    ranges: t.Optional[t.List[t.Tuple[int, int]]] = None,
+    on_written: t.Optional[t.Callable[[int, int], None]] = None,
+    throttle: t.Optional[TokenBucket] = None,
+    io_priority: t.Optional[IoPriority] = None,
+    cancel: t.Optional[threading.Event] = None,
+) -> WipeStats:
+    """
+    Overwrite drive with a random keystream (or zeros if zero is set).
+
+    Each worker thread owns a page aligned buffer, fills it and writes it with
+    O_DIRECT, so there are as many write requests in flight as there are threads.
+    A chunk that is not whole blocks, like the end of an image file, is written
+    through the page cache instead.
+
+    If ranges is given, only those (offset, length) ranges are written.
+    on_written is called from the worker threads with each (offset, length)
+    chunk once it has been written.
+
+    Each chunk waits for throttle before it is written, and the workers run
+    at io_priority, if given. Once cancel is set, the workers stop after the
+    chunk they are writing and WipeCancelled is raised.
+    """
+    if threads is None:
+        threads = os.cpu_count() or 1
+    if ranges is None:
+        ranges = [(0, device_size(drive))]
+    cursor = _ChunkCursor(ranges, chunk_size)
+    stop = threading.Event()
+
+    def write_chunks(view: memoryview, fd: int, buffered_fd: int) -> None:
+        urandom = os.open("/dev/urandom", os.O_RDONLY)
+        try:
+            if io_priority is not None:
+                io_priority.apply_to_current_thread()
+            while not stop.is_set():
+                if cancel is not None and cancel.is_set():
+                    raise WipeCancelled(f"Wiping {drive} was cancelled")
+                chunk = cursor.take()
+                if chunk is None:
+                    break
+                offset, length = chunk
+                # The end of an image file need not be a whole block
+                aligned = (offset | length) % DIRECT_ALIGNMENT == 0
+                with view[:length] as data:
+                    if not zero:
+                        fill_random(urandom, data)
+                    if throttle is not None:
+                        throttle.acquire(length)
+                    written = 0
+                    while written < length:
+                        written += os.pwritev(
+                            fd if aligned else buffered_fd,
+                            [data[written:]],
+                            offset + written,
+                        )
+                if on_written is not None:
+                    on_written(offset, length)
+            os.fsync(fd)
+            os.fsync(buffered_fd)
+        finally:
+            os.close(urandom)
+
+    def worker() -> None:
+        fd = open_direct(drive)
+        buffered_fd = os.open(drive, os.O_WRONLY)
+        try:
+            # Anonymous mmaps are page aligned, as O_DIRECT requires.
+            with mmap.mmap(-1, chunk_size) as buffer, memoryview(buffer) as view:
+                write_chunks(view, fd, buffered_fd)
+        except BaseException:
+            stop.set()
+            raise
+        finally:
+            os.close(buffered_fd)
+            os.close(fd)
+
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        futures = [pool.submit(worker) for _ in range(threads)]
+        try:
+            for future in futures:
+                future.result()
+        except BaseException:
+            # Includes KeyboardInterrupt: let the workers finish their current
+            # chunk and stop, so on_written has seen everything that was written
+            stop.set()
+            raise
+    return WipeStats(
+        bytes_written=sum(length for _, length in ranges),
+        seconds=time.monotonic() - start,
+    )
@@ -0,0 +1,264 @@
+import dataclasses
+import time
+import typing as t
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import click
+import toml
+
+from jgsysutil.format_profile import FormatProfile, format_profile_option
+from jgsysutil.luks_tuning import (
+    LuksOptions,
+    benchmark,
+    luks_options,
+    make_luks_options,
+)
+from jgsysutil.prepare_drive import PartitionScheme, configure_drive, drive_partitions
+from jgsysutil.randomize_drive import WipeOptions, make_wipe_options, wipe_options
+from jgsysutil.swap import SwapOptions, make_swap_options, swap_options
+from jgsysutil.throttle import parse_size
+from jgsysutil.tracing import span, trace_option
+
+
+class ManifestError(Exception):
+    pass
+
+
+@dataclasses.dataclass
+class DriveSpec:
+    """
+    One entry of a batch manifest: either a whole drive to partition, or an
+    existing boot/root partition pair.
+    """
+
+    mount: Path
+    drive: t.Optional[Path] = None
+    partitions: t.Optional[PartitionScheme] = None
+    randomize: bool = False
+    # In bytes
+    swap_size: t.Optional[int] = None
+
+    @property
+    def name(self) -> str:
+        if self.drive is not None:
+            return str(self.drive)
+        assert self.partitions is not None
+        return str(self.partitions.root)
+
+
+@dataclasses.dataclass
+class PrepareResult:
+    spec: DriveSpec
+    seconds: float = 0.0
+    error: t.Optional[BaseException] = None
+
+
+def parse_manifest(text: str) -> t.List[DriveSpec]:
+    """
+    Parse a TOML manifest of [[drive]] tables, each with either drive or both
+    boot and root, a mount point, and optionally randomize and swap_size.
+    """
+    try:
+        manifest = toml.loads(text)
+    except toml.TomlDecodeError as e:
+        raise ManifestError(f"Invalid manifest: {e}") from e
+    entries = manifest.get("drive")
+    if not isinstance(entries, list) or not entries:
+        raise ManifestError("The manifest must contain at least one [[drive]]")
+    known = {"drive", "boot", "root", "mount", "randomize", "swap_size"}
+    specs = []
+    for i, entry in enumerate(entries, start=1):
+        unknown = set(entry) - known
+        if unknown:
+            raise ManifestError(f"drive {i}: unknown keys {', '.join(sorted(unknown))}")
+        if "mount" not in entry:
+            raise ManifestError(f"drive {i}: mount is required")
+        spec = DriveSpec(
+            mount=Path(entry["mount"]),
+            randomize=bool(entry.get("randomize", False)),
+        )
+        if "swap_size" in entry:
+            try:
+                spec.swap_size = parse_size(str(entry["swap_size"]))
+            except ValueError as e:
+                raise ManifestError(f"drive {i}: swap_size: {e}") from e
+        if "drive" in entry:
+            if "boot" in entry or "root" in entry:
+                raise ManifestError(
+                    f"drive {i}: boot and root must not be used when drive is set"
+                )
+            spec.drive = Path(entry["drive"])
+        elif "boot" in entry and "root" in entry:
+            spec.partitions = PartitionScheme(
+                boot=Path(entry["boot"]), root=Path(entry["root"])
+            )
+        else:
+            raise ManifestError(
+                f"drive {i}: either drive or boot and root are required"
+            )
+        specs.append(spec)
+    names = [spec.name for spec in specs]
+    duplicates = {name for name in names if names.count(name) > 1}
+    if duplicates:
+        raise ManifestError(f"Listed more than once: {', '.join(sorted(duplicates))}")
+    mounts = [str(spec.mount) for spec in specs]
+    shared = {mount for mount in mounts if mounts.count(mount) > 1}
+    if shared:
+        raise ManifestError(f"Mounted more than once: {', '.join(sorted(shared))}")
+    return specs
+
+
+def prepare_drives(
+    specs: t.Sequence[DriveSpec],
+    passwd: str,
+    wipe: t.Optional[WipeOptions] = None,
+    luks: t.Optional[LuksOptions] = None,
+    format_profile: FormatProfile = FormatProfile.DEFAULT,
+    swap: t.Optional[SwapOptions] = None,
+    jobs: t.Optional[int] = None,
+) -> t.List[PrepareResult]:
+    """
+    Partition and configure each of specs, at most jobs at once.
+
+    Each drive gets its own LUKS and LVM names, and configure_drive runs the
+    LVM steps under a shared lock, so the drives only wait on each other for
+    those. A failure on one drive does not stop the others.
+    """
+
+    def prepare_one(spec: DriveSpec) -> PrepareResult:
+        result = PrepareResult(spec)
+        start = time.monotonic()
+        try:
+            with span("prepare", drive=spec.name):
+                if spec.drive is not None:
+                    # Keep the partitions a resumed wipe is recorded against
+                    keep = wipe is not None and wipe.resume
+                    partitions = drive_partitions(spec.drive, keep)
+                else:
+                    assert spec.partitions is not None
+                    partitions = spec.partitions
+                configure_drive(
+                    partitions,
+                    spec.randomize,
+                    spec.swap_size,
+                    spec.mount,
+                    passwd,
+                    wipe,
+                    luks,
+                    format_profile,
+                    swap,
+                )
+        except Exception as e:
+            result.error = e
+        result.seconds = time.monotonic() - start
+        return result
+
+    if luks is not None and luks.tune and luks.cipher is None:
+        # Benchmark once, before any drive's wipe can skew the result
+        benchmark()
+    with ThreadPoolExecutor(max_workers=jobs or len(specs)) as pool:
+        return list(pool.map(prepare_one, specs))
+
+
+@click.command()
+@click.argument(
+    "manifest",
+    type=click.Path(exists=True, file_okay=True, dir_okay=False, path_type=Path),
+)
+@wipe_options
+@luks_options
+@format_profile_option
+@swap_options
+@click.option(
+    "--jobs",
+    type=click.IntRange(min=1),
+    help="maximum number of drives to prepare at once, defaults to all of them",
+)
+@trace_option
+@click.password_option()
+@click.confirmation_option(prompt="Are you sure?")
+def prepare_drive_batch(
+    manifest: Path,
+    method: str,
+    engine: str,
+    threads: t.Optional[int],
+    resume: bool,
+    max_bandwidth: t.Optional[str],
+    io_priority: t.Optional[str],
+    adaptive: bool,
+    progress_fd: t.Optional[int],
+    progress_interval: float,
+    luks_tune: bool,
+    cipher: t.Optional[str],
+    key_size: t.Optional[int],
+    sector_size: t.Optional[str],
+    perf_no_workqueue: t.Optional[bool],
+    format_profile: str,
+    swap_mode: str,
+    zram_algorithm: str,
+    zram_fraction: float,
+    jobs: t.Optional[int],
+    password: str,
+) -> None:
+    """
+    Prepare every drive listed in MANIFEST, concurrently.
+
+    MANIFEST is a TOML file with one [[drive]] table per drive, holding the
+    same settings as prepare-drive:
+
+    \b
+        [[drive]]
+        drive = "/dev/sda"
+        mount = "/mnt/a"
+        randomize = true
+        swap_size = "8G"
+
+    \b
+        [[drive]]
+        boot = "/dev/sdb1"
+        root = "/dev/sdb2"
+        mount = "/mnt/b"
+
+    All drives share the password and the wipe, LUKS, format and swap
+    options. A report of each drive is printed at the end.
+    """
+    try:
+        specs = parse_manifest(manifest.read_text())
+    except ManifestError as e:
+        raise click.UsageError(str(e)) from e
+    for spec in specs:
+        if not spec.mount.is_dir():
+            raise click.UsageError(f"{spec.mount} is not a directory")
+
+    results = prepare_drives(
+        specs,
+        password,
+        make_wipe_options(
+            method,
+            engine,
+            threads,
+            resume,
+            max_bandwidth,
+            io_priority,
+            adaptive,
+            progress_fd,
+            progress_interval,
+        ),
+        make_luks_options(luks_tune, cipher, key_size, sector_size, perf_no_workqueue),
+        FormatProfile(format_profile),
+        make_swap_options(swap_mode, zram_algorithm, zram_fraction),
+        jobs=jobs,
+    )
+    for result in results:
+        if result.error is None:
+            click.secho(
+                f"{result.spec.name}: mounted on {result.spec.mount} "
+                f"in {result.seconds:.1f}s",
+                fg="green",
+            )
+        else:
+            click.secho(f"{result.spec.name}: FAILED: {result.error}", fg="red")
+    failed = [r for r in results if r.error is not None]
+    if failed:
+        raise click.ClickException(f"{len(failed)} of {len(results)} drives failed")
@@ -2,27 +2,64 @@ import dataclasses
 import math
 import re
 import subprocess
+import threading
+import time
 import typing as t
 import uuid
 from pathlib import Path
 
 import click
 
+from jgsysutil.block_stack import snapshot
 from jgsysutil.commands import (
     cryptsetup,
     free,
-    gdisk,
-    lvcreate,
     mkdir,
     mkfs_ext4,
     mkfs_fat,
     mkswap,
     mount,
-    pvcreate,
     swapon,
-    vgcreate,
 )
-from jgsysutil.randomize_drive import randomize_drive_lib
+from jgsysutil.format_profile import FormatProfile, ext4_args, format_profile_option
+from jgsysutil.gpt import (
+    EFI_SYSTEM,
+    LINUX_LUKS,
+    DiskTooSmallError,
+    Partition,
+    PartitionTable,
+    write_partition_table,
+)
+from jgsysutil.luks_tuning import (
+    LUKS_LABEL,
+    LuksOptions,
+    aligned_data_offset,
+    luks_options,
+    make_luks_options,
+    tune_luks_options,
+)
+from jgsysutil.lvm import LvmBatch, LvmError, VolumeGroup, read_layout, set_active
+from jgsysutil.process import run
+from jgsysutil.randomize_drive import (
+    WipeOptions,
+    make_wipe_options,
+    randomize_drive_lib,
+    wipe_options,
+)
+from jgsysutil.run_state import RunState, RunStateError, blkid_tags, has_signature
+from jgsysutil.swap import (
+    SWAPFILE_DEFAULT_SIZE,
+    SwapMode,
+    SwapOptions,
+    create_swapfile,
+    make_swap_options,
+    setup_zram,
+    swap_options,
+)
+from jgsysutil.taskgraph import Task, run_tasks
+from jgsysutil.throttle import parse_size
+from jgsysutil.topology import common_alignment, probe
+from jgsysutil.tracing import span, trace_option
 from jgsysutil.typing import assert_never
 
 
@@ -33,7 +70,7 @@ def partition_path(drive_path: Path, pnum: int) -> Path:
 
 
 def total_mem() -> int:
-    for line in subprocess.run(
+    for line in run(
         [free], text=True, stdout=subprocess.PIPE, check=True
     ).stdout.splitlines():
         if line.startswith("Mem: "):
@@ -45,79 +82,548 @@ def total_mem() -> int:
 class PartitionScheme:
     boot: Path
     root: Path
+    # More devices for the root volume group to span
+    extra_roots: t.List[Path] = dataclasses.field(default_factory=list)
+
+    @property
+    def roots(self) -> t.List[Path]:
+        return [self.root, *self.extra_roots]
+
+
+def write_table(drive: Path, partitions: t.Sequence[Partition]) -> PartitionTable:
+    with span("partition", drive=str(drive)):
+        try:
+            table = write_partition_table(drive, partitions)
+        except DiskTooSmallError as e:
+            raise click.ClickException(str(e))
+    click.echo(table.describe())
+    return table
 
 
 def partition_drive(drive: Path) -> PartitionScheme:
-    gdisk_commands = [
-        "o",  # delete all partitions and create a new protective MBR
-        "Y",  # confirm
-        "n",  # new partition
-        "",  # enter, default partition number 1
-        "",  # enter, default start position
-        "+512M",  # offset to end position
-        "ef00",  # EFI System code
-        "n",  # new partition
-        "",  # enter, default partition number 2
-        "",  # enter, default start position
-        "",  # enter, default end position (rest of the drive)
-        "8309",  # Linux LUKS
-        "w",  # write partition table and exit
-        "Y",  # confirm
-        "",  # final trailing enter
-    ]
-    subprocess.run(
-        [gdisk, drive], input="\n".join(gdisk_commands), text=True, check=True
+    write_table(
+        drive,
+        [
+            Partition(EFI_SYSTEM, "EFI system partition", size=512 * 1024 * 1024),
+            Partition(LINUX_LUKS, "Linux LUKS"),
+        ],
     )
-    subprocess.run([gdisk, "-l", drive], check=True)
     return PartitionScheme(boot=partition_path(drive, 1), root=partition_path(drive, 2))
 
 
+def partition_extra_drive(drive: Path) -> Path:
+    """
+    Give a drive that only holds part of the root volume group a single LUKS
+    partition, returning it.
+    """
+    write_table(drive, [Partition(LINUX_LUKS, "Linux LUKS")])
+    return partition_path(drive, 1)
+
+
+def existing_partitions(drive: Path) -> bool:
+    return partition_path(drive, 1).exists() and partition_path(drive, 2).exists()
+
+
+def drive_partitions(drive: Path, keep: bool) -> PartitionScheme:
+    """
+    Partition drive, unless keep is set and it already has its partitions:
+    partitioning again would leave nothing to continue or resume.
+    """
+    if keep and existing_partitions(drive):
+        return PartitionScheme(
+            boot=partition_path(drive, 1), root=partition_path(drive, 2)
+        )
+    return partition_drive(drive)
+
+
+# LVM commands rescan and lock all devices, so when several drives are being
+# configured at once their LVM steps are run one at a time
+LVM_LOCK = threading.Lock()
+
+
 def configure_drive(
     partitions: PartitionScheme,
     randomize: bool,
-    swap_size: t.Optional[str],
+    swap_size: t.Optional[int],
     mount_point: Path,
     passwd: str,
+    wipe: t.Optional[WipeOptions] = None,
+    luks: t.Optional[LuksOptions] = None,
+    format_profile: FormatProfile = FormatProfile.DEFAULT,
+    swap: t.Optional[SwapOptions] = None,
+    continue_run: bool = False,
+    stripes: t.Optional[int] = None,
+    stripe_size: t.Optional[str] = None,
 ) -> None:
     lvm_uuid = str(uuid.uuid4())
     prefix = f"{lvm_uuid}"
-    luks_mapper_name = prefix
+    swap_settings = swap or SwapOptions()
+    state: t.Optional[RunState] = None
+    try:
+        state = RunState.open(partitions.root, prefix, continue_run)
+        # Continuing a run means continuing with the names it picked
+        prefix = state.prefix
+        state.check_fact("swap_mode", swap_settings.mode.value)
+    except RunStateError as e:
+        if continue_run:
+            raise
+        click.secho(f"Not recording the run: {e}", fg="yellow", err=True)
+    roots = partitions.roots
+    stripes = stripes or len(roots)
+    if stripes > len(roots):
+        raise ValueError(f"{stripes} stripes need at least as many root devices")
+    if stripe_size is not None and stripes == 1:
+        raise ValueError("A stripe size needs more than one stripe")
+    luks_mapper_names = [prefix, *(f"{prefix}_{i}" for i in range(1, len(roots)))]
     vg_name = f"{prefix}_vg"
     swap_name = f"{prefix}_swap"
     root_name = f"{prefix}_root"
+    # Topology of the raw partitions: the geometry that matters is the disks',
+    # whatever dm-crypt and LVM stack on top of them
+    topologies = [probe(root) for root in roots]
+    alignment = common_alignment(topologies)
+    luks_settings = luks or LuksOptions()
+    if luks_settings.data_offset is None:
+        # The partition starts on a stripe, so the data has to as well
+        luks_settings = dataclasses.replace(
+            luks_settings, data_offset=aligned_data_offset(alignment)
+        )
+    # Tuned for each root device by luks-tune
+    root_luks = {root: luks_settings for root in roots}
+    swap_device: t.Optional[Path] = None
+    if swap_settings.mode is SwapMode.LV:
+        swap_device = Path(f"/dev/{vg_name}/{swap_name}")
+    elif swap_settings.mode is SwapMode.SWAPFILE:
+        swap_device = mount_point / "swapfile"
+    root_device = Path(f"/dev/{vg_name}/{root_name}")
+    mapper_devices = [Path(f"/dev/mapper/{name}") for name in luks_mapper_names]
+    stripe_args = []
+    if stripes > 1:
+        stripe_args = ["--stripes", str(stripes)]
+        if stripe_size is not None:
+            stripe_args += ["--stripesize", stripe_size]
 
-    if swap_size is None:
-        x = total_mem()
-        # Round up to at least 1G of swap
-        swap_size = f"{2**math.ceil(math.log2(max(1024 * 1024, x) / 1024 / 1024))}G"
-    if randomize:
-        randomize_drive_lib(partitions.root)
-    subprocess.run(
-        [cryptsetup, "luksFormat", partitions.root],
-        input=passwd,
-        text=True,
-        check=True,
-    )
-    subprocess.run([cryptsetup, "luksDump", partitions.root], check=True)
-    subprocess.run(
-        [cryptsetup, "luksOpen", partitions.root, luks_mapper_name],
-        input=passwd,
-        text=True,
-        check=True,
-    )
-    subprocess.run([pvcreate, "-y", f"/dev/mapper/{luks_mapper_name}"], check=True)
-    subprocess.run([vgcreate, vg_name, f"/dev/mapper/{luks_mapper_name}"], check=True)
-    subprocess.run([lvcreate, "-L", swap_size, "-n", swap_name, vg_name], check=True)
-    subprocess.run([lvcreate, "-l", "100%FREE", "-n", root_name, vg_name], check=True)
-    subprocess.run([mkfs_fat, partitions.boot], check=True)
-    subprocess.run([mkfs_ext4, "-L", "root", f"/dev/{vg_name}/{root_name}"], check=True)
-    subprocess.run([mkswap, "-L", "swap", f"/dev/{vg_name}/{swap_name}"], check=True)
+    def fact(name: str) -> t.Optional[str]:
+        return state.fact(name) if state is not None else None
+
+    def uuid_fact(name: str, dev: Path) -> t.Callable[[], t.Dict[str, str]]:
+        def facts() -> t.Dict[str, str]:
+            return {name: blkid_tags(dev).get("UUID", "")}
+
+        return facts
+
+    def tracked(
+        name: str,
+        step: t.Callable[[], None],
+        done: t.Callable[[], bool],
+        facts: t.Optional[t.Callable[[], t.Dict[str, str]]] = None,
+        persistent: bool = True,
+    ) -> t.Callable[[], None]:
+        """
+        Record step in the run state once it completes. When continuing, skip
+        it if the earlier run completed it and done() finds its result still
+        there. Persistent steps are the ones that change what is on disk: if
+        their result has gone, the disk is not in the state the run left it
+        in, so rather than redoing them over whatever is there now the run
+        stops. The others (opening, mounting) are just done again.
+        """
+
+        def run_step() -> None:
+            if state is not None and continue_run and state.is_done(name):
+                if done():
+                    click.echo(f"Skipping {name}, already done")
+                    return
+                if persistent:
+                    raise RunStateError(
+                        f"{name} was done by the earlier run, but what it "
+                        f"created is gone or has changed"
+                    )
+            step()
+            if state is not None:
+                state.record(name, facts() if facts is not None else None)
+
+        return run_step
+
+    def size_swap() -> None:
+        nonlocal swap_size
+        if swap_size is not None:
+            return
+        # free reports KiB
+        memory = total_mem() * 1024
+        if swap_settings.mode is SwapMode.ZRAM:
+            swap_size = int(memory * swap_settings.zram_fraction)
+            return
+        # Round up to a power of 2, and at least 1G of swap
+        swap_size = 2 ** math.ceil(math.log2(max(1024**3, memory)))
+        if swap_settings.mode is SwapMode.SWAPFILE:
+            swap_size = min(swap_size, SWAPFILE_DEFAULT_SIZE)
+
+    def randomize_root(root: Path) -> t.Callable[[], None]:
+        def step() -> None:
+            if randomize:
+                randomize_drive_lib(root, wipe)
+
+        return step
+
+    def luks_tune() -> None:
+        tuned = [tune_luks_options(root, luks_settings) for root in roots]
+        # LVM will not put PVs with different block sizes in one VG
+        if len({options.sector_size for options in tuned}) > 1:
+            tuned = [dataclasses.replace(o, sector_size=512) for o in tuned]
+        root_luks.update(zip(roots, tuned))
+
+    def luks_format(root: Path) -> t.Callable[[], None]:
+        def step() -> None:
+            run(
+                [
+                    cryptsetup,
+                    "luksFormat",
+                    "--type",
+                    "luks2",
+                    "--label",
+                    LUKS_LABEL,
+                    *root_luks[root].format_args(),
+                    root,
+                ],
+                input=passwd,
+                text=True,
+                check=True,
+            )
+
+        return step
+
+    def luks_open(root: Path, name: str) -> t.Callable[[], None]:
+        def step() -> None:
+            run(
+                [cryptsetup, "luksOpen", *root_luks[root].open_args(), root, name],
+                input=passwd,
+                text=True,
+                check=True,
+            )
+
+        return step
+
+    # The fact each volume's UUID is recorded as
+    volume_facts = {root_name: "root_lv_uuid"}
+    if swap_settings.mode is SwapMode.LV:
+        volume_facts[swap_name] = "swap_lv_uuid"
+    created_volumes: t.Dict[str, str] = {}
+
+    def layout_facts(vg: VolumeGroup) -> t.Dict[str, str]:
+        facts = {"vg_uuid": vg.uuid}
+        for name, key in volume_facts.items():
+            facts[key] = vg.lvs[name].uuid
+        return facts
+
+    def create_volumes() -> None:
+        batch = LvmBatch(mapper_devices)
+        batch.add(
+            "pvcreate",
+            "--yes",
+            "--dataalignment",
+            f"{alignment // 1024}k",
+            *mapper_devices,
+        )
+        batch.add("vgcreate", vg_name, *mapper_devices)
+        if swap_settings.mode is SwapMode.LV:
+            assert swap_size is not None
+            batch.add(
+                "lvcreate",
+                "--yes",
+                *stripe_args,
+                "-L",
+                f"{swap_size}b",
+                "-n",
+                swap_name,
+                vg_name,
+            )
+        # 100%FREE has to come after the swap volume is allocated. Striped
+        # across devices of different sizes, LVM rounds it down to what fits
+        # on the smallest
+        batch.add(
+            "lvcreate",
+            "--yes",
+            *stripe_args,
+            "-l",
+            "100%FREE",
+            "-n",
+            root_name,
+            vg_name,
+        )
+        with LVM_LOCK:
+            output = batch.run()
+            vg = read_layout(mapper_devices).get(vg_name)
+        if vg is None or not vg.lvs.keys() >= volume_facts.keys():
+            devices = ", ".join(map(str, mapper_devices))
+            raise LvmError(f"Creating the volumes on {devices} failed:\n{output}")
+        created_volumes.update(layout_facts(vg))
+
+    def volumes_exist() -> bool:
+        with LVM_LOCK:
+            vg = read_layout(mapper_devices).get(vg_name)
+            if vg is None or not vg.lvs.keys() >= volume_facts.keys():
+                return False
+            # Volumes with the same names are not enough: they have to be the
+            # ones the earlier run created
+            if any(fact(key) != value for key, value in layout_facts(vg).items()):
+                return False
+            # Activating the group is also what makes its volumes show up
+            # again after a reboot
+            return set_active([vg_name], mapper_devices, True)
 
-    subprocess.run([mkdir, "-p", f"{mount_point}"], check=True)
-    subprocess.run([mount, f"/dev/{vg_name}/{root_name}", mount_point], check=True)
-    subprocess.run([mkdir, "-p", f"{mount_point}/boot"], check=True)
-    subprocess.run([mount, partitions.boot, f"{mount_point}/boot"], check=True)
-    subprocess.run([swapon, f"/dev/{vg_name}/{swap_name}"], check=True)
+    def zram() -> None:
+        nonlocal swap_device
+        assert swap_size is not None
+        swap_device = setup_zram(swap_size, swap_settings.zram_algorithm)
+
+    def zram_done() -> bool:
+        nonlocal swap_device
+        device = fact("zram_device")
+        if device is None:
+            return False
+        disksize = Path(f"/sys/block/{Path(device).name}/disksize")
+        if not disksize.exists() or int(disksize.read_text()) == 0:
+            return False
+        swap_device = Path(device)
+        return True
+
+    def swapfile() -> None:
+        assert swap_size is not None and swap_device is not None
+        create_swapfile(swap_device, swap_size)
+
+    def make_swap() -> None:
+        assert swap_device is not None
+        run([mkswap, "-L", "swap", swap_device], check=True)
+
+    def enable_swap() -> None:
+        assert swap_device is not None
+        if swap_settings.mode is SwapMode.ZRAM:
+            # Prefer compressed memory over any swap on disk
+            run([swapon, "--priority", "100", swap_device], check=True)
+        else:
+            run([swapon, swap_device], check=True)
+
+    def swap_enabled() -> bool:
+        assert swap_device is not None
+        lines = Path("/proc/swaps").read_text().splitlines()[1:]
+        return str(swap_device.resolve()) in {line.split()[0] for line in lines}
+
+    def mkfs_root() -> None:
+        root = root_device
+        # A striped volume reports its stripe geometry like RAID does
+        root_topology = probe(root) if stripes > 1 else topologies[0]
+        start = time.monotonic()
+        run(
+            [
+                mkfs_ext4,
+                "-L",
+                "root",
+                *ext4_args(format_profile, root_topology, wiped=randomize),
+                root,
+            ],
+            check=True,
+        )
+        click.echo(
+            f"Formatted {root} in {time.monotonic() - start:.1f}s "
+            f"({format_profile.value} profile)"
+        )
+
+    def mounted(device: Path, at: Path) -> bool:
+        # Whatever is mounted there has to be device, not just anything
+        snap = snapshot()
+        found = snap.mounted_at(at)
+        return found is not None and found is snap.get(device)
+
+    def mount_root() -> None:
+        run([mkdir, "-p", f"{mount_point}"], check=True)
+        run([mount, root_device, mount_point], check=True)
+
+    def mount_boot() -> None:
+        run([mkdir, "-p", f"{mount_point}/boot"], check=True)
+        run([mount, partitions.boot, f"{mount_point}/boot"], check=True)
+
+    def command(*args: t.Any) -> t.Callable[[], None]:
+        def step() -> None:
+            run(args, check=True)
+
+        return step
+
+    def mkswap_task(deps: t.Sequence[str]) -> Task:
+        def swap_done() -> bool:
+            assert swap_device is not None
+            return has_signature(swap_device, "swap", fact("swap_uuid"))
+
+        def swap_facts() -> t.Dict[str, str]:
+            assert swap_device is not None
+            return uuid_fact("swap_uuid", swap_device)()
+
+        return Task(
+            "mkswap",
+            tracked(
+                "mkswap",
+                make_swap,
+                swap_done,
+                swap_facts,
+                # A new zram device is empty, so needs its signature again
+                persistent=swap_settings.mode is not SwapMode.ZRAM,
+            ),
+            deps=deps,
+        )
+
+    if swap_settings.mode is SwapMode.LV:
+        swap_tasks = [mkswap_task(["lvm"])]
+    elif swap_settings.mode is SwapMode.ZRAM:
+        swap_tasks = [
+            Task(
+                "zram",
+                tracked(
+                    "zram",
+                    zram,
+                    zram_done,
+                    lambda: {"zram_device": str(swap_device)},
+                    persistent=False,
+                ),
+                deps=["size-swap"],
+            ),
+            mkswap_task(["zram"]),
+        ]
+    elif swap_settings.mode is SwapMode.SWAPFILE:
+        swap_tasks = [
+            Task(
+                "swapfile",
+                tracked(
+                    "swapfile",
+                    swapfile,
+                    lambda: swap_device is not None and swap_device.exists(),
+                ),
+                deps=["mount-root", "size-swap"],
+            ),
+            mkswap_task(["swapfile"]),
+        ]
+    elif swap_settings.mode is SwapMode.NONE:
+        swap_tasks = []
+    else:
+        assert_never(swap_settings.mode)
+    if swap_tasks:
+        swap_tasks.append(
+            Task(
+                "swapon",
+                tracked("swapon", enable_swap, swap_enabled, persistent=False),
+                deps=["mkswap"],
+            )
+        )
+
+    def root_step(step: str, i: int) -> str:
+        # The first root device's steps keep the names they had before there
+        # could be more
+        return step if i == 0 else f"{step}-{i}"
+
+    def root_device_tasks(i: int, root: Path) -> t.List[Task]:
+        def name(step: str) -> str:
+            return root_step(step, i)
+
+        luks_uuid = "luks_uuid" if i == 0 else f"luks_uuid_{i}"
+        mapper_device = mapper_devices[i]
+        return [
+            Task(
+                name("randomize"),
+                tracked(name("randomize"), randomize_root(root), lambda: True),
+                # The benchmark would be skewed by the CPU the wipe uses, and
+                # its result is cached for good
+                deps=["luks-tune"],
+            ),
+            Task(
+                name("luks-format"),
+                tracked(
+                    name("luks-format"),
+                    luks_format(root),
+                    lambda: has_signature(root, "crypto_LUKS", fact(luks_uuid)),
+                    uuid_fact(luks_uuid, root),
+                ),
+                deps=[name("randomize")],
+            ),
+            Task(
+                name("luks-dump"),
+                command(cryptsetup, "luksDump", root),
+                deps=[name("luks-format")],
+            ),
+            Task(
+                name("luks-open"),
+                tracked(
+                    name("luks-open"),
+                    luks_open(root, luks_mapper_names[i]),
+                    mapper_device.exists,
+                    persistent=False,
+                ),
+                deps=[name("luks-format")],
+            ),
+        ]
+
+    root_tasks = [
+        task for i, root in enumerate(roots) for task in root_device_tasks(i, root)
+    ]
+
+    # The boot and root partitions are independent until they are mounted, and
+    # so are the swap and root volumes once they have been created. Each root
+    # device is wiped, formatted and opened independently of the others.
+    run_tasks(
+        [
+            *swap_tasks,
+            *root_tasks,
+            Task("size-swap", size_swap),
+            Task(
+                "mkfs-boot",
+                tracked(
+                    "mkfs-boot",
+                    command(mkfs_fat, partitions.boot),
+                    lambda: has_signature(partitions.boot, "vfat", fact("boot_uuid")),
+                    uuid_fact("boot_uuid", partitions.boot),
+                ),
+            ),
+            Task("luks-tune", luks_tune),
+            # The PV, VG and LVs are created together, in one LVM session
+            Task(
+                "lvm",
+                tracked("lvm", create_volumes, volumes_exist, lambda: created_volumes),
+                deps=[
+                    *(root_step("luks-open", i) for i in range(len(roots))),
+                    "size-swap",
+                ],
+            ),
+            Task(
+                "mkfs-root",
+                tracked(
+                    "mkfs-root",
+                    mkfs_root,
+                    lambda: has_signature(root_device, "ext4", fact("root_uuid")),
+                    uuid_fact("root_uuid", root_device),
+                ),
+                deps=["lvm"],
+            ),
+            Task(
+                "mount-root",
+                tracked(
+                    "mount-root",
+                    mount_root,
+                    lambda: mounted(root_device, mount_point),
+                    persistent=False,
+                ),
+                deps=["mkfs-root"],
+            ),
+            Task(
+                "mount-boot",
+                tracked(
+                    "mount-boot",
+                    mount_boot,
+                    lambda: mounted(partitions.boot, mount_point / "boot"),
+                    persistent=False,
+                ),
+                deps=["mount-root", "mkfs-boot"],
+            ),
+        ]
+    )
+    if state is not None:
+        state.remove()
 
 
 blkdevice = click.Path(
@@ -129,7 +635,8 @@ blkdevice = click.Path(
 @click.option(
     "--drive",
     type=blkdevice,
-    help="drive to parition and then use (/dev/whatever)",
+    multiple=True,
+    help="drive to parition and then use (/dev/whatever); repeat to spread root over several",
 )
 @click.option(
     "--boot",
@@ -139,31 +646,74 @@ blkdevice = click.Path(
 @click.option(
     "--root",
     type=blkdevice,
-    help="The boot partition",
+    multiple=True,
+    help="The root partition; repeat to spread root over several",
+)
+@click.option(
+    "--stripes",
+    type=click.IntRange(min=1),
+    help="devices to stripe the root and swap volumes across, defaults to all of them",
+)
+@click.option(
+    "--stripe-size",
+    help="size of each stripe, a power of 2 of at least 4K, defaults to LVM's",
 )
 @click.option(
     "--randomize/--no-randomize",
     default=False,
     help="Randomize the root partition before encrypting",
 )
+@wipe_options
+@luks_options
 @click.option(
-    "--swap-size", help="swap size, defaults to 2**n G where 2**n G >= total memory"
+    "--swap-size",
+    help="swap size, defaults to 2**n G where 2**n G >= total memory (at most 8G for a swapfile)",
 )
+@swap_options
+@format_profile_option
 @click.option(
     "--mount",
     type=click.Path(exists=True, file_okay=False, dir_okay=True, resolve_path=True),
     help="directory to mount new the the system in",
     required=True,
 )
+@click.option(
+    "--continue",
+    "continue_run",
+    is_flag=True,
+    help="continue an interrupted run on the same drive, skipping completed steps",
+)
+@trace_option
 @click.password_option()
 @click.confirmation_option(prompt="Are you sure?")
 def prepare_drive(
-    drive: t.Optional[str],
+    drive: t.Tuple[str, ...],
     boot: t.Optional[str],
-    root: t.Optional[str],
+    root: t.Tuple[str, ...],
+    stripes: t.Optional[int],
+    stripe_size: t.Optional[str],
     randomize: bool,
+    method: str,
+    engine: str,
+    threads: t.Optional[int],
+    resume: bool,
+    max_bandwidth: t.Optional[str],
+    io_priority: t.Optional[str],
+    adaptive: bool,
+    progress_fd: t.Optional[int],
+    progress_interval: float,
+    luks_tune: bool,
+    cipher: t.Optional[str],
+    key_size: t.Optional[int],
+    sector_size: t.Optional[str],
+    perf_no_workqueue: t.Optional[bool],
     swap_size: t.Optional[str],
+    swap_mode: str,
+    zram_algorithm: str,
+    zram_fraction: float,
+    format_profile: str,
     mount: str,
+    continue_run: bool,
     password: str,
 ) -> None:
     """
@@ -173,27 +723,119 @@ def prepare_drive(
     --drive expects an entire block device, and will create a new GPT partition table
     on the device. --root and --boot both expect partitions.
 
-    If --randomize is set, then the root partition is randomized.
+    --drive and --root can be repeated to spread the root volume group over
+    several devices. Each gets its own LUKS container, and the root and swap
+    volumes are striped across --stripes of them (all, by default) so that
+    sequential throughput scales with the number of devices. The boot
+    partition goes on the first --drive. The devices should be the same
+    size, since a striped volume only uses as much of each as the smallest
+    has.
+
+    If --randomize is set, then the root partition is randomized, using --method
+    and --engine.
+
+    --luks-tune picks LUKS settings for the hardware; --cipher, --key-size,
+    --sector-size and --perf-no-workqueue override individual choices, with or
+    without it.
+
+    --format-profile picks the mkfs.ext4 options for the root filesystem. A
+    randomized root is never discarded again by mkfs.
+
+    --swap-mode picks where swap goes: a volume inside LUKS (the default), a
+    zram device in memory, a preallocated file on the root filesystem, or
+    nowhere.
+
+    Each completed step is recorded against the root partition. After a
+    failure, --continue with the same options picks up from the first step
+    that did not complete, once it has checked that the LUKS header, volumes
+    and filesystems the earlier run created are still there. With --drive,
+    the existing partitions are kept, as they also are with --resume, so that
+    an interrupted wipe can pick up where it stopped. Without --resume, an
+    interrupted wipe starts over.
     """
-    dst: t.Union[str, PartitionScheme]
-    if drive is not None:
-        if boot is not None or root is not None:
+    dst: t.Union[t.List[Path], PartitionScheme]
+    if drive:
+        if boot is not None or root:
             raise click.UsageError(
                 "--boot and --root must not be used when --drive is set"
             )
-        dst = drive
-    elif boot is not None and root is not None:
-        dst = PartitionScheme(boot=Path(boot), root=Path(root))
-    elif boot is None and root is None:
+        dst = [Path(d) for d in drive]
+    elif boot is not None and root:
+        dst = PartitionScheme(
+            boot=Path(boot),
+            root=Path(root[0]),
+            extra_roots=[Path(r) for r in root[1:]],
+        )
+    elif boot is None and not root:
         raise click.UsageError("[--drive] or [--root --boot] must be set")
     else:
         raise click.UsageError("both --root and --boot are required")
 
-    if isinstance(dst, str):
-        partitions = partition_drive(Path(dst))
+    if stripes is not None and stripes > len(drive or root):
+        raise click.UsageError("--stripes can be at most the number of root devices")
+    if stripe_size is not None:
+        if (stripes or len(drive or root)) == 1:
+            raise click.UsageError(
+                "--stripe-size needs more than one root device to stripe across"
+            )
+        try:
+            size = parse_size(stripe_size)
+        except ValueError as e:
+            raise click.UsageError(f"--stripe-size: {e}")
+        if size < 4096 or size & (size - 1):
+            raise click.UsageError("--stripe-size must be a power of 2 of at least 4K")
+    swap_bytes = None
+    if swap_size is not None:
+        try:
+            swap_bytes = parse_size(swap_size)
+        except ValueError as e:
+            raise click.UsageError(f"--swap-size: {e}")
+        if swap_bytes <= 0:
+            raise click.UsageError("--swap-size must be positive")
+
+    # Before anything is partitioned, so that a usage error leaves the drive
+    # as it was
+    wipe = make_wipe_options(
+        method,
+        engine,
+        threads,
+        resume,
+        max_bandwidth,
+        io_priority,
+        adaptive,
+        progress_fd,
+        progress_interval,
+    )
+    luks_settings = make_luks_options(
+        luks_tune, cipher, key_size, sector_size, perf_no_workqueue
+    )
+    swap_settings = make_swap_options(swap_mode, zram_algorithm, zram_fraction)
+
+    if isinstance(dst, list):
+        first, *extra = dst
+        keep_partitions = continue_run or resume
+        partitions = drive_partitions(first, keep_partitions)
+        for extra_drive in extra:
+            if keep_partitions and partition_path(extra_drive, 1).exists():
+                partitions.extra_roots.append(partition_path(extra_drive, 1))
+            else:
+                partitions.extra_roots.append(partition_extra_drive(extra_drive))
     elif isinstance(dst, PartitionScheme):
         partitions = dst
     else:
         assert_never(dst)
 
-    configure_drive(partitions, randomize, swap_size, Path(mount), password)
+    configure_drive(
+        partitions,
+        randomize,
+        swap_bytes,
+        Path(mount),
+        password,
+        wipe,
+        luks_settings,
+        FormatProfile(format_profile),
+        swap_settings,
+        continue_run,
+        stripes,
+        stripe_size,
+    )
@@ -0,0 +1,144 @@
+import contextvars
+import os
+import subprocess
+import threading
+import typing as t
+
+from jgsysutil.tracing import span
+
+Args = t.Sequence[t.Union[str, "os.PathLike[str]"]]
+
+
+class ProcessGroup:
+    """
+    Child processes started by run() in one context, so they can be terminated
+    together when the work they belong to is abandoned. Work done in-process
+    instead watches the cancelled event, which is set at the same time.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._running: t.Set["subprocess.Popen[t.Any]"] = set()
+        self.cancelled = threading.Event()
+
+    def add(self, process: "subprocess.Popen[t.Any]") -> None:
+        with self._lock:
+            self._running.add(process)
+
+    def remove(self, process: "subprocess.Popen[t.Any]") -> None:
+        with self._lock:
+            self._running.discard(process)
+
+    def terminate(self) -> None:
+        self.cancelled.set()
+        with self._lock:
+            running = list(self._running)
+        for process in running:
+            process.terminate()
+
+
+_current_group: contextvars.ContextVar[t.Optional[ProcessGroup]] = (
+    contextvars.ContextVar("process_group", default=None)
+)
+
+
+def set_process_group(group: t.Optional[ProcessGroup]) -> None:
+    _current_group.set(group)
+
+
+def cancel_event() -> t.Optional[threading.Event]:
+    """
+    The event set when the current ProcessGroup (if any) is terminated.
+    """
+    group = _current_group.get()
+    return None if group is None else group.cancelled
+
+
+def run(
+    args: Args,
+    *,
+    input: t.Optional[t.Union[str, bytes]] = None,
+    check: bool = False,
+    capture_output: bool = False,
+    **kwargs: t.Any,
+) -> "subprocess.CompletedProcess[t.Any]":
+    """
+    subprocess.run, but the process is registered with the current ProcessGroup
+    (if any) while it runs, and traced as a span.
+    """
+    with span(
+        os.path.basename(args[0]), "process", argv=[os.fspath(arg) for arg in args]
+    ) as span_args:
+        completed = _run(args, input, capture_output, **kwargs)
+        span_args["exit_code"] = completed.returncode
+    if check:
+        completed.check_returncode()
+    return completed
+
+
+def _run(
+    args: Args,
+    input: t.Optional[t.Union[str, bytes]],
+    capture_output: bool,
+    **kwargs: t.Any,
+) -> "subprocess.CompletedProcess[t.Any]":
+    group = _current_group.get()
+    if group is None:
+        return subprocess.run(
+            args, input=input, capture_output=capture_output, **kwargs
+        )
+    if input is not None:
+        kwargs["stdin"] = subprocess.PIPE
+    if capture_output:
+        kwargs["stdout"] = subprocess.PIPE
+        kwargs["stderr"] = subprocess.PIPE
+    with subprocess.Popen(args, **kwargs) as process:
+        group.add(process)
+        try:
+            stdout, stderr = process.communicate(input)
+        except BaseException:
+            process.kill()
+            raise
+        finally:
+            group.remove(process)
+    return subprocess.CompletedProcess(process.args, process.returncode, stdout, stderr)
+
+
+def run_lines(
+    args: Args,
+    on_line: t.Callable[[str], None],
+    *,
+    check: bool = False,
+    **kwargs: t.Any,
+) -> "subprocess.CompletedProcess[t.Any]":
+    """
+    Like run, but each line the process writes to stderr is passed to on_line
+    as soon as it is written.
+    """
+    group = _current_group.get()
+    with span(
+        os.path.basename(args[0]), "process", argv=[os.fspath(arg) for arg in args]
+    ) as span_args:
+        with subprocess.Popen(
+            args, stderr=subprocess.PIPE, text=True, **kwargs
+        ) as process:
+            assert process.stderr is not None
+            if group is not None:
+                group.add(process)
+            try:
+                for line in process.stderr:
+                    on_line(line)
+                process.wait()
+            except BaseException:
+                process.kill()
+                raise
+            finally:
+                if group is not None:
+                    group.remove(process)
+        span_args["exit_code"] = process.returncode
+    completed: "subprocess.CompletedProcess[t.Any]" = subprocess.CompletedProcess(
+        process.args, process.returncode
+    )
+    if check:
+        completed.check_returncode()
+    return completed
@@ -0,0 +1,104 @@
+import dataclasses
+import json
+import os
+import threading
+import time
+import typing as t
+
+
+@dataclasses.dataclass(frozen=True)
+class ProgressReport:
+    drive: str
+    bytes_done: int
+    total_bytes: int
+    seconds: float
+    # Bytes per second since the previous report, and since the start
+    rate: float
+    average_rate: float
+    # Seconds left at the average rate, if there is one yet
+    eta: t.Optional[float]
+    done: bool
+
+    def to_json(self) -> str:
+        return json.dumps(dataclasses.asdict(self))
+
+
+@dataclasses.dataclass
+class ProgressSink:
+    """
+    Where to send progress reports, and how often.
+    """
+
+    report: t.Callable[[ProgressReport], None]
+    interval: float = 1.0
+
+
+class ProgressMeter:
+    """
+    Turns (offset, length) on_written callbacks into a ProgressReport every
+    sink.interval seconds.
+
+    on_written is on the write path, so between reports it only takes a lock
+    to add up the bytes and reads the clock.
+    """
+
+    def __init__(
+        self, drive: str, total_bytes: int, sink: ProgressSink, bytes_done: int = 0
+    ) -> None:
+        self._drive = drive
+        self._total = total_bytes
+        self._sink = sink
+        self._lock = threading.Lock()
+        self._start = time.monotonic()
+        self._initial = bytes_done
+        self._done = bytes_done
+        self._last_time = self._start
+        self._last_done = bytes_done
+
+    def on_written(self, offset: int, length: int) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self._done += length
+            if now - self._last_time < self._sink.interval:
+                return
+            report = self._report(now, done=False)
+        self._sink.report(report)
+
+    def finish(self) -> None:
+        with self._lock:
+            report = self._report(time.monotonic(), done=True)
+        self._sink.report(report)
+
+    def _report(self, now: float, done: bool) -> ProgressReport:
+        seconds = now - self._start
+        rate = (self._done - self._last_done) / max(now - self._last_time, 1e-9)
+        average_rate = (self._done - self._initial) / max(seconds, 1e-9)
+        remaining = max(self._total - self._done, 0)
+        self._last_time = now
+        self._last_done = self._done
+        return ProgressReport(
+            drive=self._drive,
+            bytes_done=self._done,
+            total_bytes=self._total,
+            seconds=seconds,
+            rate=rate,
+            average_rate=average_rate,
+            eta=remaining / average_rate if average_rate > 0 else None,
+            done=done,
+        )
+
+
+def json_lines(fd: int) -> t.Callable[[ProgressReport], None]:
+    """
+    A report callback writing each report as a line of JSON to fd.
+    """
+    lock = threading.Lock()
+
+    def write(report: ProgressReport) -> None:
+        line = (report.to_json() + "\n").encode()
+        with lock:
+            while line:
+                written = os.write(fd, line)
+                line = line[written:]
+
+    return write
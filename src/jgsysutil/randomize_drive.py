@@ -1,31 +1,578 @@
-import subprocess
+import dataclasses
+import enum
+import fnmatch
+import glob
+import json
+import os
+import re
+import threading
+import time
+import typing as t
+import uuid
+from contextlib import contextmanager, nullcontext
 from pathlib import Path
 
 import click
 
-from jgsysutil.commands import shred
+from jgsysutil.checkpoint import Checkpoint, CheckpointError
+from jgsysutil.commands import cryptsetup, ionice, lsblk, shred
+from jgsysutil.discard import DiscardKind, DiscardUnsupported, discard_device
+from jgsysutil.native_wipe import WipeStats, device_size, native_wipe
+from jgsysutil.process import cancel_event, run, run_lines
+from jgsysutil.progress import ProgressMeter, ProgressSink, json_lines
+from jgsysutil.sysfs import is_rotational
+from jgsysutil.throttle import IoPriority, TokenBucket, parse_size, throttle
+from jgsysutil.tracing import span, trace_option
+from jgsysutil.typing import assert_never
+from jgsysutil.wipe_pool import wipe_drives
 
+F = t.TypeVar("F", bound=t.Callable[..., t.Any])
 
-def randomize_drive_lib(drive: Path) -> None:
+
+class WipeEngine(enum.Enum):
+    SHRED = "shred"
+    NATIVE = "native"
+
+
+class WipeMethod(enum.Enum):
+    # Write a random keystream over the device
+    RANDOM = "random"
+    # Write zeros through a throwaway plain dm-crypt mapping, so the kernel
+    # (and AES-NI) produces the random data
+    DMCRYPT = "dmcrypt"
+    # Have the device drop or zero its contents; these fall back to RANDOM when
+    # the device does not support them
+    DISCARD = "discard"
+    SECURE_DISCARD = "secure-discard"
+    ZEROOUT = "zeroout"
+    # DMCRYPT on flash media, which can take writes faster than userspace can
+    # generate random data, RANDOM on spinning disks. Never a discard: the
+    # device may keep the old data readable afterwards
+    AUTO = "auto"
+
+
+@dataclasses.dataclass
+class WipeOptions:
+    method: WipeMethod = WipeMethod.RANDOM
+    engine: WipeEngine = WipeEngine.SHRED
+    threads: t.Optional[int] = None
+    # Continue from the checkpoint of an interrupted wipe (native engine only)
+    resume: bool = False
+    progress: t.Optional[ProgressSink] = None
+    # Bytes per second (native engine only)
+    max_bandwidth: t.Optional[int] = None
+    io_priority: t.Optional[IoPriority] = None
+    # Slow down while other disks' latency suffers (native engine only)
+    adaptive: bool = False
+
+
+@contextmanager
+def plain_crypt_mapping(drive: Path) -> t.Iterator[Path]:
+    """
+    Map drive with plain dm-crypt under a random key that is never stored.
+    """
+    name = f"{uuid.uuid4()}_wipe"
+    run(
+        [
+            cryptsetup,
+            "open",
+            "--type",
+            "plain",
+            "--cipher",
+            "aes-xts-plain64",
+            "--key-size",
+            "512",
+            "--key-file",
+            "/dev/urandom",
+            drive,
+            name,
+        ],
+        check=True,
+    )
+    try:
+        yield Path("/dev/mapper") / name
+    finally:
+        close_crypt_mapping(name)
+
+
+def close_crypt_mapping(name: str, attempts: int = 5) -> None:
+    # udev may still hold the mapper device open for a moment after the last write
+    for attempt in range(attempts):
+        if run([cryptsetup, "close", name]).returncode == 0:
+            return
+        time.sleep(0.2 * 2**attempt)
+    # Last resort: have the kernel remove the mapping once it is no longer busy
+    run([cryptsetup, "close", "--deferred", name], check=True)
+
+
+@contextmanager
+def wipe_checkpoint(
+    drive: Path, method: WipeMethod, options: WipeOptions
+) -> t.Iterator[t.Optional[Checkpoint]]:
+    """
+    Checkpoint progress while wiping drive, if the engine supports it.
+
+    The checkpoint is saved if the wipe is interrupted, and removed once it
+    completes.
+    """
+    if options.engine is not WipeEngine.NATIVE:
+        if options.resume:
+            raise ValueError("Only the native engine can resume a wipe")
+        yield None
+        return
+    try:
+        checkpoint = Checkpoint.open(drive, method.value, options.resume)
+    except CheckpointError as e:
+        if options.resume:
+            raise
+        click.secho(f"Not checkpointing: {e}", fg="yellow", err=True)
+        yield None
+        return
+    if checkpoint.completed_bytes > 0:
+        click.echo(f"Resuming, {checkpoint.completed_bytes} bytes already wiped")
+    try:
+        yield checkpoint
+    except BaseException:
+        checkpoint.save()
+        raise
+    checkpoint.remove()
+
+
+OnWritten = t.Callable[[int, int], None]
+
+# shred --verbose ends each progress line with the percentage done
+SHRED_PROGRESS = re.compile(r"(\d+)%\s*$")
+
+
+def run_shred(
+    args: t.Sequence[t.Any],
+    size: int,
+    on_written: t.Optional[OnWritten],
+    io_priority: t.Optional[IoPriority] = None,
+) -> None:
+    """
+    Run shred --verbose, passing its output through, and turn its progress
+    lines into on_written calls. shred writes from the start of the device to
+    the end, so the ranges are exact up to the 1% steps it reports in.
+    """
+    reported = 0
+
+    def on_line(line: str) -> None:
+        nonlocal reported
+        click.echo(line, nl=False, err=True)
+        match = SHRED_PROGRESS.search(line)
+        if match is None or on_written is None:
+            return
+        done = size * int(match[1]) // 100
+        if done > reported:
+            on_written(reported, done - reported)
+            reported = done
+
+    command = [shred, "--verbose", *args]
+    if io_priority is not None:
+        command = [ionice, *io_priority.ionice_args(), *command]
+    run_lines(command, on_line, check=True)
+    if on_written is not None and reported < size:
+        on_written(reported, size - reported)
+
+
+def write_pass(
+    drive: Path,
+    options: WipeOptions,
+    zero: bool,
+    ranges: t.Optional[t.List[t.Tuple[int, int]]] = None,
+    on_written: t.Optional[OnWritten] = None,
+    bucket: t.Optional[TokenBucket] = None,
+    cancel: t.Optional[threading.Event] = None,
+) -> WipeStats:
+    if options.engine is WipeEngine.SHRED:
+        start = time.monotonic()
+        size = device_size(drive)
+        if zero:
+            run_shred(["-n", "0", "-z", drive], size, on_written, options.io_priority)
+        else:
+            run_shred(["-n", "1", drive], size, on_written, options.io_priority)
+        return WipeStats(bytes_written=size, seconds=time.monotonic() - start)
+    elif options.engine is WipeEngine.NATIVE:
+        return native_wipe(
+            drive,
+            threads=options.threads,
+            zero=zero,
+            ranges=ranges,
+            on_written=on_written,
+            throttle=bucket,
+            io_priority=options.io_priority,
+            cancel=cancel,
+        )
+    else:
+        assert_never(options.engine)
+
+
+def discard_or_overwrite(
+    drive: Path,
+    options: WipeOptions,
+    kind: DiscardKind,
+    ranges: t.Optional[t.List[t.Tuple[int, int]]],
+    on_written: t.Optional[OnWritten],
+    bucket: t.Optional[TokenBucket],
+    cancel: t.Optional[threading.Event],
+) -> WipeStats:
+    try:
+        return discard_device(drive, kind, on_written=on_written, cancel=cancel)
+    except DiscardUnsupported as e:
+        click.secho(f"{e}, overwriting instead", fg="yellow", err=True)
+        return write_pass(drive, options, False, ranges, on_written, bucket, cancel)
+
+
+def randomize_drive_lib(
+    drive: Path,
+    options: t.Optional[WipeOptions] = None,
+    on_written: t.Optional[OnWritten] = None,
+    cancel: t.Optional[threading.Event] = None,
+) -> WipeStats:
+    """
+    Wipe drive as described by options.
+
+    on_written is called with each (offset, length) range of drive as it is
+    wiped, possibly from several threads at once.
+
+    Once cancel is set (by default, once the current ProcessGroup is
+    terminated) the wipe stops and raises WipeCancelled.
+    """
+    if options is None:
+        options = WipeOptions()
+    if cancel is None:
+        cancel = cancel_event()
     # subprocess.run(
     #     f'set -euf -o pipefail; {openssl} enc -aes-256-ctr -pbkdf2 -iter 100000 -pass pass:"$({dd} if=/dev/urandom bs=128 count=1 2>/dev/null | base64)" -nosalt < /dev/zero | {dd} of={drive} bs=1M status=progress conv=noerror,sync',
     #     shell=True,
     #     check=True,
     # )
-    subprocess.run([shred, "--verbose", "-n", "1", drive], check=True)
+    method = options.method
+    if method is WipeMethod.AUTO:
+        method = WipeMethod.RANDOM if is_rotational(drive) else WipeMethod.DMCRYPT
+
+    with span(
+        "wipe", drive=str(drive), method=method.value, engine=options.engine.value
+    ) as span_args, wipe_checkpoint(drive, method, options) as checkpoint, throttle(
+        drive, options.max_bandwidth, options.adaptive
+    ) as bucket:
+        ranges = None if checkpoint is None else checkpoint.remaining()
+        meter = None
+        if options.progress is not None:
+            meter = ProgressMeter(
+                str(drive),
+                device_size(drive),
+                options.progress,
+                bytes_done=0 if checkpoint is None else checkpoint.completed_bytes,
+            )
+
+        def record(offset: int, length: int) -> None:
+            if checkpoint is not None:
+                checkpoint.record(offset, length)
+            if meter is not None:
+                meter.on_written(offset, length)
+            if on_written is not None:
+                on_written(offset, length)
+
+        if method is WipeMethod.RANDOM:
+            stats = write_pass(drive, options, False, ranges, record, bucket, cancel)
+        elif method is WipeMethod.DMCRYPT:
+            # The key differs between runs, but the zeros written under an old
+            # key are just as random, so a dmcrypt wipe can resume as well
+            with plain_crypt_mapping(drive) as mapped:
+                flushed: t.ContextManager[None] = (
+                    nullcontext()
+                    if checkpoint is None
+                    else checkpoint.writing_through(mapped)
+                )
+                with flushed:
+                    stats = write_pass(
+                        mapped, options, True, ranges, record, bucket, cancel
+                    )
+        elif method is WipeMethod.DISCARD:
+            stats = discard_or_overwrite(
+                drive, options, DiscardKind.DISCARD, ranges, record, bucket, cancel
+            )
+        elif method is WipeMethod.SECURE_DISCARD:
+            stats = discard_or_overwrite(
+                drive,
+                options,
+                DiscardKind.SECURE_DISCARD,
+                ranges,
+                record,
+                bucket,
+                cancel,
+            )
+        elif method is WipeMethod.ZEROOUT:
+            stats = discard_or_overwrite(
+                drive, options, DiscardKind.ZEROOUT, ranges, record, bucket, cancel
+            )
+        elif method is WipeMethod.AUTO:
+            raise AssertionError("AUTO is resolved above")
+        else:
+            assert_never(method)
+        if meter is not None:
+            meter.finish()
+        span_args["bytes"] = stats.bytes_written
+        return stats
+
+
+def wipe_options(f: F) -> F:
+    """
+    Click options for choosing how a drive is randomized.
+    """
+    options = [
+        click.option(
+            "--method",
+            type=click.Choice([m.value for m in WipeMethod]),
+            default=WipeMethod.RANDOM.value,
+            show_default=True,
+            help="random writes a random keystream, dmcrypt writes zeros through a throwaway dm-crypt mapping, discard/secure-discard/zeroout ask the device to drop its contents (falling back to random), auto uses dmcrypt on flash media and random elsewhere",
+        ),
+        click.option(
+            "--engine",
+            type=click.Choice([e.value for e in WipeEngine]),
+            default=WipeEngine.SHRED.value,
+            show_default=True,
+            help="shred runs a single shred process, native writes in-process from a thread pool",
+        ),
+        click.option(
+            "--threads",
+            type=click.IntRange(min=1),
+            help="worker threads for the native engine, defaults to the number of CPUs",
+        ),
+        click.option(
+            "--resume/--no-resume",
+            default=False,
+            help="continue an interrupted wipe from its checkpoint (native engine only)",
+        ),
+        click.option(
+            "--max-bandwidth",
+            metavar="SIZE",
+            help="limit writes to SIZE bytes per second, e.g. 200M (native engine only; discards are not limited)",
+        ),
+        click.option(
+            "--io-priority",
+            metavar="CLASS[:LEVEL]",
+            help="ionice class (realtime, best-effort or idle) and level (0-7) for the writes, e.g. idle or best-effort:7",
+        ),
+        click.option(
+            "--adaptive/--no-adaptive",
+            default=False,
+            help="slow down while the I/O latency of the other disks on the same controller rises, up to --max-bandwidth (native engine only)",
+        ),
+        click.option(
+            "--progress-fd",
+            type=click.IntRange(min=0),
+            help="write wipe progress to this file descriptor as JSON lines",
+        ),
+        click.option(
+            "--progress-interval",
+            type=click.FloatRange(min=0),
+            default=1.0,
+            show_default=True,
+            help="seconds between progress reports",
+        ),
+    ]
+    for option in reversed(options):
+        f = option(f)
+    return f
+
+
+def make_wipe_options(
+    method: str,
+    engine: str,
+    threads: t.Optional[int],
+    resume: bool,
+    max_bandwidth: t.Optional[str],
+    io_priority: t.Optional[str],
+    adaptive: bool,
+    progress_fd: t.Optional[int],
+    progress_interval: float,
+) -> WipeOptions:
+    options = WipeOptions(
+        method=WipeMethod(method),
+        engine=WipeEngine(engine),
+        threads=threads,
+        resume=resume,
+        adaptive=adaptive,
+    )
+    if options.resume and options.engine is not WipeEngine.NATIVE:
+        raise click.UsageError("--resume requires --engine native")
+    if threads is not None and options.engine is not WipeEngine.NATIVE:
+        raise click.UsageError("--threads requires --engine native")
+    if max_bandwidth is not None:
+        try:
+            options.max_bandwidth = parse_size(max_bandwidth)
+        except ValueError as e:
+            raise click.UsageError(f"--max-bandwidth: {e}")
+        if options.max_bandwidth <= 0:
+            raise click.UsageError("--max-bandwidth must be positive")
+    if io_priority is not None:
+        try:
+            options.io_priority = IoPriority.parse(io_priority)
+        except ValueError as e:
+            raise click.UsageError(f"--io-priority: {e}")
+    limited = options.max_bandwidth is not None or options.adaptive
+    if limited and options.engine is not WipeEngine.NATIVE:
+        raise click.UsageError("--max-bandwidth and --adaptive require --engine native")
+    if progress_fd is not None:
+        try:
+            os.fstat(progress_fd)
+        except OSError as e:
+            raise click.UsageError(f"--progress-fd {progress_fd}: {e.strerror}")
+        options.progress = ProgressSink(json_lines(progress_fd), progress_interval)
+    return options
+
+
+def lsblk_disks() -> t.List[t.Dict[str, t.Any]]:
+    return json.loads(
+        run(
+            [lsblk, "--json", "--nodeps", "--bytes", "--output-all"],
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+    )["blockdevices"]
+
+
+def resolve_drives(patterns: t.Sequence[str], filters: t.Sequence[str]) -> t.List[Path]:
+    """
+    Expand glob patterns, and add the whole disks whose lsblk columns match all
+    of the KEY=PATTERN filters.
+    """
+    drives: t.List[Path] = []
+    for pattern in patterns:
+        if glob.has_magic(pattern):
+            matches = sorted(glob.glob(pattern))
+            if not matches:
+                raise click.BadParameter(f"{pattern} matches nothing")
+        else:
+            matches = [pattern]
+        for match in matches:
+            drives.append(Path(match).resolve())
+    if filters:
+        conditions = []
+        for f in filters:
+            key, sep, value = f.partition("=")
+            if not sep:
+                raise click.BadParameter(f"{f} is not KEY=PATTERN")
+            conditions.append((key.lower(), value))
+        for disk in lsblk_disks():
+            if all(
+                fnmatch.fnmatchcase(str(disk.get(key)), value)
+                for key, value in conditions
+            ):
+                drives.append(Path(disk["path"]))
+    for drive in drives:
+        # What click.Path(exists=True, dir_okay=False, writable=True) checks
+        if not drive.exists():
+            raise click.BadParameter(f"{drive} does not exist")
+        if drive.is_dir():
+            raise click.BadParameter(f"{drive} is a directory, not a device")
+        if not os.access(drive, os.W_OK):
+            raise click.BadParameter(f"{drive} is not writable")
+    return list(dict.fromkeys(drives))
+
+
+def print_stats(stats: WipeStats) -> None:
+    click.echo(
+        f"Wrote {stats.bytes_written} bytes in {stats.seconds:.1f}s "
+        f"({stats.mb_per_second:.1f} MB/s)"
+    )
 
 
 @click.command()
-@click.argument(
-    "drive",
-    type=click.Path(
-        exists=True, file_okay=True, dir_okay=False, writable=True, resolve_path=True
-    ),
+@click.argument("drives", nargs=-1)
+@click.option(
+    "--match",
+    "filters",
+    multiple=True,
+    metavar="KEY=PATTERN",
+    help="also wipe whole disks whose lsblk column KEY matches the glob PATTERN, e.g. model='ST4000*'; repeat to require several",
+)
+@wipe_options
+@click.option(
+    "--jobs",
+    type=click.IntRange(min=1),
+    help="maximum number of drives to wipe at once, defaults to all of them",
 )
-@click.confirmation_option(prompt="Are you sure?")
-def randomize_drive(drive: str) -> None:
+@click.option(
+    "--jobs-per-controller",
+    type=click.IntRange(min=1),
+    default=1,
+    show_default=True,
+    help="maximum number of drives behind the same controller to wipe at once",
+)
+@trace_option
+@click.option("--yes", is_flag=True, help="Confirm the action without prompting.")
+def randomize_drive(
+    drives: t.Tuple[str, ...],
+    filters: t.Tuple[str, ...],
+    method: str,
+    engine: str,
+    threads: t.Optional[int],
+    resume: bool,
+    max_bandwidth: t.Optional[str],
+    io_priority: t.Optional[str],
+    adaptive: bool,
+    progress_fd: t.Optional[int],
+    progress_interval: float,
+    jobs: t.Optional[int],
+    jobs_per_controller: int,
+    yes: bool,
+) -> None:
     """
-    Randomizes DRIVE
+    Randomizes DRIVES
+
+    DRIVES may be glob patterns. When several drives are given they are wiped
+    concurrently, and a summary is printed at the end.
+
+    With --progress-fd, each drive's progress (bytes done, current and average
+    throughput, and an ETA) is written to that file descriptor as one JSON
+    object per line, the same way for every method and engine.
     """
-    click.secho(f"Wiping {drive}", fg="red")
-    randomize_drive_lib(Path(drive))
+    options = make_wipe_options(
+        method,
+        engine,
+        threads,
+        resume,
+        max_bandwidth,
+        io_priority,
+        adaptive,
+        progress_fd,
+        progress_interval,
+    )
+    paths = resolve_drives(drives, filters)
+    if not paths:
+        raise click.UsageError("No drives to wipe")
+    for path in paths:
+        click.secho(f"Wiping {path}", fg="red")
+    if not yes:
+        click.confirm("Are you sure?", abort=True)
+
+    if len(paths) == 1:
+        print_stats(randomize_drive_lib(paths[0], options))
+        return
+
+    results = wipe_drives(
+        paths,
+        lambda drive, on_written, stop: randomize_drive_lib(
+            drive, options, on_written, stop
+        ),
+        jobs=jobs,
+        jobs_per_controller=jobs_per_controller,
+    )
+    for result in results:
+        if result.stats is not None:
+            click.secho(
+                f"{result.drive}: wiped {result.stats.bytes_written} bytes in "
+                f"{result.stats.seconds:.1f}s ({result.stats.mb_per_second:.1f} MB/s)",
+                fg="green",
+            )
+        else:
+            click.secho(f"{result.drive}: FAILED: {result.error}", fg="red")
+    failed = [r for r in results if r.error is not None]
+    if failed:
+        raise click.ClickException(f"{len(failed)} of {len(results)} drives failed")
@@ -0,0 +1,135 @@
+import dataclasses
+import json
+import os
+import threading
+import typing as t
+from pathlib import Path
+
+from xdg import XDG_DATA_HOME
+
+from jgsysutil.commands import blkid
+from jgsysutil.identity import DeviceIdentity, device_identity
+from jgsysutil.process import run
+
+RUN_STATE_DIR = XDG_DATA_HOME / "jgsysutil" / "runs"
+
+
+class RunStateError(Exception):
+    pass
+
+
+def blkid_tags(dev: Path) -> t.Dict[str, str]:
+    """
+    What blkid finds on dev (TYPE, UUID, LABEL, ...), read from the device
+    itself rather than from the blkid cache.
+    """
+    result = run(
+        [blkid, "--probe", "--output", "export", dev], capture_output=True, text=True
+    )
+    tags = {}
+    for line in result.stdout.splitlines():
+        key, sep, value = line.partition("=")
+        if sep:
+            tags[key] = value
+    return tags
+
+
+def has_signature(dev: Path, fs_type: str, fs_uuid: t.Optional[str]) -> bool:
+    """
+    Whether dev holds a fs_type signature with the UUID fs_uuid.
+    """
+    if fs_uuid is None or not dev.exists():
+        return False
+    tags = blkid_tags(dev)
+    return tags.get("TYPE") == fs_type and tags.get("UUID") == fs_uuid
+
+
+class RunState:
+    """
+    The configure_drive steps completed on a device, and what they created
+    (names and UUIDs), so an interrupted run can be continued.
+    """
+
+    def __init__(
+        self,
+        identity: DeviceIdentity,
+        prefix: str,
+        completed: t.Optional[t.List[str]] = None,
+        facts: t.Optional[t.Dict[str, str]] = None,
+    ) -> None:
+        self.identity = identity
+        self.prefix = prefix
+        self.path = RUN_STATE_DIR / f"{identity.key()}.json"
+        self._completed = list(completed or [])
+        self._facts = dict(facts or {})
+        self._lock = threading.Lock()
+
+    @classmethod
+    def open(cls, root: Path, prefix: str, resume: bool) -> "RunState":
+        """
+        Start recording the run on the root partition, naming what it creates
+        after prefix.
+
+        If resume is set, continue the saved state for this device, keeping
+        its prefix; otherwise any saved state is discarded.
+        """
+        identity = device_identity(root)
+        if not identity.is_stable:
+            raise RunStateError(
+                f"{root} has no serial, WWN or partition UUID to key a run state by"
+            )
+        state = cls(identity, prefix)
+        if not resume:
+            state.save()
+            return state
+        if not state.path.exists():
+            raise RunStateError(f"No earlier run on {root} to continue")
+        data = json.loads(state.path.read_text())
+        if DeviceIdentity.from_json(data["identity"]) != identity:
+            raise RunStateError(f"{state.path} is for a different device")
+        return cls(identity, data["prefix"], data["completed"], data["facts"])
+
+    def is_done(self, step: str) -> bool:
+        with self._lock:
+            return step in self._completed
+
+    def fact(self, name: str) -> t.Optional[str]:
+        with self._lock:
+            return self._facts.get(name)
+
+    def check_fact(self, name: str, value: str) -> None:
+        """
+        Record a setting the run depends on, or check that it matches the one
+        recorded when the run was started.
+        """
+        with self._lock:
+            recorded = self._facts.setdefault(name, value)
+        if recorded != value:
+            raise RunStateError(
+                f"The earlier run used {name} {recorded}, not {value}; "
+                f"start again without --continue to change it"
+            )
+        self.save()
+
+    def record(self, step: str, facts: t.Optional[t.Dict[str, str]] = None) -> None:
+        with self._lock:
+            if step not in self._completed:
+                self._completed.append(step)
+            self._facts.update(facts or {})
+        self.save()
+
+    def save(self) -> None:
+        with self._lock:
+            data = {
+                "identity": dataclasses.asdict(self.identity),
+                "prefix": self.prefix,
+                "completed": self._completed,
+                "facts": self._facts,
+            }
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(".tmp")
+            tmp.write_text(json.dumps(data))
+            os.replace(tmp, self.path)
+
+    def remove(self) -> None:
+        self.path.unlink(missing_ok=True)
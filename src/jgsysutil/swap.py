@@ -0,0 +1,105 @@
+import dataclasses
+import enum
+import os
+import typing as t
+from pathlib import Path
+
+import click
+
+from jgsysutil.commands import zramctl
+from jgsysutil.process import run
+
+F = t.TypeVar("F", bound=t.Callable[..., t.Any])
+
+# The most a swapfile gets unless --swap-size says otherwise: unlike a volume,
+# a file is easily grown later, so there is no point reserving as much as
+# memory up front
+SWAPFILE_DEFAULT_SIZE = 8 * 1024**3
+
+
+class SwapMode(enum.Enum):
+    # A logical volume next to the root volume, inside LUKS
+    LV = "lv"
+    # Compressed swap in memory
+    ZRAM = "zram"
+    # A file on the root filesystem
+    SWAPFILE = "swapfile"
+    NONE = "none"
+
+
+@dataclasses.dataclass
+class SwapOptions:
+    mode: SwapMode = SwapMode.LV
+    zram_algorithm: str = "zstd"
+    # zram size as a fraction of memory; this is the uncompressed size, so
+    # the memory it takes up is this divided by the compression ratio
+    zram_fraction: float = 0.5
+
+
+def setup_zram(size: int, algorithm: str) -> Path:
+    """
+    Set up a free zram device of size bytes, returning its path.
+    """
+    return Path(
+        run(
+            [zramctl, "--find", "--size", str(size), "--algorithm", algorithm],
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout.strip()
+    )
+
+
+def create_swapfile(path: Path, size: int) -> None:
+    """
+    Create a swapfile of size bytes at path. Allocating it up front, rather
+    than writing it, gets the filesystem to pick a few large extents for it
+    without spending any time on writes.
+    """
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    try:
+        os.posix_fallocate(fd, 0, size)
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def swap_options(f: F) -> F:
+    """
+    Click options for choosing what kind of swap to set up.
+    """
+    options = [
+        click.option(
+            "--swap-mode",
+            type=click.Choice([mode.value for mode in SwapMode]),
+            default=SwapMode.LV.value,
+            show_default=True,
+            help="lv creates a swap volume inside LUKS, zram compressed swap in memory, swapfile a file on the root filesystem, none no swap",
+        ),
+        click.option(
+            "--zram-algorithm",
+            default="zstd",
+            show_default=True,
+            help="compression algorithm for --swap-mode zram",
+        ),
+        click.option(
+            "--zram-fraction",
+            type=click.FloatRange(min=0, min_open=True),
+            default=0.5,
+            show_default=True,
+            help="size of the zram device as a fraction of memory, unless --swap-size is set",
+        ),
+    ]
+    for option in reversed(options):
+        f = option(f)
+    return f
+
+
+def make_swap_options(
+    swap_mode: str, zram_algorithm: str, zram_fraction: float
+) -> SwapOptions:
+    return SwapOptions(
+        mode=SwapMode(swap_mode),
+        zram_algorithm=zram_algorithm,
+        zram_fraction=zram_fraction,
+    )
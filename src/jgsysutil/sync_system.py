@@ -0,0 +1,349 @@
+import dataclasses
+import errno
+import fcntl
+import os
+import shutil
+import stat
+import tempfile
+import threading
+import time
+import typing as t
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+
+import click
+
+from jgsysutil.commands import mount, umount
+from jgsysutil.process import run
+from jgsysutil.tracing import span, trace_option
+
+# From linux/fs.h: share the source file's extents with the destination
+FICLONE = 0x40049409
+COPY_CHUNK = 64 * 1024 * 1024
+# Without copy_file_range, each thread reads this much into memory at a time
+FALLBACK_CHUNK = 1024 * 1024
+# Errors meaning a faster way of copying is not available here, rather than
+# that the copy failed
+UNSUPPORTED = {errno.EXDEV, errno.EOPNOTSUPP, errno.ENOSYS, errno.EINVAL, errno.ENOTTY}
+
+
+@dataclasses.dataclass
+class SyncStats:
+    files: int = 0
+    directories: int = 0
+    symlinks: int = 0
+    hardlinks: int = 0
+    special: int = 0
+    # Apparent size of the files copied, holes included
+    bytes: int = 0
+    # Data actually copied, i.e. not holes or shared extents
+    bytes_copied: int = 0
+    reflinked: int = 0
+    seconds: float = 0.0
+
+    @property
+    def mb_per_second(self) -> float:
+        # Holes and cloned files take no time however big they are
+        return self.bytes_copied / max(self.seconds, 1e-9) / 1024 / 1024
+
+    def add(self, other: "SyncStats") -> None:
+        for field in dataclasses.fields(self):
+            if field.name != "seconds":
+                setattr(
+                    self,
+                    field.name,
+                    getattr(self, field.name) + getattr(other, field.name),
+                )
+
+
+@dataclasses.dataclass(frozen=True)
+class Entry:
+    # Relative to the root of the tree
+    path: Path
+    stat: os.stat_result
+
+
+def walk(root: Path, one_file_system: bool) -> t.Tuple[t.List[Entry], t.List[Entry]]:
+    """
+    The directories (parents first) and everything else under root.
+    """
+    device = os.lstat(root).st_dev
+    directories, others = [], []
+    pending = [Path(".")]
+    while pending:
+        directory = pending.pop()
+        with os.scandir(root / directory) as entries:
+            for dir_entry in entries:
+                entry = Entry(
+                    directory / dir_entry.name, dir_entry.stat(follow_symlinks=False)
+                )
+                if not stat.S_ISDIR(entry.stat.st_mode):
+                    others.append(entry)
+                    continue
+                directories.append(entry)
+                # Mount points are created, but not descended into
+                if not one_file_system or entry.stat.st_dev == device:
+                    pending.append(entry.path)
+    return directories, others
+
+
+def shard(entries: t.List[Entry]) -> t.List[t.List[Entry]]:
+    """
+    Split entries into jobs that can run in parallel: every name of a
+    hardlinked file has to be in the same job, so that it is copied once and
+    then linked.
+    """
+    jobs: t.List[t.List[Entry]] = []
+    inodes: t.Dict[t.Tuple[int, int], t.List[Entry]] = {}
+    for entry in entries:
+        if stat.S_ISDIR(entry.stat.st_mode) or entry.stat.st_nlink == 1:
+            jobs.append([entry])
+            continue
+        key = (entry.stat.st_dev, entry.stat.st_ino)
+        if key not in inodes:
+            inodes[key] = []
+            jobs.append(inodes[key])
+        inodes[key].append(entry)
+    # Biggest first, so that one large file does not end up last
+    jobs.sort(key=lambda job: job[0].stat.st_size, reverse=True)
+    return jobs
+
+
+def copy_xattrs(src: Path, dst: Path) -> None:
+    try:
+        names = os.listxattr(src, follow_symlinks=False)
+    except OSError as e:
+        if e.errno in UNSUPPORTED:
+            return
+        raise
+    for name in names:
+        try:
+            value = os.getxattr(src, name, follow_symlinks=False)
+            os.setxattr(dst, name, value, follow_symlinks=False)
+        except OSError as e:
+            # The target may not support the namespace, e.g. user.* on symlinks
+            if e.errno not in UNSUPPORTED and e.errno != errno.EPERM:
+                raise
+
+
+def copy_metadata(src: Path, dst: Path, st: os.stat_result) -> None:
+    os.chown(dst, st.st_uid, st.st_gid, follow_symlinks=False)
+    copy_xattrs(src, dst)
+    if not stat.S_ISLNK(st.st_mode):
+        # After chown, which clears the setuid and setgid bits
+        os.chmod(dst, stat.S_IMODE(st.st_mode))
+    os.utime(dst, ns=(st.st_atime_ns, st.st_mtime_ns), follow_symlinks=False)
+
+
+def copy_range(src_fd: int, dst_fd: int, offset: int, length: int) -> None:
+    end = offset + length
+    while offset < end:
+        count = min(COPY_CHUNK, end - offset)
+        try:
+            copied = os.copy_file_range(src_fd, dst_fd, count, offset, offset)
+        except OSError as e:
+            if e.errno not in UNSUPPORTED:
+                raise
+            count = min(FALLBACK_CHUNK, count)
+            copied = os.pwrite(dst_fd, os.pread(src_fd, count, offset), offset)
+        if copied == 0:
+            raise OSError(errno.EIO, f"Unexpected end of file at {offset}")
+        offset += copied
+
+
+def copy_file(src: Path, dst: Path, st: os.stat_result, reflink: bool) -> SyncStats:
+    """
+    Copy the contents of src to dst, cloning it if reflink is set and the
+    filesystem can, and otherwise copying only the parts that are not holes.
+    """
+    stats = SyncStats(files=1, bytes=st.st_size)
+    src_fd = os.open(src, os.O_RDONLY | os.O_NOFOLLOW)
+    try:
+        dst_fd = os.open(
+            dst, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_NOFOLLOW, 0o600
+        )
+        try:
+            if reflink:
+                try:
+                    fcntl.ioctl(dst_fd, FICLONE, src_fd)
+                    stats.reflinked = 1
+                    return stats
+                except OSError as e:
+                    if e.errno not in UNSUPPORTED:
+                        raise
+            # Truncating up leaves everything not copied below as a hole
+            os.ftruncate(dst_fd, st.st_size)
+            offset = 0
+            while offset < st.st_size:
+                try:
+                    data = os.lseek(src_fd, offset, os.SEEK_DATA)
+                except OSError as e:
+                    if e.errno == errno.ENXIO:
+                        # Only a hole is left
+                        break
+                    raise
+                hole = os.lseek(src_fd, data, os.SEEK_HOLE)
+                copy_range(src_fd, dst_fd, data, hole - data)
+                stats.bytes_copied += hole - data
+                offset = hole
+        finally:
+            os.close(dst_fd)
+    finally:
+        os.close(src_fd)
+    return stats
+
+
+def remove_existing(dst: Path) -> None:
+    """
+    Make way for something other than a directory at dst, including where
+    the source replaced a directory (and everything in it).
+    """
+    if os.path.isdir(dst) and not os.path.islink(dst):
+        shutil.rmtree(dst)
+    elif os.path.lexists(dst):
+        os.unlink(dst)
+
+
+def make_directory(dst: Path) -> None:
+    # A symlink to a directory would not do: the copy would follow it out of
+    # the target
+    if os.path.lexists(dst) and (os.path.islink(dst) or not os.path.isdir(dst)):
+        os.unlink(dst)
+    dst.mkdir(exist_ok=True)
+
+
+def copy_entry(src: Path, dst: Path, st: os.stat_result, reflink: bool) -> SyncStats:
+    mode = st.st_mode
+    if stat.S_ISREG(mode):
+        remove_existing(dst)
+        stats = copy_file(src, dst, st, reflink)
+    elif stat.S_ISLNK(mode):
+        remove_existing(dst)
+        os.symlink(os.readlink(src), dst)
+        stats = SyncStats(symlinks=1)
+    elif stat.S_ISCHR(mode) or stat.S_ISBLK(mode) or stat.S_ISFIFO(mode):
+        remove_existing(dst)
+        os.mknod(dst, mode, st.st_rdev)
+        stats = SyncStats(special=1)
+    else:
+        # Sockets belong to whatever was listening on them
+        return SyncStats()
+    copy_metadata(src, dst, st)
+    return stats
+
+
+def copy_job(
+    source: Path, target: Path, job: t.List[Entry], reflink: bool
+) -> SyncStats:
+    first, *links = job
+    stats = copy_entry(source / first.path, target / first.path, first.stat, reflink)
+    for entry in links:
+        remove_existing(target / entry.path)
+        os.link(target / first.path, target / entry.path)
+        stats.hardlinks += 1
+    return stats
+
+
+def sync_tree(
+    source: Path,
+    target: Path,
+    jobs: t.Optional[int] = None,
+    one_file_system: bool = True,
+) -> SyncStats:
+    """
+    Copy everything under source into target, keeping ownership, permissions,
+    timestamps, xattrs, hardlinks and holes. Files are copied by jobs threads
+    at once; nothing already in target is removed, unless source has
+    something of another type (e.g. a file for a directory) in its place.
+    """
+    start = time.monotonic()
+    with span("walk", path=str(source)):
+        directories, others = walk(source, one_file_system)
+    # Files are cloned when source and target are on the same filesystem
+    reflink = os.stat(source).st_dev == os.stat(target).st_dev
+    stats = SyncStats(directories=len(directories))
+    lock = threading.Lock()
+    for directory in directories:
+        make_directory(target / directory.path)
+
+    def run_job(job: t.List[Entry]) -> None:
+        job_stats = copy_job(source, target, job, reflink)
+        with lock:
+            stats.add(job_stats)
+
+    with span("copy", files=len(others)):
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            # list() to raise the first error, if any
+            list(pool.map(run_job, shard(others)))
+    # Children first, since creating files in a directory changes its mtime
+    for directory in reversed(directories):
+        copy_metadata(source / directory.path, target / directory.path, directory.stat)
+    copy_metadata(source, target, os.lstat(source))
+    stats.seconds = time.monotonic() - start
+    return stats
+
+
+@contextmanager
+def source_tree(source: Path) -> t.Iterator[Path]:
+    """
+    source itself if it is a directory, or a filesystem image mounted
+    read-only.
+    """
+    if source.is_dir():
+        yield source
+        return
+    with tempfile.TemporaryDirectory() as mount_point:
+        run([mount, "-o", "loop,ro", source, mount_point], check=True)
+        try:
+            yield Path(mount_point)
+        finally:
+            run([umount, mount_point], check=True)
+
+
+@click.command()
+@click.argument(
+    "source",
+    type=click.Path(exists=True, file_okay=True, dir_okay=True, resolve_path=True),
+)
+@click.option(
+    "--mount",
+    "target",
+    type=click.Path(exists=True, file_okay=False, dir_okay=True, resolve_path=True),
+    help="directory the new system is mounted in",
+    required=True,
+)
+@click.option(
+    "--jobs",
+    type=click.IntRange(min=1),
+    help="files to copy at once, defaults to a few more than the number of CPUs",
+)
+@click.option(
+    "--one-file-system/--cross-file-systems",
+    default=True,
+    help="skip the contents of other filesystems mounted under SOURCE",
+)
+@trace_option
+def sync_system(
+    source: str, target: str, jobs: t.Optional[int], one_file_system: bool
+) -> None:
+    """
+    Copies SOURCE (a directory or filesystem image) into the new system.
+
+    Ownership, permissions, timestamps, xattrs and hardlinks are kept, and
+    sparse files stay sparse. When SOURCE and --mount are on the same
+    filesystem, files are cloned rather than copied where it supports that.
+    Files already at the target are overwritten, but nothing is deleted
+    unless SOURCE replaces it, e.g. a directory with a file.
+    """
+    with source_tree(Path(source)) as tree:
+        stats = sync_tree(tree, Path(target), jobs, one_file_system)
+    click.echo(
+        f"Copied {stats.files} files, {stats.directories} directories, "
+        f"{stats.symlinks} symlinks and {stats.hardlinks} hardlinks"
+    )
+    click.echo(
+        f"{stats.bytes} bytes ({stats.bytes_copied} copied, "
+        f"{stats.reflinked} files cloned) in {stats.seconds:.1f}s "
+        f"({stats.mb_per_second:.1f} MB/s)"
+    )
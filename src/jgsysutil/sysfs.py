@@ -0,0 +1,68 @@
+import os
+import re
+import stat
+import typing as t
+from pathlib import Path
+
+
+def block_sysfs_dir(dev: Path) -> t.Optional[Path]:
+    """
+    The /sys/class/block directory of a block device (or partition) node, or
+    None if dev is not a block device (e.g. an image file).
+    """
+    st = os.stat(dev)
+    if not stat.S_ISBLK(st.st_mode):
+        return None
+    return Path(
+        f"/sys/dev/block/{os.major(st.st_rdev)}:{os.minor(st.st_rdev)}"
+    ).resolve()
+
+
+def queue_dir(dev: Path) -> t.Optional[Path]:
+    # Partitions share the request queue of the whole disk
+    sysfs = block_sysfs_dir(dev)
+    if sysfs is None:
+        return None
+    if (sysfs / "partition").exists():
+        sysfs = sysfs.parent
+    return sysfs / "queue"
+
+
+def read_attr(path: Path) -> str:
+    return path.read_text().strip()
+
+
+def read_int_attr(path: Path, default: int = 0) -> int:
+    try:
+        return int(read_attr(path))
+    except (OSError, ValueError):
+        return default
+
+
+def is_rotational(dev: Path) -> bool:
+    # Files are treated like spinning disks, which is the cautious choice
+    queue = queue_dir(dev)
+    if queue is None:
+        return True
+    return read_int_attr(queue / "rotational", default=1) != 0
+
+
+PCI_ADDRESS = re.compile(r"^[0-9a-f]{4}:[0-9a-f]{2}:[0-9a-f]{2}\.[0-9a-f]$")
+
+
+def controller(dev: Path) -> t.Optional[str]:
+    """
+    The PCI address of the controller (HBA, NVMe controller, ...) that dev is
+    attached to. Virtual devices (loop, device-mapper) are their own controller,
+    and anything else is grouped by its top level sysfs device. None if dev is
+    not a block device.
+    """
+    path = block_sysfs_dir(dev)
+    if path is None:
+        return None
+    addresses = [part for part in path.parts if PCI_ADDRESS.match(part)]
+    if addresses:
+        return addresses[-1]
+    if "virtual" in path.parts:
+        return str(path)
+    return str(Path(*path.parts[:4]))
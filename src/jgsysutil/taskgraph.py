@@ -0,0 +1,99 @@
+import contextvars
+import dataclasses
+import typing as t
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+
+from jgsysutil.process import ProcessGroup, set_process_group
+from jgsysutil.tracing import span
+
+
+@dataclasses.dataclass
+class Task:
+    name: str
+    run: t.Callable[[], None]
+    deps: t.Sequence[str] = ()
+
+
+def check_graph(tasks: t.Sequence[Task]) -> None:
+    names = [task.name for task in tasks]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Duplicate task names in {names}")
+    by_name = {task.name: task for task in tasks}
+    for task in tasks:
+        for dep in task.deps:
+            if dep not in by_name:
+                raise ValueError(f"{task.name} depends on unknown task {dep}")
+
+    visiting: t.Set[str] = set()
+    visited: t.Set[str] = set()
+
+    def visit(name: str) -> None:
+        if name in visited:
+            return
+        if name in visiting:
+            raise ValueError(f"Dependency cycle through {name}")
+        visiting.add(name)
+        for dep in by_name[name].deps:
+            visit(dep)
+        visiting.remove(name)
+        visited.add(name)
+
+    for name in names:
+        visit(name)
+
+
+def run_tasks(tasks: t.Sequence[Task], max_workers: t.Optional[int] = None) -> None:
+    """
+    Run tasks, each as soon as all of its dependencies have finished.
+
+    If a task fails, no more tasks are started, processes still running for other
+    tasks (via jgsysutil.process.run) are terminated, in-process work is told to
+    stop through jgsysutil.process.cancel_event, and once everything has
+    stopped the first failure is raised.
+    """
+    check_graph(tasks)
+    if max_workers is None:
+        max_workers = max(1, len(tasks))
+    group = ProcessGroup()
+    pending = list(tasks)
+    finished: t.Set[str] = set()
+    running: t.Dict["Future[None]", Task] = {}
+    failure: t.Optional[BaseException] = None
+
+    def traced(task: Task) -> None:
+        with span(task.name, "task", deps=list(task.deps)):
+            task.run()
+
+    def start(pool: ThreadPoolExecutor, task: Task) -> None:
+        context = contextvars.copy_context()
+        context.run(set_process_group, group)
+        running[pool.submit(context.run, traced, task)] = task
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        try:
+            while pending or running:
+                if failure is None:
+                    for task in [
+                        p for p in pending if all(d in finished for d in p.deps)
+                    ]:
+                        pending.remove(task)
+                        start(pool, task)
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    task = running.pop(future)
+                    error = future.exception()
+                    if error is None:
+                        finished.add(task.name)
+                    elif failure is None:
+                        failure = error
+                        group.terminate()
+        except BaseException:
+            # Most likely KeyboardInterrupt; the pool waits for running tasks
+            for future in running:
+                future.cancel()
+            group.terminate()
+            raise
+    if failure is not None:
+        raise failure
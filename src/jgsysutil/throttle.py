@@ -0,0 +1,287 @@
+import contextlib
+import dataclasses
+import enum
+import os
+import re
+import threading
+import time
+import typing as t
+from pathlib import Path
+
+from jgsysutil.commands import ionice
+from jgsysutil.process import run
+from jgsysutil.sysfs import block_sysfs_dir, controller
+
+SIZE = re.compile(
+    r"^(?P<number>\d+(\.\d+)?)(?:(?P<unit>[KMGT])(?:i?B)?|B?)$", re.IGNORECASE
+)
+UNITS = {"": 1, "k": 1024, "m": 1024**2, "g": 1024**3, "t": 1024**4}
+
+
+def parse_size(text: str) -> int:
+    """
+    A byte count with an optional binary K/M/G/T suffix, e.g. 200M or 8GiB.
+    """
+    match = SIZE.match(text.strip())
+    if match is None:
+        raise ValueError(f"Invalid size: {text}")
+    return int(float(match["number"]) * UNITS[(match["unit"] or "").lower()])
+
+
+class IoClass(enum.Enum):
+    REALTIME = "realtime"
+    BEST_EFFORT = "best-effort"
+    IDLE = "idle"
+
+
+@dataclasses.dataclass(frozen=True)
+class IoPriority:
+    io_class: IoClass
+    # 0 (highest) to 7 (lowest), within the realtime and best-effort classes
+    level: t.Optional[int] = None
+
+    @classmethod
+    def parse(cls, text: str) -> "IoPriority":
+        """
+        CLASS or CLASS:LEVEL, e.g. idle or best-effort:7.
+        """
+        name, _, level = text.partition(":")
+        try:
+            io_class = IoClass(name)
+        except ValueError:
+            choices = ", ".join(c.value for c in IoClass)
+            raise ValueError(f"Unknown I/O class {name}, expected one of {choices}")
+        if not level:
+            return cls(io_class)
+        if io_class is IoClass.IDLE:
+            raise ValueError("The idle I/O class has no levels")
+        if not level.isdigit() or not 0 <= int(level) <= 7:
+            raise ValueError(f"Invalid I/O priority level {level}, expected 0-7")
+        return cls(io_class, int(level))
+
+    def ionice_args(self) -> t.List[str]:
+        args = ["--class", self.io_class.value]
+        if self.level is not None:
+            args += ["--classdata", str(self.level)]
+        return args
+
+    def apply_to_current_thread(self) -> None:
+        """
+        I/O priorities are per thread, so each thread that writes has to set
+        its own.
+        """
+        run(
+            [ionice, *self.ionice_args(), "--pid", str(threading.get_native_id())],
+            check=True,
+        )
+
+
+class TokenBucket:
+    """
+    Limits the rate of writes to rate bytes per second, allowing bursts of up
+    to one second's worth. A rate of None is unlimited.
+    """
+
+    def __init__(self, rate: t.Optional[float]) -> None:
+        self._lock = threading.Lock()
+        self._rate = rate
+        self._tokens = 0.0
+        self._last = time.monotonic()
+        self._taken = 0
+
+    @property
+    def rate(self) -> t.Optional[float]:
+        return self._rate
+
+    def set_rate(self, rate: t.Optional[float]) -> None:
+        with self._lock:
+            self._refill(time.monotonic())
+            self._rate = rate
+
+    def take_count(self) -> int:
+        """
+        Bytes acquired since the last call.
+        """
+        with self._lock:
+            taken, self._taken = self._taken, 0
+            return taken
+
+    def _refill(self, now: float) -> None:
+        if self._rate is not None:
+            self._tokens = min(
+                self._tokens + (now - self._last) * self._rate, self._rate
+            )
+        self._last = now
+
+    def acquire(self, amount: int) -> None:
+        """
+        Wait until amount bytes may be written. Requests larger than the burst
+        size go into debt, so they are allowed but delay whatever comes next.
+        """
+        with self._lock:
+            self._taken += amount
+            self._refill(time.monotonic())
+            if self._rate is None:
+                return
+            self._tokens -= amount
+            wait = -self._tokens / self._rate if self._tokens < 0 else 0.0
+        if wait > 0:
+            time.sleep(wait)
+
+
+def disk_name(dev: Path) -> t.Optional[str]:
+    sysfs = block_sysfs_dir(dev)
+    if sysfs is None:
+        return None
+    if (sysfs / "partition").exists():
+        sysfs = sysfs.parent
+    return sysfs.name
+
+
+def sibling_disks(drive: Path) -> t.List[str]:
+    """
+    Names of the other disks behind the same controller as drive, or of all
+    other disks if it has none (as for virtual devices, whose I/O ends up on
+    some other disk).
+    """
+    own = disk_name(drive)
+    disks = []
+    for name in sorted(os.listdir("/sys/block")):
+        if name == own or name.startswith(("loop", "ram", "zram")):
+            continue
+        if not Path(f"/dev/{name}").exists():
+            continue
+        disks.append(name)
+    same_controller = [
+        d for d in disks if controller(Path(f"/dev/{d}")) == controller(drive)
+    ]
+    return same_controller or disks
+
+
+@dataclasses.dataclass(frozen=True)
+class DiskCounters:
+    ios: int
+    milliseconds: int
+
+
+def read_diskstats(names: t.Collection[str]) -> t.Dict[str, DiskCounters]:
+    stats = {}
+    for line in Path("/proc/diskstats").read_text().splitlines():
+        fields = line.split()
+        if len(fields) >= 11 and fields[2] in names:
+            # Reads and writes completed, and the milliseconds spent on them
+            stats[fields[2]] = DiskCounters(
+                ios=int(fields[3]) + int(fields[7]),
+                milliseconds=int(fields[6]) + int(fields[10]),
+            )
+    return stats
+
+
+class AdaptiveThrottle:
+    """
+    Backs a TokenBucket off while the average I/O latency of any of disks
+    rises well above its usual level, and speeds it back up once they recover.
+
+    The usual level of each disk is the lowest latency seen over the wipe, at
+    a floor of floor_ms so that idle disks do not look degraded by noise.
+    """
+
+    def __init__(
+        self,
+        bucket: TokenBucket,
+        disks: t.Sequence[str],
+        max_rate: t.Optional[float],
+        interval: float = 1.0,
+        slowdown: float = 2.0,
+        floor_ms: float = 2.0,
+        min_rate: float = 1024 * 1024,
+    ) -> None:
+        self.bucket = bucket
+        self.disks = list(disks)
+        self.max_rate = max_rate
+        self.interval = interval
+        self.slowdown = slowdown
+        self.floor_ms = floor_ms
+        self.min_rate = min_rate
+        self._usual: t.Dict[str, float] = {}
+        self._previous = read_diskstats(self.disks)
+
+    def latencies(self) -> t.Dict[str, float]:
+        current = read_diskstats(self.disks)
+        latencies = {}
+        for name, now in current.items():
+            before = self._previous.get(name)
+            if before is not None and now.ios > before.ios:
+                latencies[name] = (now.milliseconds - before.milliseconds) / (
+                    now.ios - before.ios
+                )
+        self._previous = current
+        return latencies
+
+    def degraded(self, latencies: t.Dict[str, float]) -> bool:
+        degraded = False
+        for name, latency in latencies.items():
+            usual = max(self._usual.get(name, latency), self.floor_ms)
+            if latency > usual * self.slowdown:
+                degraded = True
+            else:
+                self._usual[name] = min(self._usual.get(name, latency), latency)
+        return degraded
+
+    def step(self, wipe_rate: float) -> None:
+        """
+        Adjust the bucket given the wipe's rate over the last interval:
+        halve it when a disk is degraded, grow it by a quarter otherwise.
+        """
+        rate = self.bucket.rate
+        if self.degraded(self.latencies()):
+            current = wipe_rate if rate is None else min(rate, wipe_rate)
+            self.bucket.set_rate(max(current / 2, self.min_rate))
+        elif rate is not None:
+            rate *= 1.25
+            if self.max_rate is not None and rate >= self.max_rate:
+                self.bucket.set_rate(self.max_rate)
+            elif self.max_rate is None and rate >= wipe_rate * 2:
+                # Well above what the wipe manages anyway
+                self.bucket.set_rate(None)
+            else:
+                self.bucket.set_rate(rate)
+
+    @contextlib.contextmanager
+    def running(self) -> t.Iterator[None]:
+        stop = threading.Event()
+
+        def loop() -> None:
+            self.bucket.take_count()
+            last = time.monotonic()
+            while not stop.wait(self.interval):
+                now = time.monotonic()
+                self.step(self.bucket.take_count() / max(now - last, 1e-9))
+                last = now
+
+        thread = threading.Thread(target=loop, daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
+
+
+@contextlib.contextmanager
+def throttle(
+    drive: Path, max_rate: t.Optional[int], adaptive: bool
+) -> t.Iterator[t.Optional[TokenBucket]]:
+    """
+    The TokenBucket writes to drive should go through, if they are limited at
+    all, adapting it to sibling disks while the context is open if adaptive.
+    """
+    if max_rate is None and not adaptive:
+        yield None
+        return
+    bucket = TokenBucket(max_rate)
+    if not adaptive:
+        yield bucket
+        return
+    with AdaptiveThrottle(bucket, sibling_disks(drive), max_rate).running():
+        yield bucket
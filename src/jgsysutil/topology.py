@@ -0,0 +1,122 @@
+import dataclasses
+import functools
+import math
+import typing as t
+from pathlib import Path
+
+from jgsysutil.sysfs import block_sysfs_dir, queue_dir, read_attr, read_int_attr
+
+MIB = 1024 * 1024
+EXT4_BLOCK_SIZE = 4096
+# I/O sizes that would align to more than this are ignored, as nonsense from
+# the device: some USB and SSD bridges report 0xffff sectors as their optimal
+# I/O size, which whole MiBs would have to be tens of GiB to match
+MAX_ALIGNMENT = 256 * MIB
+
+
+@dataclasses.dataclass(frozen=True)
+class Topology:
+    """
+    I/O geometry of a block device, as the kernel reports it in sysfs.
+
+    minimum_io_size and optimal_io_size are the RAID chunk size and full stripe
+    width for RAID devices (md or hardware that reports them), or 0 / the block
+    size when the device has no preference.
+    """
+
+    logical_block_size: int
+    physical_block_size: int
+    minimum_io_size: int
+    optimal_io_size: int
+    alignment_offset: int
+
+    def io_sizes(self) -> t.Tuple[int, int]:
+        """
+        minimum_io_size and optimal_io_size, ignoring (like parted and libblkid
+        do) any that is not a multiple of the size below it or would make the
+        alignment implausibly large: an ignored size is replaced by the one
+        below it.
+        """
+        sizes = [self.physical_block_size]
+        for size in (self.minimum_io_size, self.optimal_io_size):
+            sane = size > 0 and size % sizes[-1] == 0
+            sane = sane and math.lcm(MIB, size) <= MAX_ALIGNMENT
+            sizes.append(size if sane else sizes[-1])
+        return sizes[1], sizes[2]
+
+    @property
+    def alignment(self) -> int:
+        """
+        Byte alignment for partitions, LUKS and LVM data areas: whole MiBs
+        (what partitioning tools use by default) that are also whole stripes.
+        """
+        return math.lcm(MIB, self.physical_block_size, *self.io_sizes())
+
+    @property
+    def is_striped(self) -> bool:
+        minimum_io, optimal_io = self.io_sizes()
+        return self.physical_block_size < minimum_io < optimal_io
+
+    def ext4_extended_options(self) -> t.List[str]:
+        """
+        mkfs.ext4 -E options matching the RAID geometry, in filesystem blocks.
+        """
+        if not self.is_striped:
+            return []
+        minimum_io, optimal_io = self.io_sizes()
+        stride = max(1, minimum_io // EXT4_BLOCK_SIZE)
+        stripe_width = max(stride, optimal_io // EXT4_BLOCK_SIZE)
+        return [f"stride={stride}", f"stripe_width={stripe_width}"]
+
+
+def common_alignment(topologies: t.Iterable[Topology]) -> int:
+    """
+    An alignment that suits every one of several devices, e.g. the PVs of one
+    VG: the lcm of theirs, or just the largest if that would be implausibly
+    large (all of them are whole MiBs either way).
+    """
+    alignments = [topology.alignment for topology in topologies]
+    alignment = math.lcm(*alignments)
+    return alignment if alignment <= MAX_ALIGNMENT else max(alignments)
+
+
+@functools.lru_cache(maxsize=None)
+def probe(dev: Path) -> Topology:
+    sysfs = block_sysfs_dir(dev)
+    if sysfs is None:
+        # An image file has no geometry of its own
+        return Topology(512, 512, 512, 512, 0)
+    queue = queue_dir(dev)
+    assert queue is not None
+    physical = read_int_attr(queue / "physical_block_size", default=512)
+    minimum_io = read_int_attr(queue / "minimum_io_size", default=physical)
+    optimal_io = read_int_attr(queue / "optimal_io_size")
+    md = queue.parent / "md"
+    if md.exists() and optimal_io == 0:
+        # Older kernels do not always stack md geometry into the queue limits
+        chunk = read_int_attr(md / "chunk_size")
+        data_disks = md_data_disks(
+            read_attr(md / "level"), read_int_attr(md / "raid_disks")
+        )
+        if chunk and data_disks:
+            minimum_io = chunk
+            optimal_io = chunk * data_disks
+    return Topology(
+        logical_block_size=read_int_attr(queue / "logical_block_size", default=512),
+        physical_block_size=physical,
+        minimum_io_size=max(minimum_io, physical),
+        optimal_io_size=max(optimal_io, minimum_io, physical),
+        alignment_offset=read_int_attr(sysfs / "alignment_offset"),
+    )
+
+
+def md_data_disks(level: str, raid_disks: int) -> t.Optional[int]:
+    if level == "raid0":
+        return raid_disks
+    elif level == "raid4" or level == "raid5":
+        return raid_disks - 1
+    elif level == "raid6":
+        return raid_disks - 2
+    elif level == "raid10":
+        return raid_disks // 2
+    return None
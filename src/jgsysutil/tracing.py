@@ -0,0 +1,134 @@
+import contextlib
+import json
+import os
+import threading
+import time
+import typing as t
+from pathlib import Path
+
+import click
+
+F = t.TypeVar("F", bound=t.Callable[..., t.Any])
+
+
+class Tracer:
+    """
+    Spans collected as Chrome trace events ("X" complete events, timed in
+    microseconds), which chrome://tracing and Perfetto can load.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._events: t.List[t.Dict[str, t.Any]] = []
+        self._threads: t.Dict[int, str] = {}
+        self._start = time.perf_counter()
+
+    def _now(self) -> float:
+        return (time.perf_counter() - self._start) * 1e6
+
+    @contextlib.contextmanager
+    def span(
+        self, name: str, category: str, args: t.Dict[str, t.Any]
+    ) -> t.Iterator[t.Dict[str, t.Any]]:
+        start = self._now()
+        try:
+            yield args
+        except BaseException as e:
+            args.setdefault("error", repr(e))
+            raise
+        finally:
+            end = self._now()
+            thread = threading.current_thread()
+            with self._lock:
+                self._threads[thread.ident or 0] = thread.name
+                self._events.append(
+                    {
+                        "name": name,
+                        "cat": category,
+                        "ph": "X",
+                        "ts": start,
+                        "dur": end - start,
+                        "pid": os.getpid(),
+                        "tid": thread.ident or 0,
+                        "args": args,
+                    }
+                )
+
+    def to_json(self) -> t.Dict[str, t.Any]:
+        with self._lock:
+            names = [
+                {
+                    "name": "thread_name",
+                    "ph": "M",
+                    "pid": os.getpid(),
+                    "tid": tid,
+                    "args": {"name": name},
+                }
+                for tid, name in self._threads.items()
+            ]
+            return {"traceEvents": names + self._events, "displayTimeUnit": "ms"}
+
+    def write(self, path: Path) -> None:
+        path.write_text(json.dumps(self.to_json(), indent=1, default=str))
+
+
+# Process-wide, since the traced steps run on worker threads that do not
+# inherit a context
+_tracer: t.Optional[Tracer] = None
+
+
+@contextlib.contextmanager
+def tracing(path: t.Optional[Path]) -> t.Iterator[t.Optional[Tracer]]:
+    """
+    Record spans while the context is open, and write them to path when it
+    closes, even if it closes with an error. Does nothing if path is None.
+    """
+    global _tracer
+    if path is None:
+        yield None
+        return
+    tracer = Tracer()
+    _tracer = tracer
+    try:
+        yield tracer
+    finally:
+        _tracer = None
+        tracer.write(path)
+
+
+@contextlib.contextmanager
+def span(
+    name: str, category: str = "step", **args: t.Any
+) -> t.Iterator[t.Dict[str, t.Any]]:
+    """
+    Time the body as a span of the active trace, if any.
+
+    Yields the span's args, so the body can add what it only learns as it
+    runs (an exit code, how many bytes it processed).
+    """
+    tracer = _tracer
+    if tracer is None:
+        yield args
+        return
+    with tracer.span(name, category, args) as span_args:
+        yield span_args
+
+
+def trace_option(f: F) -> F:
+    """
+    Click option that traces the command to a file.
+    """
+
+    def callback(
+        ctx: click.Context, param: click.Parameter, value: t.Optional[Path]
+    ) -> None:
+        if value is not None:
+            ctx.with_resource(tracing(value))
+
+    return click.option(
+        "--trace",
+        type=click.Path(dir_okay=False, writable=True, path_type=Path),
+        callback=callback,
+        expose_value=False,
+        help="write a Chrome trace-event JSON file with a span for each step and external command",
+    )(f)
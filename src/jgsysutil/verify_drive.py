@@ -0,0 +1,186 @@
+import dataclasses
+import math
+import os
+import time
+import typing as t
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import click
+import numpy as np
+
+from jgsysutil.native_wipe import device_size
+
+DEFAULT_REGION_SIZE = 64 * 1024 * 1024
+READ_SIZE = 8 * 1024 * 1024
+# A region fails if its byte histogram is this unlikely for uniform random data.
+# With 65536 regions (4 TiB) we expect about 0.07 false failures per drive.
+SIGNIFICANCE_Z = 4.753  # one sided, p = 1e-6
+# The longest run of zeros in 64 MiB of random bytes is almost always 3 or 4
+MAX_ZERO_RUN = 16
+
+
+@dataclasses.dataclass
+class RegionResult:
+    offset: int
+    length: int
+    histogram: np.ndarray
+    longest_zero_run: int
+
+    @property
+    def chi_squared(self) -> float:
+        expected = self.length / 256
+        return float(((self.histogram - expected) ** 2).sum() / expected)
+
+    def failures(self) -> t.List[str]:
+        reasons = []
+        # The chi-squared test needs an expected count of at least 5 per bin
+        if self.length >= 5 * 256 and self.chi_squared > chi_squared_limit(255):
+            reasons.append(f"chi-squared {self.chi_squared:.1f}")
+        if self.longest_zero_run >= MAX_ZERO_RUN:
+            reasons.append(f"{self.longest_zero_run} byte run of zeros")
+        return reasons
+
+
+def chi_squared_limit(dof: int) -> float:
+    # Wilson-Hilferty approximation of the chi-squared quantile
+    h = 2 / (9 * dof)
+    return dof * (1 - h + SIGNIFICANCE_Z * math.sqrt(h)) ** 3
+
+
+def zero_runs(block: np.ndarray, carry: int) -> t.Tuple[int, int]:
+    """
+    The longest run of zeros in block, counting carry zeros that ended the
+    previous block, and the run of zeros at the end of block.
+    """
+    # Random data has few zeros, so work with their positions rather than the
+    # (much larger) set of non-zero positions
+    zeros = np.flatnonzero(block == 0)
+    if len(zeros) == 0:
+        return carry, 0
+    breaks = np.flatnonzero(np.diff(zeros) != 1)
+    starts = np.concatenate(([zeros[0]], zeros[breaks + 1]))
+    ends = np.concatenate((zeros[breaks], [zeros[-1]])) + 1
+    lengths = ends - starts
+    if starts[0] == 0:
+        lengths[0] += carry
+    trailing = int(lengths[-1]) if ends[-1] == len(block) else 0
+    return max(carry, int(lengths.max())), trailing
+
+
+def check_region(drive: Path, offset: int, length: int) -> RegionResult:
+    histogram = np.zeros(256, dtype=np.int64)
+    raw = memoryview(bytearray(min(READ_SIZE, length)))
+    buf = np.frombuffer(raw, dtype=np.uint8)
+    longest = carry = 0
+    fd = os.open(drive, os.O_RDONLY)
+    try:
+        os.posix_fadvise(fd, offset, length, os.POSIX_FADV_SEQUENTIAL)
+        done = 0
+        while done < length:
+            n = os.preadv(fd, [raw[: length - done]], offset + done)
+            if n == 0:
+                raise EOFError(f"{drive} ended at {offset + done}")
+            block = buf[:n]
+            histogram += np.bincount(block, minlength=256)
+            run, carry = zero_runs(block, carry)
+            longest = max(longest, run)
+            done += n
+    finally:
+        os.close(fd)
+    return RegionResult(
+        offset=offset, length=length, histogram=histogram, longest_zero_run=longest
+    )
+
+
+def sample_regions(
+    size: int, region_size: int, fraction: float
+) -> t.List[t.Tuple[int, int]]:
+    """
+    (offset, length) of the regions to check, evenly spread over the device and
+    always including the first and last region.
+    """
+    count = math.ceil(size / region_size)
+    wanted = max(1, min(count, math.ceil(count * fraction)))
+    indices = sorted(set(np.linspace(0, count - 1, wanted).round().astype(int)))
+    return [
+        (i * region_size, min(region_size, size - i * region_size)) for i in indices
+    ]
+
+
+@dataclasses.dataclass
+class VerifyReport:
+    regions: t.List[RegionResult]
+    seconds: float
+
+    @property
+    def bytes_read(self) -> int:
+        return sum(r.length for r in self.regions)
+
+    @property
+    def failed(self) -> t.List[RegionResult]:
+        return [r for r in self.regions if r.failures()]
+
+
+def verify_drive_lib(
+    drive: Path,
+    region_size: int = DEFAULT_REGION_SIZE,
+    fraction: float = 1.0,
+    jobs: t.Optional[int] = None,
+) -> VerifyReport:
+    regions = sample_regions(device_size(drive), region_size, fraction)
+    start = time.monotonic()
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        results = list(
+            pool.map(
+                check_region,
+                [drive] * len(regions),
+                [offset for offset, _ in regions],
+                [length for _, length in regions],
+            )
+        )
+    return VerifyReport(regions=results, seconds=time.monotonic() - start)
+
+
+@click.command()
+@click.argument(
+    "drive",
+    type=click.Path(exists=True, file_okay=True, dir_okay=False, resolve_path=True),
+)
+@click.option(
+    "--fraction",
+    type=click.FloatRange(min=0, max=1, min_open=True),
+    default=1.0,
+    show_default=True,
+    help="fraction of the drive to sample",
+)
+@click.option(
+    "--region-size",
+    type=click.IntRange(min=READ_SIZE),
+    default=DEFAULT_REGION_SIZE,
+    show_default=True,
+    help="size in bytes of each independently tested region",
+)
+@click.option(
+    "--jobs",
+    type=click.IntRange(min=1),
+    help="worker processes, defaults to the number of CPUs",
+)
+def verify_drive(
+    drive: str, fraction: float, region_size: int, jobs: t.Optional[int]
+) -> None:
+    """
+    Checks that DRIVE looks uniformly random, for example after randomize-drive.
+    """
+    report = verify_drive_lib(Path(drive), region_size, fraction, jobs)
+    for region in report.failed:
+        click.echo(f"{region.offset}+{region.length}: {', '.join(region.failures())}")
+    click.echo(
+        f"Read {report.bytes_read} bytes in {report.seconds:.1f}s "
+        f"({report.bytes_read / max(report.seconds, 1e-9) / 1024 / 1024:.1f} MB/s)"
+    )
+    if report.failed:
+        raise click.ClickException(
+            f"{len(report.failed)} of {len(report.regions)} regions are not random"
+        )
+    click.secho("PASS", fg="green")
@@ -0,0 +1,123 @@
+import dataclasses
+import threading
+import time
+import typing as t
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import click
+
+from jgsysutil.native_wipe import WipeCancelled, WipeStats
+from jgsysutil.sysfs import controller
+
+# Wipes a drive, reporting progress to the callback and stopping once the event
+# is set
+WipeFn = t.Callable[[Path, t.Callable[[int, int], None], threading.Event], WipeStats]
+
+
+@dataclasses.dataclass
+class DriveResult:
+    drive: Path
+    stats: t.Optional[WipeStats] = None
+    error: t.Optional[BaseException] = None
+
+
+class PoolProgress:
+    """
+    Bytes wiped per drive, summed up for a periodic status line.
+    """
+
+    def __init__(self, drives: t.Sequence[Path]) -> None:
+        self._lock = threading.Lock()
+        self._written = {drive: 0 for drive in drives}
+        self._state = {drive: "queued" for drive in drives}
+        self._start = time.monotonic()
+
+    def on_written(self, drive: Path) -> t.Callable[[int, int], None]:
+        def record(offset: int, length: int) -> None:
+            with self._lock:
+                self._written[drive] += length
+
+        return record
+
+    def set_state(self, drive: Path, state: str) -> None:
+        with self._lock:
+            self._state[drive] = state
+
+    def status(self) -> str:
+        with self._lock:
+            written = sum(self._written.values())
+            states = list(self._state.values())
+        seconds = time.monotonic() - self._start
+        counts = ", ".join(
+            f"{states.count(state)} {state}"
+            for state in ("running", "queued", "done", "failed")
+            if state in states
+        )
+        return (
+            f"{counts}; {written / 1024**3:.1f} GiB wiped "
+            f"({written / max(seconds, 1e-9) / 1024 / 1024:.1f} MB/s)"
+        )
+
+
+def wipe_drives(
+    drives: t.Sequence[Path],
+    wipe: WipeFn,
+    jobs: t.Optional[int] = None,
+    jobs_per_controller: int = 1,
+    status_interval: float = 10.0,
+) -> t.List[DriveResult]:
+    """
+    Wipe drives concurrently, running at most jobs at once and at most
+    jobs_per_controller on drives behind the same controller, so one shared bus
+    is not saturated while others sit idle.
+
+    A failure on one drive does not stop the others; each drive's outcome is
+    in the returned results. An interrupt (Ctrl-C) stops them all: the running
+    wipes are cancelled and the queued ones never start.
+    """
+    limit = threading.BoundedSemaphore(jobs or len(drives))
+    # Image files are not behind any controller, so are limited only by jobs
+    controllers = {drive: controller(drive) or str(drive) for drive in drives}
+    controller_limits = {
+        name: threading.BoundedSemaphore(jobs_per_controller)
+        for name in set(controllers.values())
+    }
+    progress = PoolProgress(drives)
+    done = threading.Event()
+    stop = threading.Event()
+
+    def wipe_one(drive: Path) -> DriveResult:
+        result = DriveResult(drive)
+        with controller_limits[controllers[drive]], limit:
+            progress.set_state(drive, "running")
+            try:
+                if stop.is_set():
+                    raise WipeCancelled(f"Wiping {drive} was cancelled")
+                result.stats = wipe(drive, progress.on_written(drive), stop)
+            except Exception as e:
+                result.error = e
+        progress.set_state(drive, "failed" if result.error else "done")
+        return result
+
+    def report() -> None:
+        while not done.wait(status_interval):
+            click.echo(progress.status(), err=True)
+
+    reporter = threading.Thread(target=report, daemon=True)
+    reporter.start()
+    pool = ThreadPoolExecutor(max_workers=len(drives))
+    try:
+        results = list(pool.map(wipe_one, drives))
+    except BaseException:
+        # Still wait for the running wipes, which stop after their current
+        # chunk, so that their checkpoints are saved
+        stop.set()
+        pool.shutdown(cancel_futures=True)
+        raise
+    finally:
+        pool.shutdown()
+        done.set()
+        reporter.join()
+    click.echo(progress.status(), err=True)
+    return results
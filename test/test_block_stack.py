@@ -0,0 +1,90 @@
+import os
+from pathlib import Path
+
+from jgsysutil.block_stack import snapshot, split_lvm_name
+
+LUKS_UUID = "0f1e2d3c-4b5a-6978-8796-a5b4c3d2e1f0"
+
+
+def make_device(sys: Path, path: str, devno: str, sectors: int, **attrs: str) -> Path:
+    device = sys / "devices" / path
+    device.mkdir(parents=True)
+    (device / "dev").write_text(f"{devno}\n")
+    (device / "size").write_text(f"{sectors}\n")
+    for name, value in attrs.items():
+        (device / name).parent.mkdir(parents=True, exist_ok=True)
+        (device / name).write_text(f"{value}\n")
+    (sys / "class" / "block").mkdir(parents=True, exist_ok=True)
+    os.symlink(device, sys / "class" / "block" / device.name)
+    return device
+
+
+def link(holder: Path, slave: Path) -> None:
+    (holder / "slaves").mkdir(exist_ok=True)
+    (slave / "holders").mkdir(exist_ok=True)
+    (holder / "slaves" / slave.name).touch()
+    (slave / "holders" / holder.name).touch()
+
+
+def test_snapshot(tmp_path: Path) -> None:
+    sys = tmp_path / "sys"
+    make_device(sys, "sda", "8:0", 8192)
+    sda1 = make_device(sys, "sda/sda1", "8:1", 1024, partition="1")
+    sda2 = make_device(sys, "sda/sda2", "8:2", 7168, partition="2")
+    crypt = make_device(
+        sys,
+        "dm-0",
+        "253:0",
+        7000,
+        **{
+            "dm/name": "x",
+            "dm/uuid": f"CRYPT-LUKS2-{LUKS_UUID.replace('-', '')}-x",
+        },
+    )
+    root = make_device(
+        sys,
+        "dm-1",
+        "253:1",
+        7000,
+        **{"dm/name": "x--1_vg-x--1_root", "dm/uuid": "LVM-abc"},
+    )
+    link(crypt, sda2)
+    link(root, crypt)
+    proc = tmp_path / "proc"
+    (proc / "self").mkdir(parents=True)
+    (proc / "self" / "mountinfo").write_text(
+        "30 1 253:1 / /mnt/new\\040root rw - ext4 /dev/mapper/x--1_vg-x--1_root rw\n"
+        "31 30 8:1 / /mnt/new\\040root/boot rw - vfat /dev/sda1 rw\n"
+        "32 1 0:22 / /proc rw - proc proc rw\n"
+    )
+    (proc / "swaps").write_text("Filename Type Size Used Priority\n")
+
+    snap = snapshot(sys, proc)
+    assert [d.name for d in snap.of_type("part")] == ["sda1", "sda2"]
+    assert snap.get("sda2") is not None
+    assert snap.devices["sda"].children == ["sda1", "sda2"]
+    assert snap.devices["sda1"].parents == ["sda"]
+    assert snap.devices["sda1"].size == 1024 * 512
+    luks = snap.luks(LUKS_UUID)
+    assert luks is not None and luks.type == "crypt" and luks.parents == ["sda2"]
+    assert luks.path == Path("/dev/mapper/x")
+    (lv,) = snap.in_vg("x-1_vg")
+    assert lv.name == "dm-1" and lv.lv == "x-1_root"
+    assert snap.get("/dev/mapper/x--1_vg-x--1_root") is lv
+    assert snap.mounted_at("/mnt/new root") is lv
+    assert lv.fstype == "ext4"
+    assert snap.mounted_at("/mnt/new root/boot") is snap.devices[sda1.name]
+    assert snap.mounted_at("/proc") is None
+    assert {d.name for d in snap.descendants("sda")} == {
+        "sda1",
+        "sda2",
+        "dm-0",
+        "dm-1",
+    }
+    assert snap.to_json()["devices"][0]["name"] == "dm-0"
+
+
+def test_split_lvm_name() -> None:
+    assert split_lvm_name("vg-lv") == ("vg", "lv")
+    assert split_lvm_name("a--b_vg-a--b_swap") == ("a-b_vg", "a-b_swap")
+    assert split_lvm_name("novg") is None
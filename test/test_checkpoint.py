@@ -0,0 +1,14 @@
+from jgsysutil.checkpoint import merge_ranges, missing_ranges
+
+
+def test_merge_ranges() -> None:
+    assert merge_ranges([]) == []
+    assert merge_ranges([(10, 5), (0, 10)]) == [(0, 15)]
+    assert merge_ranges([(0, 10), (5, 2)]) == [(0, 10)]
+    assert merge_ranges([(0, 4), (8, 4)]) == [(0, 4), (8, 4)]
+
+
+def test_missing_ranges() -> None:
+    assert missing_ranges([], 100) == [(0, 100)]
+    assert missing_ranges([(0, 100)], 100) == []
+    assert missing_ranges([(10, 10), (50, 10)], 100) == [(0, 10), (20, 30), (60, 40)]
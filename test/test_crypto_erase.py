@@ -0,0 +1,96 @@
+import json
+import struct
+from pathlib import Path
+
+import pytest
+
+from jgsysutil import crypto_erase
+from jgsysutil.crypto_erase import (
+    LUKS2_SECONDARY_MAGIC,
+    LUKS_MAGIC,
+    CryptoEraseError,
+    header_remains,
+    overwrite,
+    read_luks_header,
+)
+
+UUID = "0f1e2d3c-4b5a-6978-8796-a5b4c3d2e1f0"
+HDR_SIZE = 16384
+KEYSLOTS_SIZE = 1024 * 1024
+DATA_OFFSET = 2 * 1024 * 1024
+
+
+def luks2_header(magic: bytes, label: bytes) -> bytes:
+    header = bytearray(4096)
+    header[:6] = magic
+    struct.pack_into(">HQQ", header, 6, 2, HDR_SIZE, 1)
+    struct.pack_into("48s", header, 24, label)
+    struct.pack_into("40s", header, 168, UUID.encode())
+    metadata = {
+        "keyslots": {"0": {}, "1": {}},
+        "segments": {"0": {"offset": str(DATA_OFFSET)}},
+        "config": {"json_size": "12288", "keyslots_size": str(KEYSLOTS_SIZE)},
+    }
+    json_area = json.dumps(metadata).encode().ljust(HDR_SIZE - 4096, b"\0")
+    return bytes(header) + json_area
+
+
+@pytest.fixture
+def container(tmp_path: Path) -> Path:
+    path = tmp_path / "container"
+    with open(path, "wb") as f:
+        f.write(luks2_header(LUKS_MAGIC, b"jgsysutil"))
+        f.write(luks2_header(LUKS2_SECONDARY_MAGIC, b"jgsysutil"))
+        f.truncate(4 * 1024 * 1024)
+    return path
+
+
+def test_read_luks2_header(container: Path) -> None:
+    header = read_luks_header(container)
+    assert header.version == 2
+    assert header.uuid == UUID
+    assert header.label == "jgsysutil"
+    assert header.size == 2 * HDR_SIZE + KEYSLOTS_SIZE
+    assert header.data_offset == DATA_OFFSET
+    assert header.keyslots == 2
+
+
+def test_read_luks1_header(tmp_path: Path) -> None:
+    header = bytearray(4096)
+    header[:6] = LUKS_MAGIC
+    struct.pack_into(">H", header, 6, 1)
+    # 4096 sectors of payload offset, 32 byte keys
+    struct.pack_into(">II", header, 104, 4096, 32)
+    struct.pack_into("40s", header, 168, UUID.encode())
+    for i in range(8):
+        active = 0x00AC71F3 if i == 0 else 0x0000DEAD
+        struct.pack_into(
+            ">II32xII", header, 208 + 48 * i, active, 1000, 8 + 512 * i, 4000
+        )
+    path = tmp_path / "luks1"
+    path.write_bytes(bytes(header))
+    luks1 = read_luks_header(path)
+    assert luks1.version == 1 and luks1.label is None
+    assert luks1.keyslots == 1
+    assert luks1.data_offset == 4096 * 512
+    # The last keyslot's 32 * 4000 bytes of material, rounded up to sectors
+    assert luks1.size == (8 + 512 * 7) * 512 + 250 * 512
+
+
+def test_not_luks(tmp_path: Path) -> None:
+    path = tmp_path / "plain"
+    path.write_bytes(bytes(4096))
+    with pytest.raises(CryptoEraseError):
+        read_luks_header(path)
+
+
+def test_overwrite(container: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(crypto_erase, "blkid_tags", lambda dev: {})
+    assert header_remains(container)
+    header = read_luks_header(container)
+    assert overwrite(container, header.data_offset) == DATA_OFFSET
+    assert not header_remains(container)
+    assert container.stat().st_size == 4 * 1024 * 1024
+    with open(container, "rb") as f:
+        f.seek(DATA_OFFSET)
+        assert f.read() == bytes(2 * 1024 * 1024)
@@ -0,0 +1,23 @@
+from jgsysutil.format_profile import FormatProfile, ext4_args
+from jgsysutil.topology import Topology
+
+PLAIN = Topology(512, 4096, 4096, 0, 0)
+RAID = Topology(512, 4096, 64 * 1024, 4 * 64 * 1024, 0)
+
+
+def test_default() -> None:
+    assert ext4_args(FormatProfile.DEFAULT, PLAIN, wiped=False) == []
+    assert ext4_args(FormatProfile.DEFAULT, PLAIN, wiped=True) == ["-E", "nodiscard"]
+
+
+def test_profiles() -> None:
+    assert ext4_args(FormatProfile.FAST_MKFS, PLAIN, wiped=False) == [
+        "-E",
+        "lazy_itable_init=1,lazy_journal_init=1",
+    ]
+    assert ext4_args(FormatProfile.LARGEFILE4, RAID, wiped=True) == [
+        "-T",
+        "largefile4",
+        "-E",
+        "stride=16,stripe_width=64,nodiscard,lazy_itable_init=0,lazy_journal_init=0",
+    ]
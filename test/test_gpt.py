@@ -0,0 +1,106 @@
+import struct
+import uuid
+import zlib
+from pathlib import Path
+
+import pytest
+
+from jgsysutil.gpt import (
+    EFI_SYSTEM,
+    HEADER,
+    LINUX_LUKS,
+    DiskTooSmallError,
+    Partition,
+    layout,
+    minimum_size,
+    write_partition_table,
+)
+
+MIB = 1024 * 1024
+
+
+def check_header(data: bytes, lba: int) -> tuple:
+    fields = list(HEADER.unpack(data[: HEADER.size]))
+    assert fields[0] == b"EFI PART"
+    assert fields[5] == lba
+    crc = fields[3]
+    fields[3] = 0
+    assert zlib.crc32(HEADER.pack(*fields)) == crc
+    return tuple(fields)
+
+
+def test_layout() -> None:
+    entries = layout(
+        [Partition(EFI_SYSTEM, "boot", 512 * MIB), Partition(LINUX_LUKS, "root")],
+        total_lbas=8 * 1024 * 1024,
+        lba_size=512,
+    )
+    assert [(e.first_lba, e.last_lba) for e in entries] == [
+        (2048, 1050623),
+        (1050624, 8388574),
+    ]
+    # 4Kn disk with 2 MiB stripes
+    entries = layout(
+        [Partition(EFI_SYSTEM, "boot", 3 * MIB), Partition(LINUX_LUKS, "root")],
+        total_lbas=1024 * 1024,
+        lba_size=4096,
+        alignment=2 * MIB,
+    )
+    assert [e.first_lba for e in entries] == [512, 1536]
+    assert entries[1].last_lba == 1024 * 1024 - 6
+
+
+def test_layout_errors() -> None:
+    with pytest.raises(ValueError):
+        layout([Partition(LINUX_LUKS, "a"), Partition(LINUX_LUKS, "b")], 100000, 512)
+    with pytest.raises(ValueError):
+        layout([Partition(LINUX_LUKS, "a", 100 * MIB)], 100000, 512)
+
+
+def test_minimum_size(tmp_path: Path) -> None:
+    partitions = [Partition(EFI_SYSTEM, "boot", 8 * MIB), Partition(LINUX_LUKS, "root")]
+    minimum = minimum_size(partitions, 512)
+    # The backup header and entries follow the 1 MiB root partition
+    assert minimum == 10 * MIB + 33 * 512
+    root = layout(partitions, minimum // 512, 512)[-1]
+    assert (root.last_lba - root.first_lba + 1) * 512 == MIB
+    disk = tmp_path / "disk.img"
+    with disk.open("wb") as f:
+        f.truncate(8 * MIB)
+    with pytest.raises(DiskTooSmallError, match="at least 11 MiB"):
+        write_partition_table(disk, partitions)
+
+
+def test_write(tmp_path: Path) -> None:
+    disk = tmp_path / "disk.img"
+    size = 64 * MIB
+    with disk.open("wb") as f:
+        f.truncate(size)
+    table = write_partition_table(
+        disk,
+        [Partition(EFI_SYSTEM, "boot", 8 * MIB), Partition(LINUX_LUKS, "root")],
+    )
+    data = disk.read_bytes()
+    last_lba = size // 512 - 1
+
+    assert data[510:512] == b"\x55\xaa"
+    assert data[450] == 0xEE
+
+    primary = check_header(data[512:1024], 1)
+    backup_start = last_lba * 512
+    backup = check_header(data[backup_start:], last_lba)
+    assert primary[6] == last_lba
+    assert backup[6] == 1
+    assert primary[9] == backup[9]
+
+    for header in (primary, backup):
+        start = header[10] * 512
+        end = start + 128 * 128
+        array = data[start:end]
+        assert zlib.crc32(array) == header[13]
+        type_guid, _, first, last, _, name = struct.unpack(
+            "<16s16sQQQ72s", array[128:256]
+        )
+        assert uuid.UUID(bytes_le=type_guid) == LINUX_LUKS
+        assert (first, last) == (table.entries[1].first_lba, table.entries[1].last_lba)
+        assert name.decode("utf-16-le").rstrip("\0") == "root"
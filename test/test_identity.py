@@ -0,0 +1,43 @@
+import typing as t
+from pathlib import Path
+
+import pytest
+
+from jgsysutil import identity
+from jgsysutil.identity import device_identity
+
+
+def fake_disk(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch, serial: str, partuuid: str
+) -> None:
+    sysfs = tmp_path / "sda" / "sda2"
+    sysfs.mkdir(parents=True, exist_ok=True)
+    (sysfs / "partition").write_text("2\n")
+    info: t.Dict[str, t.Dict[str, t.Any]] = {
+        "/dev/sda": {"serial": serial, "wwn": None},
+        "/dev/sda2": {"serial": None, "wwn": None, "partuuid": partuuid, "size": 1024},
+    }
+
+    def lsblk_info(drive: Path, columns: str) -> t.Dict[str, t.Any]:
+        return info[str(drive)]
+
+    monkeypatch.setattr(identity, "lsblk_info", lsblk_info)
+    monkeypatch.setattr(identity, "block_sysfs_dir", lambda dev: sysfs)
+
+
+def test_repartitioned(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    fake_disk(tmp_path, monkeypatch, "S1", "p1")
+    before = device_identity(Path("/dev/sda2"))
+    # Writing a new partition table gives the partition a new PARTUUID
+    fake_disk(tmp_path, monkeypatch, "S1", "p2")
+    after = device_identity(Path("/dev/sda2"))
+    assert before.serial == "S1" and before.partition == 2
+    assert before.key() == after.key()
+
+
+def test_partuuid_fallback(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    fake_disk(tmp_path, monkeypatch, "", "p1")
+    first = device_identity(Path("/dev/sda2"))
+    assert first.is_stable and first.partuuid == "p1"
+    fake_disk(tmp_path, monkeypatch, "", "p2")
+    assert device_identity(Path("/dev/sda2")).key() != first.key()
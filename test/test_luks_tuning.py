@@ -0,0 +1,49 @@
+import pytest
+
+from jgsysutil.luks_tuning import (
+    CipherBenchmark,
+    aligned_data_offset,
+    fastest_cipher,
+    parse_benchmark,
+)
+
+BENCHMARK_OUTPUT = """\
+# Tests are approximate using memory only (no storage IO).
+PBKDF2-sha1      2139951 iterations per second for 256-bit key
+argon2id      4 iterations, 1048576 memory, 4 parallel threads (CPUs) for 256-bit key (requested 2000 ms time)
+#     Algorithm |       Key |      Encryption |      Decryption
+        aes-cbc        128b      1260.5 MiB/s      4168.8 MiB/s
+    serpent-cbc        128b               N/A               N/A
+        aes-xts        256b      3690.1 MiB/s      3691.3 MiB/s
+    serpent-xts        256b       823.3 MiB/s       806.1 MiB/s
+        aes-xts        512b      3187.8 MiB/s      3202.9 MiB/s
+"""
+
+
+def test_parse_benchmark() -> None:
+    results = parse_benchmark(BENCHMARK_OUTPUT)
+    assert len(results) == 4
+    assert results[0] == CipherBenchmark("aes-cbc", 128, 1260.5, 4168.8)
+    assert results[1].algorithm == "aes-xts"
+    assert results[1].key_size == 256
+
+
+def test_fastest_cipher() -> None:
+    results = parse_benchmark(BENCHMARK_OUTPUT)
+    # aes-xts 256b is AES-128, weaker than the default however fast it is
+    assert fastest_cipher(results) == CipherBenchmark("aes-xts", 512, 3187.8, 3202.9)
+    faster = [
+        CipherBenchmark("serpent-xts", 512, 900, 880),
+        CipherBenchmark("aes-xts", 256, 4000, 4000),
+    ]
+    assert fastest_cipher(faster).algorithm == "serpent-xts"
+    with pytest.raises(ValueError):
+        fastest_cipher([CipherBenchmark("aes-xts", 256, 3690.1, 3691.3)])
+
+
+def test_aligned_data_offset() -> None:
+    mib = 1024 * 1024
+    assert aligned_data_offset(mib) is None
+    assert aligned_data_offset(2 * mib) is None
+    # 3 MiB stripes: the default 16 MiB would start the data mid stripe
+    assert aligned_data_offset(3 * mib) == 18 * mib
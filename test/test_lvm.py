@@ -0,0 +1,59 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from jgsysutil.lvm import LogicalVolume, LvmBatch, parse_fullreport
+
+FULLREPORT = {
+    "report": [
+        {
+            "vg": [
+                {
+                    "vg_name": "x_vg",
+                    "vg_uuid": "vg-uuid",
+                    "vg_size": "3758096384",
+                    "vg_free": "0",
+                }
+            ],
+            "pv": [{"pv_name": "/dev/mapper/x"}],
+            "lv": [
+                {
+                    "lv_name": "x_root",
+                    "lv_uuid": "root-uuid",
+                    "lv_path": "/dev/x_vg/x_root",
+                    "lv_size": "1610612736",
+                },
+                {
+                    "lv_name": "x_swap",
+                    "lv_uuid": "swap-uuid",
+                    "lv_path": "/dev/x_vg/x_swap",
+                    "lv_size": "2147483648",
+                },
+            ],
+            "pvseg": [],
+            "seg": [],
+        },
+        {"vg": [], "pv": [{"pv_name": "/dev/mapper/orphan"}], "lv": []},
+    ]
+}
+
+
+def test_parse_fullreport() -> None:
+    vgs = parse_fullreport(json.dumps(FULLREPORT))
+    assert list(vgs) == ["x_vg"]
+    vg = vgs["x_vg"]
+    assert vg.size == 3758096384
+    assert vg.pvs == [Path("/dev/mapper/x")]
+    assert vg.lvs["x_root"] == LogicalVolume(
+        "x_root", "root-uuid", Path("/dev/x_vg/x_root"), 1610612736
+    )
+    assert set(vg.lvs) == {"x_root", "x_swap"}
+
+
+def test_batch() -> None:
+    batch = LvmBatch([Path("/dev/mapper/x")])
+    batch.add("vgcreate", "x_vg", Path("/dev/mapper/x"))
+    assert batch.commands == ["vgcreate --devices /dev/mapper/x x_vg /dev/mapper/x"]
+    with pytest.raises(ValueError):
+        batch.add("lvcreate", "-n", "two words")
@@ -0,0 +1,60 @@
+import subprocess
+import sys
+
+from click.testing import CliRunner
+
+from jgsysutil.main import COMMANDS, main
+
+# Slow to import, and only needed once a command runs
+HEAVY_MODULES = ["numpy", "toml", "json", "subprocess", "concurrent.futures"]
+
+
+def test_short_help() -> None:
+    for name, lazy in COMMANDS.items():
+        command = lazy.load()
+        assert command.name == name
+        assert command.get_short_help_str(limit=200).startswith(
+            lazy.short_help.rstrip(".")
+        )
+
+
+def test_help_lists_commands() -> None:
+    result = CliRunner().invoke(main, ["--help"])
+    assert result.exit_code == 0
+    for name in COMMANDS:
+        assert name in result.output
+
+
+def test_help_imports_no_commands() -> None:
+    code = (
+        "import sys\n"
+        "from jgsysutil.main import main\n"
+        "try:\n"
+        "    main(['--help'])\n"
+        "except SystemExit:\n"
+        "    pass\n"
+        "print(' '.join(sys.modules))\n"
+    )
+    modules = (
+        subprocess.run(
+            [sys.executable, "-c", code], check=True, capture_output=True, text=True
+        )
+        .stdout.splitlines()[-1]
+        .split()
+    )
+    for lazy in COMMANDS.values():
+        assert lazy.target.split(":")[0] not in modules
+    assert "numpy" not in modules
+
+
+def test_import_is_light() -> None:
+    # How long startup takes is tracked by the benchmark suite (bench_startup)
+    code = "import sys\nimport jgsysutil.main\nprint(' '.join(sys.modules))\n"
+    modules = subprocess.run(
+        [sys.executable, "-c", code], check=True, capture_output=True, text=True
+    ).stdout.split()
+    assert "jgsysutil.main" in modules
+    for lazy in COMMANDS.values():
+        assert lazy.target.split(":")[0] not in modules
+    for module in HEAVY_MODULES:
+        assert module not in modules
@@ -0,0 +1,14 @@
+from pathlib import Path
+
+from jgsysutil.native_wipe import native_wipe
+
+
+def test_partial_block_tail(tmp_path: Path) -> None:
+    image = tmp_path / "image"
+    size = 1024 * 1024 + 100
+    image.write_bytes(bytes(size))
+    stats = native_wipe(image, threads=2, chunk_size=64 * 1024)
+    assert stats.bytes_written == size
+    data = image.read_bytes()
+    assert len(data) == size
+    assert data[-100:] != bytes(100)
@@ -0,0 +1,52 @@
+from pathlib import Path
+
+import pytest
+
+from jgsysutil.prepare_batch import ManifestError, parse_manifest
+from jgsysutil.prepare_drive import PartitionScheme
+
+MANIFEST = """
+[[drive]]
+drive = "/dev/sda"
+mount = "/mnt/a"
+randomize = true
+swap_size = "8G"
+
+[[drive]]
+boot = "/dev/sdb1"
+root = "/dev/sdb2"
+mount = "/mnt/b"
+"""
+
+
+def test_parse_manifest() -> None:
+    a, b = parse_manifest(MANIFEST)
+    assert a.drive == Path("/dev/sda")
+    assert a.mount == Path("/mnt/a")
+    assert a.randomize
+    assert a.swap_size == 8 * 1024**3
+    assert b.partitions == PartitionScheme(
+        boot=Path("/dev/sdb1"), root=Path("/dev/sdb2")
+    )
+    assert not b.randomize
+    assert b.swap_size is None
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "",
+        '[[drive]]\ndrive = "/dev/sda"\n',
+        '[[drive]]\nboot = "/dev/sda1"\nmount = "/mnt"\n',
+        '[[drive]]\ndrive = "/dev/sda"\nroot = "/dev/sda2"\nmount = "/mnt"\n',
+        '[[drive]]\ndrive = "/dev/sda"\nmount = "/mnt"\nswap = "1G"\n',
+        '[[drive]]\ndrive = "/dev/sda"\nmount = "/mnt"\nswap_size = "lots"\n',
+        '[[drive]]\ndrive = "/dev/sda"\nmount = "/a"\n'
+        '[[drive]]\ndrive = "/dev/sda"\nmount = "/b"\n',
+        '[[drive]]\ndrive = "/dev/sda"\nmount = "/mnt"\n'
+        '[[drive]]\ndrive = "/dev/sdb"\nmount = "/mnt"\n',
+    ],
+)
+def test_invalid_manifest(text: str) -> None:
+    with pytest.raises(ManifestError):
+        parse_manifest(text)
@@ -0,0 +1,44 @@
+import typing as t
+from pathlib import Path
+
+import pytest
+from click.testing import CliRunner
+
+from jgsysutil.prepare_drive import prepare_drive
+
+MIB = 1024 * 1024
+
+
+@pytest.mark.parametrize(
+    "args",
+    [
+        ["--resume"],
+        # Not open
+        ["--progress-fd", "9999"],
+        # The default engine is shred
+        ["--max-bandwidth", "100M"],
+        ["--adaptive"],
+        ["--threads", "4"],
+        ["--engine", "native", "--io-priority", "bogus"],
+    ],
+)
+def test_usage_error_leaves_drive(tmp_path: Path, args: t.List[str]) -> None:
+    image = tmp_path / "drive.img"
+    with open(image, "wb") as f:
+        f.truncate(1024 * MIB)
+    result = CliRunner().invoke(
+        prepare_drive,
+        [
+            "--drive",
+            str(image),
+            "--mount",
+            str(tmp_path),
+            "--password",
+            "x",
+            "--yes",
+            *args,
+        ],
+    )
+    assert result.exit_code == 2, result.output
+    with open(image, "rb") as f:
+        assert f.read(MIB) == bytes(MIB)
@@ -0,0 +1,56 @@
+import json
+import os
+import typing as t
+
+import pytest
+
+from jgsysutil.progress import ProgressMeter, ProgressReport, ProgressSink, json_lines
+
+
+def test_meter() -> None:
+    reports: t.List[ProgressReport] = []
+    meter = ProgressMeter("/dev/x", 100, ProgressSink(reports.append, interval=0))
+    meter.on_written(0, 10)
+    meter.on_written(10, 30)
+    meter.finish()
+    assert [r.bytes_done for r in reports] == [10, 40, 40]
+    assert [r.done for r in reports] == [False, False, True]
+    assert all(r.total_bytes == 100 for r in reports)
+    last = reports[-1]
+    assert last.average_rate > 0
+    assert last.eta is not None and last.eta > 0
+
+
+def test_meter_interval() -> None:
+    reports: t.List[ProgressReport] = []
+    meter = ProgressMeter("/dev/x", 100, ProgressSink(reports.append, interval=3600))
+    for offset in range(0, 100, 10):
+        meter.on_written(offset, 10)
+    assert reports == []
+    meter.finish()
+    assert len(reports) == 1
+    assert reports[0].bytes_done == 100
+    assert reports[0].eta == 0
+
+
+def test_resumed_meter() -> None:
+    reports: t.List[ProgressReport] = []
+    meter = ProgressMeter("/dev/x", 100, ProgressSink(reports.append), bytes_done=60)
+    meter.on_written(60, 40)
+    meter.finish()
+    assert reports[-1].bytes_done == 100
+    # Only what was written in this run counts towards the rate
+    assert reports[-1].average_rate * reports[-1].seconds == pytest.approx(40)
+
+
+def test_json_lines() -> None:
+    read, write = os.pipe()
+    meter = ProgressMeter("/dev/x", 100, ProgressSink(json_lines(write)))
+    meter.on_written(0, 100)
+    meter.finish()
+    os.close(write)
+    with os.fdopen(read) as f:
+        lines = [json.loads(line) for line in f]
+    assert lines[-1]["drive"] == "/dev/x"
+    assert lines[-1]["bytes_done"] == 100
+    assert lines[-1]["done"]
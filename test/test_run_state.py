@@ -0,0 +1,46 @@
+from pathlib import Path
+
+import pytest
+
+from jgsysutil import run_state
+from jgsysutil.identity import DeviceIdentity
+from jgsysutil.run_state import RunState, RunStateError
+
+DRIVE = DeviceIdentity(
+    serial="S1", wwn=None, partition=2, partuuid=None, backing_file=None, size=1024
+)
+
+
+@pytest.fixture(autouse=True)
+def state_dir(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(run_state, "RUN_STATE_DIR", tmp_path)
+    monkeypatch.setattr(run_state, "device_identity", lambda dev: DRIVE)
+
+
+def test_continue() -> None:
+    state = RunState.open(Path("/dev/sda2"), "first", resume=False)
+    state.record("luks-format", {"luks_uuid": "u1"})
+    resumed = RunState.open(Path("/dev/sda2"), "second", resume=True)
+    assert resumed.prefix == "first"
+    assert resumed.is_done("luks-format")
+    assert not resumed.is_done("pvcreate")
+    assert resumed.fact("luks_uuid") == "u1"
+
+
+def test_restart_discards_state() -> None:
+    RunState.open(Path("/dev/sda2"), "first", resume=False).record("randomize")
+    state = RunState.open(Path("/dev/sda2"), "second", resume=False)
+    assert not state.is_done("randomize")
+    state.remove()
+    with pytest.raises(RunStateError):
+        RunState.open(Path("/dev/sda2"), "third", resume=True)
+
+
+def test_check_fact() -> None:
+    RunState.open(Path("/dev/sda2"), "first", resume=False).check_fact(
+        "swap_mode", "lv"
+    )
+    state = RunState.open(Path("/dev/sda2"), "second", resume=True)
+    state.check_fact("swap_mode", "lv")
+    with pytest.raises(RunStateError):
+        state.check_fact("swap_mode", "zram")
@@ -0,0 +1,19 @@
+import os
+import stat
+from pathlib import Path
+
+import pytest
+
+from jgsysutil.swap import create_swapfile
+
+
+def test_create_swapfile(tmp_path: Path) -> None:
+    path = tmp_path / "swapfile"
+    create_swapfile(path, 16 * 1024 * 1024)
+    st = os.stat(path)
+    assert st.st_size == 16 * 1024 * 1024
+    # Allocated, not sparse
+    assert st.st_blocks * 512 >= st.st_size
+    assert stat.S_IMODE(st.st_mode) == 0o600
+    with pytest.raises(FileExistsError):
+        create_swapfile(path, 16 * 1024 * 1024)
@@ -0,0 +1,85 @@
+import errno
+import os
+from pathlib import Path
+
+import pytest
+
+from jgsysutil.sync_system import sync_tree
+
+MIB = 1024 * 1024
+
+
+def test_sync_tree(tmp_path: Path) -> None:
+    source = tmp_path / "source"
+    target = tmp_path / "target"
+    (source / "etc" / "empty").mkdir(parents=True)
+    target.mkdir()
+    (source / "etc" / "hosts").write_text("127.0.0.1 localhost\n")
+    os.chmod(source / "etc" / "hosts", 0o640)
+    os.utime(source / "etc", ns=(0, 1_000_000_000))
+    os.link(source / "etc" / "hosts", source / "hosts")
+    os.symlink("etc/hosts", source / "link")
+    with open(source / "sparse", "wb") as f:
+        f.truncate(64 * MIB)
+        f.seek(32 * MIB)
+        f.write(b"data")
+
+    stats = sync_tree(source, target, jobs=4)
+
+    assert (target / "etc" / "hosts").read_text() == "127.0.0.1 localhost\n"
+    assert (target / "etc" / "hosts").stat().st_mode & 0o777 == 0o640
+    assert (target / "etc" / "hosts").stat().st_ino == (target / "hosts").stat().st_ino
+    assert (target / "etc").stat().st_mtime_ns == 1_000_000_000
+    assert (target / "etc" / "empty").is_dir()
+    assert os.readlink(target / "link") == "etc/hosts"
+    sparse = target / "sparse"
+    assert sparse.stat().st_size == 64 * MIB
+    with open(sparse, "rb") as f:
+        f.seek(32 * MIB)
+        assert f.read(4) == b"data"
+    if stats.reflinked == 0:
+        assert sparse.stat().st_blocks * 512 < MIB
+    assert stats.files == 2
+    assert stats.hardlinks == 1
+    assert stats.symlinks == 1
+    assert stats.directories == 2
+
+
+def test_xattrs(tmp_path: Path) -> None:
+    source = tmp_path / "source"
+    target = tmp_path / "target"
+    source.mkdir()
+    target.mkdir()
+    (source / "file").write_text("x")
+    try:
+        os.setxattr(source / "file", "user.test", b"value")
+    except OSError as e:
+        if e.errno in (errno.ENOTSUP, errno.EPERM):
+            pytest.skip("user xattrs are not supported here")
+        raise
+    sync_tree(source, target)
+    assert os.getxattr(target / "file", "user.test") == b"value"
+
+
+def test_replaced_types(tmp_path: Path) -> None:
+    source = tmp_path / "source"
+    target = tmp_path / "target"
+    outside = tmp_path / "outside"
+    for directory in (source / "was_file", target / "was_dir" / "sub", outside):
+        directory.mkdir(parents=True)
+    (source / "was_file" / "inside").write_text("new")
+    (source / "was_dir").write_text("new")
+    (source / "was_link").mkdir()
+    (source / "was_link" / "inside").write_text("new")
+    (target / "was_file").write_text("old")
+    (target / "was_dir" / "sub" / "old").write_text("old")
+    os.symlink(outside, target / "was_link")
+
+    stats = sync_tree(source, target)
+
+    assert (target / "was_file" / "inside").read_text() == "new"
+    assert (target / "was_dir").read_text() == "new"
+    assert not (target / "was_link").is_symlink()
+    assert (target / "was_link" / "inside").read_text() == "new"
+    assert list(outside.iterdir()) == []
+    assert stats.files == 3
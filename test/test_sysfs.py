@@ -0,0 +1,14 @@
+from pathlib import Path
+
+from jgsysutil.discard import DiscardKind, supports
+from jgsysutil.sysfs import controller, is_rotational
+from jgsysutil.topology import probe
+
+
+def test_image_file(tmp_path: Path) -> None:
+    image = tmp_path / "disk.img"
+    image.write_bytes(b"\0" * 4096)
+    assert controller(image) is None
+    assert is_rotational(image)
+    assert not supports(image, DiscardKind.DISCARD)
+    assert probe(image).alignment == 1024 * 1024
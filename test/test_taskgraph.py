@@ -0,0 +1,99 @@
+import threading
+import time
+import typing as t
+from pathlib import Path
+
+import pytest
+
+from jgsysutil.native_wipe import WipeCancelled, native_wipe
+from jgsysutil.process import cancel_event, run
+from jgsysutil.taskgraph import Task, run_tasks
+from jgsysutil.throttle import TokenBucket
+
+
+def test_order() -> None:
+    order: t.List[str] = []
+
+    def record(name: str) -> t.Callable[[], None]:
+        return lambda: order.append(name)
+
+    run_tasks(
+        [
+            Task("c", record("c"), deps=["a", "b"]),
+            Task("b", record("b"), deps=["a"]),
+            Task("a", record("a")),
+        ]
+    )
+    assert order == ["a", "b", "c"]
+
+
+def test_parallel() -> None:
+    # Both tasks have to be running at once to get past the barrier
+    barrier = threading.Barrier(2, timeout=5)
+
+    def wait() -> None:
+        barrier.wait()
+
+    run_tasks([Task("a", wait), Task("b", wait)])
+
+
+def test_failure_cancels() -> None:
+    ran: t.List[str] = []
+
+    def fail() -> None:
+        time.sleep(0.1)
+        raise RuntimeError("failed")
+
+    def slow() -> None:
+        run(["sleep", "30"])
+
+    start = time.monotonic()
+    with pytest.raises(RuntimeError, match="failed"):
+        run_tasks(
+            [
+                Task("fail", fail),
+                Task("slow", slow),
+                Task("after", lambda: ran.append("after"), deps=["fail"]),
+            ]
+        )
+    assert ran == []
+    assert time.monotonic() - start < 10
+
+
+def test_failure_cancels_native_wipe(tmp_path: Path) -> None:
+    drive = tmp_path / "drive"
+    drive.write_bytes(b"\0" * (64 * 1024 * 1024))
+    errors: t.List[BaseException] = []
+
+    def fail() -> None:
+        time.sleep(0.1)
+        raise RuntimeError("failed")
+
+    def wipe() -> None:
+        # Over a minute at this rate, unless it is cancelled
+        try:
+            native_wipe(
+                drive,
+                threads=1,
+                chunk_size=1024 * 1024,
+                throttle=TokenBucket(1024 * 1024),
+                cancel=cancel_event(),
+            )
+        except WipeCancelled as e:
+            errors.append(e)
+            raise
+
+    start = time.monotonic()
+    with pytest.raises(RuntimeError, match="failed"):
+        run_tasks([Task("fail", fail), Task("wipe", wipe)])
+    assert len(errors) == 1
+    assert time.monotonic() - start < 10
+
+
+def test_invalid() -> None:
+    with pytest.raises(ValueError):
+        run_tasks([Task("a", lambda: None, deps=["b"])])
+    with pytest.raises(ValueError):
+        run_tasks(
+            [Task("a", lambda: None, deps=["b"]), Task("b", lambda: None, deps=["a"])]
+        )
@@ -0,0 +1,96 @@
+import time
+import typing as t
+
+import pytest
+
+from jgsysutil.throttle import (
+    AdaptiveThrottle,
+    IoClass,
+    IoPriority,
+    TokenBucket,
+    parse_size,
+)
+
+
+def test_parse_size() -> None:
+    assert parse_size("512") == 512
+    assert parse_size("200M") == 200 * 1024 * 1024
+    assert parse_size("1.5g") == 3 * 1024**3 // 2
+    assert parse_size("8GiB") == parse_size("8gb") == 8 * 1024**3
+    with pytest.raises(ValueError):
+        parse_size("fast")
+
+
+def test_io_priority() -> None:
+    assert IoPriority.parse("idle") == IoPriority(IoClass.IDLE)
+    assert IoPriority.parse("best-effort:7").ionice_args() == [
+        "--class",
+        "best-effort",
+        "--classdata",
+        "7",
+    ]
+    for text in ["idle:3", "best-effort:8", "slow"]:
+        with pytest.raises(ValueError):
+            IoPriority.parse(text)
+
+
+def test_token_bucket() -> None:
+    bucket = TokenBucket(1000)
+    start = time.monotonic()
+    for _ in range(3):
+        bucket.acquire(100)
+    assert time.monotonic() - start == pytest.approx(0.3, abs=0.1)
+    assert bucket.take_count() == 300
+    assert bucket.take_count() == 0
+
+
+def test_unlimited_bucket() -> None:
+    bucket = TokenBucket(None)
+    start = time.monotonic()
+    bucket.acquire(1 << 40)
+    assert time.monotonic() - start < 0.1
+
+
+class FakeThrottle(AdaptiveThrottle):
+    def __init__(self, bucket: TokenBucket, max_rate: t.Optional[float]) -> None:
+        super().__init__(bucket, [], max_rate, floor_ms=1.0, min_rate=10)
+        self.next: t.Dict[str, float] = {}
+
+    def latencies(self) -> t.Dict[str, float]:
+        return self.next
+
+
+def test_adaptive() -> None:
+    bucket = TokenBucket(None)
+    throttle = FakeThrottle(bucket, None)
+    throttle.next = {"sda": 1.0}
+    throttle.step(1000)
+    assert bucket.rate is None
+    # Latency quadruples: back off to half of what the wipe was doing
+    throttle.next = {"sda": 4.0}
+    throttle.step(1000)
+    assert bucket.rate == 500
+    throttle.step(500)
+    assert bucket.rate == 250
+    # Recovered: speed up until well past what the wipe manages
+    throttle.next = {"sda": 1.0}
+    throttle.step(250)
+    assert bucket.rate == pytest.approx(312.5)
+    for _ in range(10):
+        throttle.step(300)
+    assert bucket.rate is None
+
+
+def test_adaptive_max_rate() -> None:
+    bucket = TokenBucket(100)
+    throttle = FakeThrottle(bucket, 100)
+    throttle.next = {"sda": 1.0}
+    throttle.step(100)
+    assert bucket.rate == 100
+    throttle.next = {"sda": 10.0}
+    throttle.step(100)
+    assert bucket.rate == 50
+    throttle.next = {"sda": 1.0}
+    for _ in range(10):
+        throttle.step(50)
+    assert bucket.rate == 100
@@ -0,0 +1,45 @@
+from jgsysutil.topology import Topology, common_alignment, md_data_disks
+
+
+def test_single_disk() -> None:
+    topology = Topology(512, 4096, 4096, 0, 0)
+    assert topology.alignment == 1024 * 1024
+    assert topology.ext4_extended_options() == []
+
+
+def test_raid() -> None:
+    # 5 disk RAID 5 with 512 KiB chunks: 2 MiB stripes
+    topology = Topology(512, 4096, 512 * 1024, 2 * 1024 * 1024, 0)
+    assert topology.alignment == 2 * 1024 * 1024
+    assert topology.ext4_extended_options() == ["stride=128", "stripe_width=512"]
+    # 3 data disks with 64 KiB chunks: 192 KiB stripes
+    topology = Topology(512, 512, 64 * 1024, 192 * 1024, 0)
+    assert topology.alignment == 3 * 1024 * 1024
+    assert topology.ext4_extended_options() == ["stride=16", "stripe_width=48"]
+
+
+def test_bogus_optimal_io_size() -> None:
+    # 0xffff sectors, as some USB bridges report
+    topology = Topology(512, 512, 512, 33553920, 0)
+    assert topology.alignment == 1024 * 1024
+    assert topology.ext4_extended_options() == []
+    # Not a whole number of physical blocks
+    topology = Topology(512, 4096, 4096, 6144, 0)
+    assert topology.alignment == 1024 * 1024
+
+
+def test_md_data_disks() -> None:
+    assert md_data_disks("raid0", 4) == 4
+    assert md_data_disks("raid5", 4) == 3
+    assert md_data_disks("raid6", 6) == 4
+    assert md_data_disks("raid10", 4) == 2
+    assert md_data_disks("raid1", 2) is None
+
+
+def test_common_alignment() -> None:
+    disk = Topology(512, 4096, 4096, 0, 0)
+    two_mib = Topology(512, 4096, 512 * 1024, 2 * 1024 * 1024, 0)
+    three_mib = Topology(512, 512, 64 * 1024, 192 * 1024, 0)
+    assert common_alignment([disk]) == 1024 * 1024
+    assert common_alignment([disk, two_mib]) == 2 * 1024 * 1024
+    assert common_alignment([two_mib, three_mib]) == 6 * 1024 * 1024
@@ -0,0 +1,43 @@
+import json
+import subprocess
+from pathlib import Path
+
+import pytest
+
+from jgsysutil.process import run
+from jgsysutil.taskgraph import Task, run_tasks
+from jgsysutil.tracing import span, tracing
+
+
+def test_trace(tmp_path: Path) -> None:
+    trace = tmp_path / "trace.json"
+
+    def step() -> None:
+        run(["true"], check=True)
+
+    with tracing(trace):
+        run_tasks([Task("step", step)])
+        with span("wipe", drive="/dev/null") as args:
+            args["bytes"] = 42
+        with pytest.raises(subprocess.CalledProcessError):
+            run(["false"], check=True)
+
+    events = json.loads(trace.read_text())["traceEvents"]
+    spans = {event["name"]: event for event in events if event["ph"] == "X"}
+    assert spans["step"]["cat"] == "task"
+    assert spans["true"]["cat"] == "process"
+    assert spans["true"]["args"] == {"argv": ["true"], "exit_code": 0}
+    assert spans["false"]["args"]["exit_code"] == 1
+    assert spans["wipe"]["args"] == {"drive": "/dev/null", "bytes": 42}
+    # The command runs inside its task
+    step_end = spans["step"]["ts"] + spans["step"]["dur"]
+    true_end = spans["true"]["ts"] + spans["true"]["dur"]
+    assert spans["step"]["ts"] <= spans["true"]["ts"] <= true_end <= step_end
+    assert spans["step"]["tid"] == spans["true"]["tid"]
+    assert spans["step"]["tid"] != spans["wipe"]["tid"]
+
+
+def test_no_trace() -> None:
+    with span("step") as args:
+        args["bytes"] = 1
+    assert run(["true"]).returncode == 0
@@ -0,0 +1,22 @@
+import numpy as np
+
+from jgsysutil.verify_drive import sample_regions, zero_runs
+
+
+def test_zero_runs() -> None:
+    def helper(data: bytes, carry: int, expected: tuple) -> None:
+        assert zero_runs(np.frombuffer(data, dtype=np.uint8), carry) == expected
+
+    helper(b"\x01\x02", 0, (0, 0))
+    helper(b"\x01\x02", 3, (3, 0))
+    helper(b"\x00\x00\x01\x00", 0, (2, 1))
+    helper(b"\x00\x00\x01\x00", 1, (3, 1))
+    helper(b"\x01\x00\x00\x00\x01", 5, (5, 0))
+    helper(b"\x00\x00", 2, (4, 4))
+
+
+def test_sample_regions() -> None:
+    assert sample_regions(100, 10, 1.0) == [(i, 10) for i in range(0, 100, 10)]
+    assert sample_regions(95, 10, 1.0)[-1] == (90, 5)
+    assert sample_regions(100, 10, 0.2) == [(0, 10), (90, 10)]
+    assert sample_regions(100, 10, 0.01) == [(0, 10)]
@@ -0,0 +1,41 @@
+import threading
+import time
+import typing as t
+from pathlib import Path
+
+import click
+import pytest
+
+from jgsysutil.native_wipe import WipeCancelled, WipeStats
+from jgsysutil.randomize_drive import resolve_drives
+from jgsysutil.wipe_pool import wipe_drives
+
+
+def test_interrupt_stops_running_wipes(tmp_path: Path) -> None:
+    drives = [tmp_path / "a", tmp_path / "b"]
+    for drive in drives:
+        drive.touch()
+
+    def wipe(
+        drive: Path, on_written: t.Callable[[int, int], None], stop: threading.Event
+    ) -> WipeStats:
+        if drive.name == "a":
+            time.sleep(0.1)
+            # As a Ctrl-C would, in whichever thread it lands
+            raise KeyboardInterrupt
+        assert stop.wait(30)
+        raise WipeCancelled(f"Wiping {drive} was cancelled")
+
+    start = time.monotonic()
+    with pytest.raises(KeyboardInterrupt):
+        wipe_drives(drives, wipe)
+    assert time.monotonic() - start < 10
+
+
+def test_resolve_drives(tmp_path: Path) -> None:
+    (tmp_path / "a").touch()
+    assert resolve_drives([str(tmp_path / "*")], []) == [tmp_path / "a"]
+    with pytest.raises(click.BadParameter, match="does not exist"):
+        resolve_drives([str(tmp_path / "b")], [])
+    with pytest.raises(click.BadParameter, match="directory"):
+        resolve_drives([str(tmp_path)], [])